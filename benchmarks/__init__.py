@@ -0,0 +1,11 @@
+# projekt_gpx_viewer/benchmarks/__init__.py
+"""
+Reproduzierbare Messungen für große Datenmengen:
+
+    python -m benchmarks.run_benchmarks [--sizes 1000,10000,100000] [--filter-rows 10000,100000] [--compare ALT.json]
+    python -m benchmarks.synthetic_gpx VERZEICHNIS --count N --points N
+
+synthetic_gpx erzeugt deterministische GPX-Dateien (gleicher Seed -> gleiche Bytes), run_benchmarks misst
+damit Parser, Kennzahlen (gegen gpxpy), Punkte, Höhenprofil, Bounding Box, Speichern, Filter und Kartendaten in einer temporären
+Datenbank und schreibt die Ergebnisse als JSON (benchmarks/results/<Commit>.json) zum Vergleich zwischen Commits.
+"""
@@ -0,0 +1,374 @@
+# projekt_gpx_viewer/benchmarks/run_benchmarks.py
+"""
+Benchmark-Lauf über synthetische Daten (benchmarks.synthetic_gpx):
+
+    python -m benchmarks.run_benchmarks [--sizes 1000,10000,100000] [--filter-rows 10000,100000]
+                                        [--repeats 5] [--output DATEI.json] [--compare ALT.json]
+
+Gemessen werden parse_gpx_data_from_content (mit/ohne Höhe und Zeit), track_metrics im Vergleich zu gpxpy
+(gleiche Kennzahlen, Abweichung der Distanz), get_points_from_gpx_file, get_elevation_data_for_chart, get_bounds_for_points, das Speichern (prepare_gpx_upload + add_track),
+get_filtered_tracks/count_filtered_tracks mit Label-Filtern und die Größe der Kartendaten je Detailstufe.
+Datenbank und Uploads liegen in einem temporären Verzeichnis (GPX_VIEWER_DATA_DIR), der echte Katalog
+bleibt unberührt. Das Ergebnis ist JSON (Standard: benchmarks/results/<Commit>.json); --compare
+stellt die Mediane einem früheren Lauf gegenüber.
+"""
+from typing import Optional, Dict, Any, List, Callable, Iterator
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import gzip
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import gpxpy
+import numpy as np
+from sqlalchemy import func, text
+
+import gpx_utils
+import track_metrics
+from benchmarks import synthetic_gpx
+
+RESULTS_FORMAT_VERSION = 1
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_FILTER_ROWS = [10_000, 100_000]
+DEFAULT_REPEATS = 5
+DEFAULT_INGEST_TRACKS = 20
+DEFAULT_INGEST_POINTS = 5_000
+GPXPY_MAX_POINTS = 100_000 # get_points_from_gpx_file (gpxpy) darüber nur mit --full
+REPEAT_POINT_BUDGET = 1_000_000 # Wiederholungen je Messung höchstens so, dass ca. 1 Mio. Punkte verarbeitet werden
+
+# Labels der Filter-Tabelle: Häufigkeit fällt nach hinten ab (Label i hat etwa jeder (i+2)-te Track)
+FILTER_LABELS = ["wandern", "rad", "laufen", "alpen", "winter", "sommer", "urlaub", "feierabend",
+                 "gravel", "tour", "skitour", "familie", "hütte", "gipfel", "see", "wald"]
+FILTER_CASES = [
+    ("ein häufiges Label", ["wandern"], "and"),
+    ("zwei Labels (und)", ["wandern", "alpen"], "and"),
+    ("zwei Labels (oder)", ["skitour", "gipfel"], "or"),
+    ("seltenes Label", ["wald"], "and"),
+]
+FILTER_PAGE_SIZE = 50 # wie eine Tabellenseite in main.py
+
+
+@contextmanager
+def _quiet() -> Iterator[None]:
+    # Die DB-Funktionen melden jeden Track per print; während der Messungen nicht ausgeben
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+
+def _measure(function: Callable[[], Any], repeats: int, warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        function()
+    seconds = []
+    for _ in range(max(repeats, 1)):
+        started = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - started)
+    return {"repeats": len(seconds), "min_s": min(seconds), "median_s": statistics.median(seconds),
+            "mean_s": statistics.fmean(seconds)}
+
+
+def _repeats_for(points: int, repeats: int) -> int:
+    return max(1, min(repeats, REPEAT_POINT_BUDGET // max(points, 1)))
+
+
+def _result(name: str, params: Dict[str, Any], timing: Optional[Dict[str, Any]] = None, **metrics: Any) -> Dict[str, Any]:
+    result = {"name": name, "params": params}
+    if timing:
+        result.update(timing)
+    if metrics:
+        result["metrics"] = metrics
+    summary = f"{timing['median_s'] * 1000:10.2f} ms" if timing else " " * 13
+    print(f"  {name:<32} {json.dumps(params, ensure_ascii=False):<52} {summary}  "
+          + ", ".join(f"{key}={value:,.0f}" if isinstance(value, (int, float)) else f"{key}={value}" for key, value in metrics.items()))
+    return result
+
+
+def _git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+# --- GPX-Verarbeitung (ohne Datenbank) ---
+
+def bench_gpx_functions(sizes: List[int], repeats: int, work_dir: Path, full: bool) -> List[Dict[str, Any]]:
+    results = []
+    for points in sizes:
+        point_repeats = _repeats_for(points, repeats)
+        for with_elevation, with_time in ((True, True), (False, False)):
+            gpx_bytes = synthetic_gpx.generate_gpx(points, seed=points, with_elevation=with_elevation, with_time=with_time)
+            timing = _measure(lambda: gpx_utils.parse_gpx_data_from_content("bench.gpx", gpx_bytes), point_repeats)
+            results.append(_result("parse_gpx_data_from_content",
+                                   {"points": points, "elevation": with_elevation, "time": with_time}, timing,
+                                   file_bytes=len(gpx_bytes), points_per_s=points / timing["median_s"]))
+
+        gpx_bytes = synthetic_gpx.generate_gpx(points, seed=points)
+        results += bench_track_metrics(points, gpx_bytes, point_repeats, full)
+        gpx_path = work_dir / f"bench_{points}.gpx"
+        gpx_path.write_bytes(gpx_bytes)
+
+        if points <= GPXPY_MAX_POINTS or full:
+            timing = _measure(lambda: gpx_utils.get_points_from_gpx_file(str(gpx_path)), point_repeats)
+            results.append(_result("get_points_from_gpx_file", {"points": points}, timing,
+                                   points_per_s=points / timing["median_s"]))
+
+        timing = _measure(lambda: gpx_utils.get_elevation_data_for_chart(str(gpx_path)), point_repeats)
+        chart_data = gpx_utils.get_elevation_data_for_chart(str(gpx_path))
+        results.append(_result("get_elevation_data_for_chart", {"points": points}, timing,
+                               series_points=len(chart_data["series_data"]), points_per_s=points / timing["median_s"]))
+
+        track = synthetic_gpx.generate_track_arrays(points, seed=points)
+        points_list = np.column_stack((track["latitudes"], track["longitudes"])).tolist()
+        timing = _measure(lambda: gpx_utils.get_bounds_for_points(points_list), point_repeats)
+        results.append(_result("get_bounds_for_points", {"points": points}, timing,
+                               points_per_s=points / timing["median_s"]))
+        gpx_path.unlink()
+    return results
+
+
+def bench_track_metrics(points: int, gpx_bytes: bytes, repeats: int, full: bool) -> List[Dict[str, Any]]:
+    # Kennzahlen aus den Arrays des Parsers gegen gpxpy (length_3d, get_uphill_downhill, get_moving_data) auf derselben Datei
+    parsed = gpx_utils.parse_gpx_data_from_content("bench.gpx", gpx_bytes)
+    time_texts = [time_text.decode() for time_text in re.findall(rb"<time>([^<]*)</time>", gpx_bytes)]
+    arrays = (np.asarray(parsed["latitudes"]), np.asarray(parsed["longitudes"]), np.asarray(parsed["elevations"]))
+    timing = _measure(lambda: track_metrics.compute_track_metrics(*arrays, track_metrics.times_to_seconds(time_texts)), repeats)
+    results = [_result("compute_track_metrics", {"points": points}, timing, points_per_s=points / timing["median_s"])]
+    if points > GPXPY_MAX_POINTS and not full:
+        return results
+
+    gpx = gpxpy.parse(gpx_bytes.decode('utf-8'))
+    def gpxpy_metrics() -> Any:
+        return gpx.length_3d(), gpx.get_uphill_downhill(), gpx.get_moving_data()
+    timing = _measure(gpxpy_metrics, max(repeats // 5, 1))
+    distance_m, uphill_downhill, moving = gpxpy_metrics()
+    # Ungerundet vergleichen (distance_km ist auf 10 m gerundet)
+    numpy_distance_m = float(track_metrics.distances_3d_m(track_metrics.distances_2d_m(*arrays[:2]), *arrays).sum())
+    results.append(_result("gpxpy_track_metrics", {"points": points}, timing, points_per_s=points / timing["median_s"],
+                           distance_diff_m=abs(numpy_distance_m - distance_m),
+                           ascent_diff_m=abs(parsed["total_ascent"] - uphill_downhill.uphill),
+                           moving_time_diff_s=abs((parsed["moving_time_s"] or 0.0) - moving.moving_time)))
+    return results
+
+
+# --- Datenbank (temporäre DB über GPX_VIEWER_DATA_DIR, db_config erst danach importieren) ---
+
+def bench_ingest(track_count: int, points: int) -> List[Dict[str, Any]]:
+    import db_config
+    import gpx_ingest
+
+    prepare_seconds, add_seconds = [], []
+    for track_seed in range(track_count):
+        gpx_bytes = synthetic_gpx.generate_gpx(points, seed=1_000_000 + track_seed)
+        with _quiet():
+            started = time.perf_counter()
+            parsed_gpx_data = gpx_ingest.prepare_gpx_upload(f"bench_{track_seed}.gpx", gpx_bytes)
+            prepare_seconds.append(time.perf_counter() - started)
+            db = db_config.SessionLocal()
+            try:
+                started = time.perf_counter()
+                track_id = db_config.add_track(db, parsed_gpx_data)
+                add_seconds.append(time.perf_counter() - started)
+            finally:
+                db.close()
+        if not track_id:
+            raise RuntimeError(f"add_track für synthetischen Track {track_seed} fehlgeschlagen")
+
+    params = {"tracks": track_count, "points": points}
+    results = []
+    for name, seconds in (("prepare_gpx_upload", prepare_seconds), ("add_track", add_seconds)):
+        timing = {"repeats": len(seconds), "min_s": min(seconds), "median_s": statistics.median(seconds),
+                  "mean_s": statistics.fmean(seconds)}
+        results.append(_result(name, params, timing, tracks_per_s=1 / timing["median_s"]))
+    return results
+
+
+def bench_map_payload() -> List[Dict[str, Any]]:
+    import db_config
+
+    db = db_config.SessionLocal()
+    try:
+        track_ids = [track_id for (track_id,) in db.query(db_config.TrackGeometryDB.track_id)]
+        results = []
+        for level in list(range(len(gpx_utils.LOD_LEVELS))) + [None]:
+            geometries = {track_id: geometry for track_id, (_, geometry) in db_config.get_track_geometries_for_level(db, track_ids, level).items()}
+            point_count = sum(len(geometry["latitudes"]) for geometry in geometries.values())
+            polylines = [gpx_utils.encode_geometry_polyline(geometry).encode('ascii') for geometry in geometries.values()]
+            # Vergleichswert: frühere Übertragung als JSON-Liste [[lat, lon], ...]
+            json_bytes = sum(len(json.dumps(gpx_utils.points_from_geometry(geometry)).encode('utf-8'))
+                             for geometry in geometries.values())
+            results.append(_result("map_payload", {"tracks": len(track_ids), "level": level}, None,
+                                   points=point_count,
+                                   polyline_bytes=sum(len(polyline) for polyline in polylines),
+                                   polyline_gzip_bytes=sum(len(gzip.compress(polyline, 6)) for polyline in polylines),
+                                   json_bytes=json_bytes))
+        return results
+    finally:
+        db.close()
+
+
+def _fill_filter_tracks(target_rows: int, seed: int = 0) -> None:
+    # Tabelle per Core-Insert auf target_rows Tracks auffüllen (nur Zeilen und Labels, ohne Geometrie/Dateien)
+    import db_config
+
+    db = db_config.SessionLocal()
+    try:
+        existing_rows = db.query(db_config.TrackDB).count()
+        if existing_rows >= target_rows:
+            return
+        label_ids = {}
+        for label_name in FILTER_LABELS:
+            label = db.query(db_config.LabelDB).filter(db_config.LabelDB.name == label_name).first()
+            if not label:
+                label = db_config.LabelDB(name=label_name)
+                db.add(label)
+                db.flush()
+            label_ids[label_name] = label.id
+
+        rng = np.random.default_rng(seed + existing_rows)
+        new_rows = target_rows - existing_rows
+        first_id = (db.query(func.max(db_config.TrackDB.id)).scalar() or 0) + 1
+        label_probabilities = 1.0 / (np.arange(len(FILTER_LABELS)) + 2)
+        has_label = rng.random((new_rows, len(FILTER_LABELS))) < label_probabilities
+        latitudes = rng.uniform(45.0, 55.0, new_rows)
+        longitudes = rng.uniform(5.0, 15.0, new_rows)
+        start_date = datetime(2010, 1, 1)
+        track_rows, track_label_rows = [], []
+        for row in range(new_rows):
+            track_id = first_id + row
+            track_labels = [label_name for label_name, flag in zip(FILTER_LABELS, has_label[row]) if flag]
+            track_rows.append({
+                "id": track_id, "name": f"Filter-Track {track_id}", "original_filename": f"filter_{track_id}.gpx",
+                "stored_filename": f"filter_{track_id}", "distance_km": float(rng.uniform(1, 120)),
+                "track_date": start_date + timedelta(hours=int(rng.integers(0, 15 * 365 * 24))),
+                "labels": json.dumps(track_labels), "gpx_parsed_total_ascent": 0.0, "gpx_parsed_total_descent": 0.0,
+                "min_lat": latitudes[row], "min_lon": longitudes[row],
+                "max_lat": latitudes[row] + 0.05, "max_lon": longitudes[row] + 0.05,
+            })
+            track_label_rows += [{"track_id": track_id, "label_id": label_ids[label_name]} for label_name in track_labels]
+        db.execute(db_config.TrackDB.__table__.insert(), track_rows)
+        db.execute(db_config.TrackLabelDB.__table__.insert(), track_label_rows)
+        db.commit()
+        db.execute(text("ANALYZE"))
+    finally:
+        db.close()
+
+
+def bench_filter(row_counts: List[int], repeats: int) -> List[Dict[str, Any]]:
+    import db_config
+
+    results = []
+    for target_rows in sorted(row_counts):
+        _fill_filter_tracks(target_rows)
+        db = db_config.SessionLocal()
+        try:
+            for case_name, labels, mode in FILTER_CASES:
+                params = {"rows": target_rows, "case": case_name, "labels": labels, "mode": mode}
+                matches = db_config.count_filtered_tracks(db, label_filter_list=labels, label_match_mode=mode)
+                timing = _measure(lambda: db_config.get_filtered_tracks(db, label_filter_list=labels, label_match_mode=mode,
+                                                                       limit=FILTER_PAGE_SIZE), repeats)
+                results.append(_result("get_filtered_tracks", {**params, "limit": FILTER_PAGE_SIZE}, timing, matches=matches))
+                timing = _measure(lambda: db_config.count_filtered_tracks(db, label_filter_list=labels, label_match_mode=mode), repeats)
+                results.append(_result("count_filtered_tracks", params, timing, matches=matches))
+        finally:
+            db.close()
+    return results
+
+
+# --- Vergleich ---
+
+def _result_key(result: Dict[str, Any]) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True, ensure_ascii=False)}"
+
+
+def compare_results(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Gibt je Messung den Median des früheren Laufs, den aktuellen und das Verhältnis (aktuell/früher) aus."""
+    previous_by_key = {_result_key(result): result for result in previous.get("results", [])}
+    print(f"\nVergleich mit {previous.get('git', {}).get('commit') or 'unbekannt'} (Median, Verhältnis > 1 = langsamer):")
+    for result in current["results"]:
+        before = previous_by_key.get(_result_key(result))
+        if not before or "median_s" not in result or "median_s" not in before:
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else float('inf')
+        print(f"  {ratio:6.2f}x  {before['median_s'] * 1000:10.2f} ms -> {result['median_s'] * 1000:10.2f} ms  {_result_key(result)}")
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Misst Parser, Datenbank und Kartendaten mit synthetischen GPX-Daten.")
+    arg_parser.add_argument("--sizes", type=_int_list, default=DEFAULT_SIZES,
+                            help=f"Punkte je Datei, kommagetrennt (Standard: {','.join(map(str, DEFAULT_SIZES))}, höchstens {synthetic_gpx.MAX_POINTS})")
+    arg_parser.add_argument("--full", action="store_true",
+                            help=f"Zusätzlich 1.000.000 Punkte und gpxpy auch über {GPXPY_MAX_POINTS} Punkte")
+    arg_parser.add_argument("--filter-rows", type=_int_list, default=DEFAULT_FILTER_ROWS,
+                            help=f"Tabellengrößen für die Filter-Messung (Standard: {','.join(map(str, DEFAULT_FILTER_ROWS))})")
+    arg_parser.add_argument("--ingest-tracks", type=int, default=DEFAULT_INGEST_TRACKS, help="Anzahl gespeicherter Tracks")
+    arg_parser.add_argument("--ingest-points", type=int, default=DEFAULT_INGEST_POINTS, help="Punkte je gespeichertem Track")
+    arg_parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help=f"Wiederholungen je Messung (Standard: {DEFAULT_REPEATS})")
+    arg_parser.add_argument("--output", type=Path, help="Ergebnisdatei (Standard: benchmarks/results/<Commit>.json)")
+    arg_parser.add_argument("--compare", type=Path, help="Früheres Ergebnis, mit dem verglichen wird")
+    args = arg_parser.parse_args(argv)
+
+    sizes = sorted(set(args.sizes + ([synthetic_gpx.MAX_POINTS] if args.full else [])))
+    if not sizes or not all(1 <= points <= synthetic_gpx.MAX_POINTS for points in sizes):
+        print(f"Fehler: --sizes muss zwischen 1 und {synthetic_gpx.MAX_POINTS} liegen.")
+        return 2
+
+    git_revision = _git_revision()
+    report: Dict[str, Any] = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "git": git_revision,
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "machine": platform.machine(), "cpu_count": os.cpu_count(), "numpy": np.__version__},
+        "config": {"sizes": sizes, "filter_rows": args.filter_rows, "ingest_tracks": args.ingest_tracks,
+                   "ingest_points": args.ingest_points, "repeats": args.repeats, "full": args.full},
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="gpx_viewer_bench_") as work_dir:
+        os.environ["GPX_VIEWER_DATA_DIR"] = work_dir
+        print("GPX-Verarbeitung:")
+        report["results"] += bench_gpx_functions(sizes, args.repeats, Path(work_dir), args.full)
+        with _quiet():
+            import db_config
+            db_config.init_database() # legt die temporäre Datenbank an
+        print("Speichern:")
+        report["results"] += bench_ingest(max(args.ingest_tracks, 1), args.ingest_points)
+        print("Kartendaten:")
+        report["results"] += bench_map_payload()
+        if args.filter_rows:
+            print("Filter:")
+            report["results"] += bench_filter(args.filter_rows, args.repeats)
+        db_config.engine.dispose()
+
+    output_path = args.output or RESULTS_DIR / f"{(git_revision['commit'] or 'unbekannt')[:12]}{'-dirty' if git_revision['dirty'] else ''}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\nErgebnisse in {output_path} geschrieben.")
+
+    if args.compare:
+        compare_results(json.loads(args.compare.read_text(encoding='utf-8')), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
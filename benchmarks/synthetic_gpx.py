@@ -0,0 +1,113 @@
+# projekt_gpx_viewer/benchmarks/synthetic_gpx.py
+"""
+Deterministischer Generator für synthetische GPX-Dateien (1.000 bis 1.000.000 Punkte).
+
+Ein Track ist ein Zufallspfad mit gleichmäßiger Schrittweite und sanften Richtungswechseln, die Höhe
+ein geglätteter Zufallsverlauf. Alle Zufallswerte kommen aus numpy.random.default_rng(seed):
+gleiche Parameter ergeben byte-identische Dateien, Messungen sind damit zwischen Commits vergleichbar.
+
+    python -m benchmarks.synthetic_gpx VERZEICHNIS --count 100 --points 5000 [--no-elevation] [--no-time]
+"""
+from typing import Optional, Dict, List, Tuple
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import sys
+
+import numpy as np
+
+DEFAULT_START = (47.5, 11.0) # (lat, lon), Alpenvorland
+DEFAULT_STEP_M = 10.0 # Abstand zweier Punkte
+DEFAULT_START_TIME = datetime(2024, 5, 1, 8, 0, 0)
+DEFAULT_SECONDS_PER_POINT = 3
+MAX_POINTS = 1_000_000
+_METERS_PER_DEGREE_LAT = 111_320.0
+
+
+def generate_track_arrays(points: int, seed: int = 0, start: Tuple[float, float] = DEFAULT_START,
+                          step_m: float = DEFAULT_STEP_M) -> Dict[str, np.ndarray]:
+    """Koordinaten und Höhen eines synthetischen Tracks: {"latitudes", "longitudes", "elevations"} (float64)."""
+    if not 1 <= points <= MAX_POINTS:
+        raise ValueError(f"points muss zwischen 1 und {MAX_POINTS} liegen")
+    rng = np.random.default_rng(seed)
+    # Richtung ändert sich langsam (Zufallspfad der Richtung), Schrittweite streut um ±20 %
+    headings = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0.0, 0.08, points))
+    steps_m = step_m * rng.uniform(0.8, 1.2, points)
+    steps_m[0] = 0.0
+    north_m = np.cumsum(steps_m * np.cos(headings))
+    east_m = np.cumsum(steps_m * np.sin(headings))
+    latitudes = start[0] + north_m / _METERS_PER_DEGREE_LAT
+    longitudes = start[1] + east_m / (_METERS_PER_DEGREE_LAT * np.cos(np.radians(latitudes)))
+    # Höhe: Zufallsverlauf mit Trägheit (geglättete Steigung), dazu GPS-Rauschen
+    slope = np.convolve(rng.normal(0.0, 0.15, points), np.ones(25) / 25, mode='same')[:points]
+    elevations = 600.0 + np.cumsum(slope) + rng.normal(0.0, 0.3, points)
+    return {"latitudes": latitudes, "longitudes": longitudes, "elevations": elevations}
+
+
+def generate_gpx(points: int, seed: int = 0, with_elevation: bool = True, with_time: bool = True,
+                 name: Optional[str] = None, segments: int = 1) -> bytes:
+    """GPX-1.1-Datei mit einem Track aus points Punkten (auf segments Segmente verteilt) als UTF-8-Bytes."""
+    track = generate_track_arrays(points, seed)
+    name = name or f"Synthetischer Track {points} Punkte (Seed {seed})"
+    start_time = DEFAULT_START_TIME + timedelta(days=seed % 3650)
+    lines: List[str] = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="benchmarks.synthetic_gpx" xmlns="http://www.topografix.com/GPX/1/1">',
+        f'<metadata><name>{name}</name></metadata>',
+        f'<trk><name>{name}</name>',
+    ]
+    segment_starts = set(np.linspace(0, points, max(segments, 1), endpoint=False).astype(int).tolist())
+    # Texte vorab vektorisiert formatieren (als Python-Listen, Elementzugriff auf numpy-Strings ist langsam)
+    lat_texts = np.char.mod('%.7f', track["latitudes"]).tolist()
+    lon_texts = np.char.mod('%.7f', track["longitudes"]).tolist()
+    ele_texts = np.char.mod('%.1f', track["elevations"]).tolist() if with_elevation else None
+    time_texts = np.datetime_as_string(np.datetime64(start_time, 's') + np.arange(points)
+                                       * np.timedelta64(DEFAULT_SECONDS_PER_POINT, 's')).tolist() if with_time else None
+    for i in range(points):
+        if i in segment_starts:
+            if i:
+                lines.append('</trkseg>')
+            lines.append('<trkseg>')
+        children = ''
+        if with_elevation:
+            children += f'<ele>{ele_texts[i]}</ele>'
+        if with_time:
+            children += f'<time>{time_texts[i]}Z</time>'
+        lines.append(f'<trkpt lat="{lat_texts[i]}" lon="{lon_texts[i]}">{children}</trkpt>')
+    lines += ['</trkseg>', '</trk>', '</gpx>', '']
+    return '\n'.join(lines).encode('utf-8')
+
+
+def write_gpx_files(directory: Path, count: int, points: int, seed: int = 0,
+                    with_elevation: bool = True, with_time: bool = True) -> List[Path]:
+    """Schreibt count Dateien (Seeds seed .. seed+count-1, also verschiedene Inhalte) nach directory."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for track_seed in range(seed, seed + count):
+        path = directory / f"synthetic_{points}_{track_seed:06d}.gpx"
+        path.write_bytes(generate_gpx(points, track_seed, with_elevation, with_time))
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Erzeugt deterministische synthetische GPX-Dateien.")
+    arg_parser.add_argument("directory", type=Path, help="Zielverzeichnis")
+    arg_parser.add_argument("--count", type=int, default=1, help="Anzahl Dateien (Standard: 1)")
+    arg_parser.add_argument("--points", type=int, default=10_000, help=f"Punkte pro Datei (1 bis {MAX_POINTS})")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed der ersten Datei (Standard: 0)")
+    arg_parser.add_argument("--no-elevation", action="store_true", help="Ohne <ele>")
+    arg_parser.add_argument("--no-time", action="store_true", help="Ohne <time>")
+    args = arg_parser.parse_args(argv)
+
+    if not 1 <= args.points <= MAX_POINTS:
+        print(f"Fehler: --points muss zwischen 1 und {MAX_POINTS} liegen.")
+        return 2
+    paths = write_gpx_files(args.directory, max(args.count, 1), args.points, args.seed,
+                            with_elevation=not args.no_elevation, with_time=not args.no_time)
+    print(f"{len(paths)} GPX-Dateien mit je {args.points} Punkten in {args.directory} geschrieben.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
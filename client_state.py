@@ -0,0 +1,134 @@
+# projekt_gpx_viewer/client_state.py
+"""
+Zustand pro verbundenem Browser-Tab (NiceGUI-Client), nur im Prozess-Speicher.
+
+Tabellen-, Auswahl- und Kartendaten liegen hier statt in app.storage.user, damit die
+.nicegui/storage-user-*.json nicht bei jedem Refresh mit dem Katalog wachsen und neu geschrieben werden.
+Persistiert werden nur die kleinen Filtereinstellungen (PERSISTED_PREFS), gesammelt und verzögert.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+import asyncio
+import sys
+import weakref
+
+from nicegui import app, context
+
+import metrics
+
+# Persistierte Einstellungen mit Standardwerten (landen in app.storage.user)
+PERSISTED_PREFS: Dict[str, Any] = {
+    'filter_date_from_str': None, # String
+    'filter_date_to_str': None, # String
+    'filter_labels_list': [], # List[str]
+    'filter_labels_mode': 'and', # 'and' = alle Labels, 'or' = mindestens eines
+    'filter_bbox': None, # [min_lat, min_lon, max_lat, max_lon] oder None
+    'filter_search_text': '', # Volltextsuche über Name, Dateiname und Labels (db_config.track_search_fts)
+    'map_browse_mode': False, # Alle Tracks im Kartenausschnitt zeigen
+    'map_heatmap': False, # Heatmap aller Tracks (Dichteraster) einblenden
+}
+# Früher in app.storage.user abgelegte Schlüssel, die beim Start entfernt werden
+LEGACY_USER_STORAGE_KEYS = ['tracks_in_table_data', 'selected_track_ids_list', 'map_needs_initial_fit']
+
+PREFS_WRITE_DELAY_SECONDS = 1.0 # Änderungen innerhalb dieser Zeit werden zu einem Schreibvorgang zusammengefasst
+MAX_TABLE_PAGE_CURSORS = 200 # Gemerkte Keyset-Schlüssel pro Client (älteste fallen heraus)
+MAX_SELECTED_TRACKS = 1000 # Ausgewählte Tracks pro Client (IDs, Tabellenzeilen, Kartenlayer); weitere werden verworfen
+
+# Alle lebenden Zustände (für memory_stats); Einträge verschwinden mit app.storage.client des Clients
+_client_states: 'weakref.WeakValueDictionary[str, ClientState]' = weakref.WeakValueDictionary()
+
+
+class ClientState:
+    """In-Prozess-Zustand eines Clients: Auswahl, Tabellen-Cursor, Kartendaten und die Filtereinstellungen."""
+
+    def __init__(self, user_storage: Dict[str, Any]):
+        self._user_storage = user_storage # Referenz behalten: verzögertes Schreiben läuft ohne Request-Kontext
+        self._prefs_write_handle: Optional[asyncio.TimerHandle] = None
+        for legacy_key in LEGACY_USER_STORAGE_KEYS:
+            user_storage.pop(legacy_key, None)
+        self.prefs: Dict[str, Any] = {key: user_storage.get(key, default) for key, default in PERSISTED_PREFS.items()}
+
+        self.selected_track_ids: List[int] = [] # höchstens MAX_SELECTED_TRACKS, gesetzt über select_tracks
+        self.table_page_cursors: Optional[Dict[str, Any]] = None # {'state': [...], 'keys': {Seite: (Sortwert, ID)}}
+        self.map_needs_initial_fit = True
+        self.map_lod_level: Optional[int] = None
+        self.map_drawn_track_ids: List[int] = []
+        self.map_viewport_track_ids: List[int] = [] # höchstens VIEWPORT_MAX_TRACKS (main.py)
+        # Gezeichnete Leaflet-Layer: Track-ID -> (Layer, Detailstufe), für das Abgleichen in main.draw_track_polylines
+        self.map_selected_layers: Dict[int, Tuple[Any, Optional[int]]] = {}
+        self.map_viewport_layers: Dict[int, Tuple[Any, Optional[int]]] = {}
+        self.map_heatmap_layer: Optional[Any] = None # Leaflet-Tile-Layer der Heatmap, falls eingeblendet
+        self.viewport_load_task: Optional[asyncio.Task] = None
+        self.elevation_profile: Optional[Any] = None # (Distanzen km, Höhen m) des angezeigten Profils
+        # Von den Handlern gesendete Websocket-Nutzdaten je Kanal; eigenes Dict, damit es den Zustand überlebt (weakref.finalize)
+        self.bytes_sent_by_channel: Dict[str, int] = {}
+
+    def set_pref(self, key: str, value: Any) -> None:
+        """Setzt eine Filtereinstellung sofort im Speicher; gespeichert wird gesammelt nach PREFS_WRITE_DELAY_SECONDS."""
+        self.prefs[key] = value
+        if self._prefs_write_handle is None:
+            self._prefs_write_handle = asyncio.get_running_loop().call_later(PREFS_WRITE_DELAY_SECONDS, self.flush_prefs)
+
+    def flush_prefs(self) -> None:
+        """Schreibt geänderte Einstellungen mit einem einzigen Update in app.storage.user."""
+        if self._prefs_write_handle is not None:
+            self._prefs_write_handle.cancel()
+            self._prefs_write_handle = None
+        changed_prefs = {key: value for key, value in self.prefs.items() if self._user_storage.get(key) != value}
+        if changed_prefs:
+            self._user_storage.update(changed_prefs)
+
+    def record_bytes_sent(self, channel: str, size: int) -> None:
+        """Zählt an den Browser gesendete Nutzdaten für diesen Client und global (metrics.BYTES_SENT)."""
+        self.bytes_sent_by_channel[channel] = self.bytes_sent_by_channel.get(channel, 0) + size
+        metrics.BYTES_SENT.inc(size, channel=channel)
+
+    def select_tracks(self, track_ids: List[int]) -> bool:
+        """Setzt die Auswahl (ohne Duplikate, Reihenfolge bleibt); True, wenn auf MAX_SELECTED_TRACKS gekürzt wurde."""
+        unique_track_ids = list(dict.fromkeys(track_ids))
+        self.selected_track_ids = unique_track_ids[:MAX_SELECTED_TRACKS]
+        return len(unique_track_ids) > MAX_SELECTED_TRACKS
+
+    def remember_page_cursor(self, page: int, key: Any) -> None:
+        page_cursor_keys = self.table_page_cursors['keys']
+        page_cursor_keys[page] = key
+        while len(page_cursor_keys) > MAX_TABLE_PAGE_CURSORS:
+            page_cursor_keys.pop(next(iter(page_cursor_keys)))
+
+    def approx_size_bytes(self) -> int:
+        """Grobe Speichergröße der Daten dieses Clients (Arrays nach Puffergröße, sonst sys.getsizeof)."""
+        id_lists = (self.selected_track_ids, self.map_drawn_track_ids, self.map_viewport_track_ids)
+        size = sys.getsizeof(self.prefs) + sum(sys.getsizeof(ids) + 28 * len(ids) for ids in id_lists)
+        if self.table_page_cursors:
+            size += sys.getsizeof(self.table_page_cursors['keys']) + 120 * len(self.table_page_cursors['keys'])
+        # Layer enthalten keine Punkte (lädt der Browser per HTTP), nur Stil und ID
+        size += 500 * (len(self.map_selected_layers) + len(self.map_viewport_layers))
+        if self.elevation_profile:
+            size += sum(getattr(values, 'nbytes', 0) for values in self.elevation_profile)
+        return size
+
+
+def get_client_state() -> ClientState:
+    """Zustand des aktuellen Clients (aus dem NiceGUI-Kontext), wird beim ersten Zugriff angelegt."""
+    state = app.storage.client.get('state')
+    if state is None:
+        state = ClientState(app.storage.user)
+        app.storage.client['state'] = state
+        _client_states[context.client.id] = state
+        weakref.finalize(state, _observe_client_bytes_sent, state.bytes_sent_by_channel)
+    return state
+
+
+def _observe_client_bytes_sent(bytes_sent_by_channel: Dict[str, int]) -> None:
+    # Läuft, wenn der Zustand mit dem Client verschwindet: Summe in die Verteilung je Client
+    metrics.CLIENT_BYTES_SENT.observe(sum(bytes_sent_by_channel.values()))
+
+
+def memory_stats() -> Dict[str, Any]:
+    """Anzahl der Client-Zustände und ihr geschätzter Speicherbedarf in Bytes."""
+    sizes = [state.approx_size_bytes() for state in list(_client_states.values())]
+    return {'clients': len(sizes), 'total_bytes': sum(sizes), 'max_bytes': max(sizes, default=0)}
+
+
+metrics.register_gauge_callback("clients", "Verbundene Clients mit Zustand", lambda: {(): len(_client_states)})
+metrics.register_gauge_callback("client_state_bytes", "Geschätzter Speicher der Client-Zustände",
+                                lambda: {(("stat", stat),): memory_stats()[f"{stat}_bytes"] for stat in ("total", "max")})
@@ -0,0 +1,105 @@
+# projekt_gpx_viewer/db_async.py
+"""
+Async-Variante der CRUD-Funktionen aus db_config für die NiceGUI-Handler (gleiche Namen, ohne db-Argument).
+
+Reine Abfragen laufen über AsyncSession (aiosqlite, db_config.async_engine) mit der Logik der synchronen
+Funktionen (AsyncSession.run_sync). Dabei führt nur aiosqlite das SQL in seinem Verbindungs-Thread aus; der
+Python-Code der Funktion samt Aufbereitung der Ergebnisse läuft auf dem Event-Loop. Über _read laufen daher
+nur Funktionen, die ausschließlich lesen und wenig rechnen. Dank WAL laufen Leser parallel zu einem Schreiber.
+
+Alles, was schreibt, Dateien liest oder nennenswert rechnet, läuft komplett in einem Thread mit eigener
+synchroner Session (_write): Bearbeiten, Löschen, Datei-Sweeper (Rollups, Dichteraster, Dateisystem) und
+get_track_geometry, das für Tracks aus der Zeit vor der Geometrie-Tabelle die GPX-Datei parst und die
+Geometrie samt Detailstufen nachträgt.
+"""
+from typing import Optional, Dict, Any, List, Tuple, Callable, TypeVar
+import asyncio
+
+import db_config
+import metrics
+
+T = TypeVar('T')
+
+
+async def _read(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Synchrone db_config-Funktion mit einer Session auf einer aiosqlite-Verbindung ausführen
+    with metrics.timer(f"db.{function.__name__}"):
+        async with db_config.AsyncSessionLocal() as session:
+            return await session.run_sync(function, *args, **kwargs)
+
+
+def _write_in_session(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    db = db_config.SessionLocal()
+    try:
+        return function(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def _write(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    with metrics.timer(f"db.{function.__name__}"):
+        return await asyncio.to_thread(_write_in_session, function, *args, **kwargs)
+
+
+# --- Lesen ---
+
+async def get_filtered_tracks(**kwargs: Any) -> List[db_config.TrackDB]:
+    return await _read(db_config.get_filtered_tracks, **kwargs)
+
+async def count_filtered_tracks(**filters: Any) -> int:
+    return await _read(db_config.count_filtered_tracks, **filters)
+
+async def get_filtered_track_ids(**filters: Any) -> List[int]:
+    return await _read(db_config.get_filtered_track_ids, **filters)
+
+async def get_filtered_tracks_by_ids(track_ids: List[int], **filters: Any) -> List[db_config.TrackDB]:
+    return await _read(db_config.get_filtered_tracks_by_ids, track_ids, **filters)
+
+async def get_filtered_tracks_totals(**filters: Any) -> Dict[str, float]:
+    return await _read(db_config.get_filtered_tracks_totals, **filters)
+
+async def get_tracks_totals(track_ids: List[int]) -> Dict[str, float]:
+    return await _read(db_config.get_tracks_totals, track_ids)
+
+async def get_tracks_bounds(track_ids: List[int]) -> Optional[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    return await _read(db_config.get_tracks_bounds, track_ids)
+
+async def get_track_ids_in_bbox(bbox: Tuple[float, float, float, float], limit: Optional[int] = None) -> List[int]:
+    return await _read(db_config.get_track_ids_in_bbox, bbox, limit)
+
+async def get_track_details(track_id: int) -> Optional[db_config.TrackDB]:
+    return await _read(db_config.get_track_details, track_id)
+
+async def get_track_labels(track_id: int) -> List[str]:
+    return await _read(db_config.get_track_labels, track_id)
+
+async def get_label_counts() -> List[Tuple[str, int]]:
+    return await _read(db_config.get_label_counts)
+
+async def get_stats_rollup(dimension: str) -> List[Dict[str, Any]]:
+    return await _read(db_config.get_stats_rollup, dimension)
+
+async def get_catalogue_totals() -> Dict[str, float]:
+    return await _read(db_config.get_catalogue_totals)
+
+
+# --- Schreiben bzw. Datei lesen ---
+
+async def get_track_geometry(track_id: int) -> Optional[Dict[str, Any]]:
+    # Kann fehlende Geometrien aus der Datei nachtragen (parsen, Detailstufen, Commit), daher nicht über _read
+    return await _write(db_config.get_track_geometry, track_id)
+
+async def update_track_details(track_id: int, new_name: str, new_labels_list: List[str]) -> bool:
+    return await _write(db_config.update_track_details, track_id, new_name, new_labels_list)
+
+async def delete_track_by_id_with_file(track_id: int) -> Optional[str]:
+    return await _write(db_config.delete_track_by_id_with_file, track_id)
+
+async def delete_multiple_tracks_with_files(track_ids: List[int]) -> Tuple[int, List[str]]:
+    return await _write(db_config.delete_multiple_tracks_with_files, track_ids)
+
+async def sweep_file_tombstones() -> int:
+    return await _write(db_config.sweep_file_tombstones)
+
+async def reconcile_orphaned_gpx_files() -> int:
+    return await _write(db_config.reconcile_orphaned_gpx_files)
@@ -1,11 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, func, event
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, LargeBinary, ForeignKey, func, event, exists, inspect, text, table, column, select, delete, bindparam, literal_column
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Engine
 from pathlib import Path
 import json
 from datetime import datetime
 from typing import List, Optional, Tuple, Any, Dict # <--- Dict HIER HINZUGEFÜGT
 import traceback
+from array import array
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import uuid
+import numpy as np
+
+import gpx_utils
 
 # --- Konfiguration ---
 # BASE_DIR zeigt auf das Verzeichnis, in dem db_config.py liegt.
@@ -13,73 +25,675 @@ import traceback
 BASE_DIR = Path(__file__).resolve().parent
 # Wenn db_config.py in einem Unterordner (z.B. 'database') liegt, dann:
 # BASE_DIR = Path(__file__).resolve().parent.parent # Um zum Projektroot zu gelangen
+# Ablage für Datenbank und Uploads (Umgebungsvariable GPX_VIEWER_DATA_DIR, z.B. für benchmarks; Standard: BASE_DIR)
+DATA_DIR = Path(os.environ.get("GPX_VIEWER_DATA_DIR") or BASE_DIR)
 
-GPX_UPLOAD_DIR = BASE_DIR / "gpx_uploads"
+GPX_UPLOAD_DIR = DATA_DIR / "gpx_uploads"
 GPX_UPLOAD_DIR.mkdir(parents=True, exist_ok=True) # Sicherstellen, dass das Verzeichnis existiert
+# Inhaltsadressierte Ablage: gpx_uploads/objects/<2 Zeichen>/<sha256>.gpx.gz (siehe store_gpx_file)
+GPX_OBJECT_DIR = GPX_UPLOAD_DIR / "objects"
+GPX_OBJECT_GZIP_LEVEL = 6
+# Entpackte Kopien für Aufrufer, die einen Dateipfad brauchen (get_gpx_filepath), je Datenverzeichnis.
+# trim_gpx_read_cache hält ihn klein: älteste zuerst (mtime = letzter Zugriff), bis GPX_READ_CACHE_MAX_BYTES
+# (Umgebungsvariable GPX_READ_CACHE_MAX_MB), und nichts, was länger als GPX_READ_CACHE_MAX_AGE_S unbenutzt ist.
+GPX_READ_CACHE_DIR = DATA_DIR / "gpx_read_cache"
+GPX_READ_CACHE_MAX_BYTES = int(os.environ.get("GPX_READ_CACHE_MAX_MB", "256")) * 1024 * 1024
+GPX_READ_CACHE_MAX_AGE_S = 7 * 24 * 3600
+GPX_READ_CACHE_MIN_AGE_S = 60 # Gerade zurückgegebene Pfade nicht unter dem Aufrufer wegräumen
+
+DATABASE_URL = f"sqlite:///{DATA_DIR / 'tracks_sqlalchemy.db'}" # Neuer DB-Name zur Unterscheidung
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATA_DIR / 'tracks_sqlalchemy.db'}" # Dieselbe Datei, für db_async
 
-DATABASE_URL = f"sqlite:///{BASE_DIR / 'tracks_sqlalchemy.db'}" # Neuer DB-Name zur Unterscheidung
+# Verbindungen je Engine: mit WAL lesen mehrere Verbindungen parallel, geschrieben wird weiterhin nacheinander
+DB_POOL_SIZE = 8
+DB_MAX_OVERFLOW = 8
+DB_BUSY_TIMEOUT_MS = 5000 # Wartezeit auf die Schreibsperre statt sofort "database is locked"
+DB_CACHE_SIZE_KIB = 32 * 1024 # Seiten-Cache pro Verbindung
+DB_MMAP_SIZE_BYTES = 256 * 1024 * 1024
 
 # --- Datenbank Setup ---
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}) # Wichtig für SQLite mit Threads/Async
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, # Wichtig für SQLite mit Threads/Async
+                       pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async-Variante für die NiceGUI-Handler (siehe db_async); expire_on_commit=False, damit zurückgegebene
+# Objekte nach dem Schließen der Session lesbar bleiben
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-# Aktiviert FOREIGN KEY Unterstützung für SQLite bei jeder Verbindung
+# Aktiviert FOREIGN KEY Unterstützung und die Performance-Pragmas für SQLite bei jeder Verbindung
+# (gilt über die Engine-Klasse auch für die aiosqlite-Verbindungen von async_engine)
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL") # Leser blockieren Schreiber nicht (und umgekehrt)
+    cursor.execute("PRAGMA synchronous=NORMAL") # Mit WAL sicher, spart das fsync pro Commit
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE_BYTES}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
     cursor.close()
 
+# Version der aus der GPX-Datei abgeleiteten Spalten (TRACK_ANALYSIS_COLUMNS, Bounding Box). Erhöhen, wenn
+# eine solche Spalte hinzukommt oder sich ein Algorithmus ändert: track_reanalysis rechnet ältere Tracks neu.
+TRACK_ANALYSIS_VERSION = 2 # 2: Abstände wie gpxpy mit dem Breitengrad des zweiten Punkts, Bewegungsdaten bei Höhe 0
+
+# Schlüssel des Parser-Ergebnisses (gpx_utils) -> abgeleitete Spalte in TrackDB
+TRACK_ANALYSIS_COLUMNS = {
+    "track_date": "track_date",
+    "distance_km": "distance_km",
+    "total_ascent": "gpx_parsed_total_ascent",
+    "total_descent": "gpx_parsed_total_descent",
+    "moving_time_s": "moving_time_s",
+    "total_time_s": "total_time_s",
+    "max_speed_kmh": "max_speed_kmh",
+    "avg_speed_kmh": "avg_speed_kmh",
+    "min_elevation_m": "min_elevation_m",
+    "max_elevation_m": "max_elevation_m",
+}
+
 # --- Datenbank Modell (TrackDB) ---
 class TrackDB(Base):
     __tablename__ = "tracks"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
     original_filename = Column(String, nullable=True)
-    stored_filename = Column(String, nullable=False, unique=True)
-    distance_km = Column(Float, nullable=True)
+    stored_filename = Column(String, nullable=False, unique=True) # Eindeutiger Name je Upload (Altbestand: Datei in GPX_UPLOAD_DIR)
+    content_hash = Column(String, nullable=True, index=True) # SHA-256 des Dateiinhalts -> GpxBlobDB / GPX_OBJECT_DIR
+    distance_km = Column(Float, nullable=True, index=True) # Index: Sortierung der Tabelle
     upload_date = Column(DateTime, default=func.now())
-    track_date = Column(DateTime, nullable=True) 
-    labels = Column(Text, default="[]") 
+    track_date = Column(DateTime, nullable=True, index=True) # Index: Sortierung der Tabelle
+    labels = Column(Text, default="[]") # Anzeige-Kopie der Labels (JSON); maßgeblich sind labels/track_labels
     gpx_parsed_total_ascent = Column(Float, nullable=True) 
     gpx_parsed_total_descent = Column(Float, nullable=True)
+    # Kennzahlen aus track_metrics (beim Import berechnet; NULL ohne Zeitstempel/Höhen bzw. bei Tracks von davor)
+    moving_time_s = Column(Float, nullable=True)
+    total_time_s = Column(Float, nullable=True)
+    max_speed_kmh = Column(Float, nullable=True)
+    avg_speed_kmh = Column(Float, nullable=True)
+    min_elevation_m = Column(Float, nullable=True)
+    max_elevation_m = Column(Float, nullable=True)
+    analysis_version = Column(Integer, nullable=True) # TRACK_ANALYSIS_VERSION der obigen Werte, NULL = vor Einführung
+    # Bounding Box des Tracks; gespiegelt im R*Tree track_bbox_rtree (per Trigger)
+    min_lat = Column(Float, nullable=True)
+    min_lon = Column(Float, nullable=True)
+    max_lat = Column(Float, nullable=True)
+    max_lon = Column(Float, nullable=True)
+
+# --- Datenbank Modell (TrackGeometryDB) ---
+# Dekodierte Punkte eines Tracks als gepackte float64-Arrays (Little Endian).
+# Wird beim Upload befüllt, damit Karte und Höhenprofil kein GPX mehr parsen müssen.
+# Wird über ON DELETE CASCADE (PRAGMA foreign_keys=ON) mit dem Track gelöscht.
+class TrackGeometryDB(Base):
+    __tablename__ = "track_geometry"
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    point_count = Column(Integer, nullable=False, default=0)
+    latitudes = Column(LargeBinary, nullable=False)
+    longitudes = Column(LargeBinary, nullable=False)
+    elevations = Column(LargeBinary, nullable=False) # NaN, wenn ein Punkt keine Höhe hat
+    in_density_grid = Column(Boolean, nullable=True) # Zellen im Dichteraster gezählt (NULL = Aufbau im Hintergrund steht aus)
+
+# --- Datenbank Modell (TrackGeometryLodDB) ---
+# Vereinfachte Geometrien (Douglas-Peucker) je Detailstufe aus gpx_utils.LOD_LEVELS,
+# damit Übersichtskarten nur einen Bruchteil der Punkte laden und senden.
+class TrackGeometryLodDB(Base):
+    __tablename__ = "track_geometry_lod"
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    tolerance_m = Column(Float, nullable=False)
+    point_count = Column(Integer, nullable=False, default=0)
+    latitudes = Column(LargeBinary, nullable=False)
+    longitudes = Column(LargeBinary, nullable=False)
+
+# --- Datenbank Modelle (LabelDB, TrackLabelDB) ---
+# Normalisierte Labels: Filter und Label-Auswahl laufen über indizierte Joins statt JSON-LIKE-Scans.
+class LabelDB(Base):
+    __tablename__ = "labels"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True, index=True)
+
+class TrackLabelDB(Base):
+    __tablename__ = "track_labels"
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    label_id = Column(Integer, ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+# --- Datenbank Modell (ImportedFileDB) ---
+# Protokoll des Verzeichnis-Imports (import_gpx.py), damit ein erneuter Lauf
+# bereits importierte Dateien überspringt.
+class ImportedFileDB(Base):
+    __tablename__ = "imported_files"
+    source_path = Column(String, primary_key=True)
+    file_size = Column(Integer, nullable=False)
+    file_mtime = Column(Float, nullable=False)
+    track_id = Column(Integer, ForeignKey("tracks.id", ondelete="SET NULL"), nullable=True, index=True) # Index: ON DELETE SET NULL ohne Tabellenscan
+    imported_at = Column(DateTime, default=func.now())
+
+# --- Datenbank Modell (BackgroundJobDB) ---
+# Fortschritt der Hintergrund-Jobs (track_reanalysis): zuletzt abgearbeitete Track-ID je Job. Wird im selben
+# Commit wie die Ergebnisse eines Batches geschrieben, ein Neustart setzt also genau danach fort.
+class BackgroundJobDB(Base):
+    __tablename__ = "background_jobs"
+    name = Column(String, primary_key=True)
+    target_version = Column(Integer, nullable=False) # TRACK_ANALYSIS_VERSION, für die der Lauf gilt
+    last_track_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# --- Datenbank Modell (FileTombstoneDB) ---
+# Zu löschende Dateien (nicht mehr referenzierte Objekte, Altbestand-Dateien, verwaiste Dateien). Sie werden in
+# derselben Transaktion wie das Löschen der Tracks vermerkt und erst danach von sweep_file_tombstones entfernt:
+# schlägt der Commit fehl, bleiben Tracks und Dateien erhalten.
+class FileTombstoneDB(Base):
+    __tablename__ = "file_tombstones"
+    path = Column(String, primary_key=True)
+    created_at = Column(DateTime, default=func.now())
+
+# --- Datenbank Modell (GpxBlobDB) ---
+# Eine gespeicherte (gzip-komprimierte) GPX-Datei je Inhalt. ref_count = Anzahl Tracks mit diesem content_hash;
+# erreicht er 0 (Löschen), wird die Datei entfernt (_release_gpx_blobs).
+class GpxBlobDB(Base):
+    __tablename__ = "gpx_blobs"
+    content_hash = Column(String, primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    stored_size = Column(Integer, nullable=True) # Bytes auf der Platte (komprimiert)
+    created_at = Column(DateTime, default=func.now())
+
+# --- Datenbank Modell (TrackStatsRollupDB) ---
+# Vorberechnete Summen je Monat (dimension "month", key "YYYY-MM", "" = ohne Datum) und je Label
+# (dimension "label", key = Label-Name). Fortgeschrieben von add_track, update_track_details und
+# den Löschfunktionen (_update_stats_rollup), damit Katalog-Statistiken keine Tracks lesen müssen.
+class TrackStatsRollupDB(Base):
+    __tablename__ = "track_stats_rollup"
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    track_count = Column(Integer, nullable=False, default=0)
+    distance_km = Column(Float, nullable=False, default=0.0)
+    total_ascent = Column(Float, nullable=False, default=0.0)
+    total_descent = Column(Float, nullable=False, default=0.0)
+
+# --- Datenbank Modell (TrackDensityCellDB) ---
+# Dichteraster für die Heatmap aller Tracks: Anzahl Tracks je Zelle (Pixel einer Web-Mercator-Kachel,
+# siehe gpx_utils.heatmap_cells) für jede Zoomstufe bis gpx_utils.HEATMAP_MAX_STORED_ZOOM. Fortgeschrieben
+# beim Speichern der Geometrie und beim Löschen (_update_density_grid), Kacheln lesen nur ihre Zellen.
+# Geometrien von davor trägt track_reanalysis im Hintergrund nach (TrackGeometryDB.in_density_grid).
+class TrackDensityCellDB(Base):
+    __tablename__ = "track_density_cells"
+    zoom = Column(Integer, primary_key=True)
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    track_count = Column(Integer, nullable=False, default=0)
+
+# --- R*Tree-Index der Track-Bounding-Boxen ---
+# Virtuelle SQLite-Tabelle, daher nicht Teil von Base.metadata; Trigger halten sie mit tracks synchron.
+track_bbox_rtree = table("track_bbox_rtree", column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon"))
+
+SPATIAL_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS track_bbox_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """CREATE TRIGGER IF NOT EXISTS tracks_bbox_after_insert AFTER INSERT ON tracks WHEN NEW.min_lat IS NOT NULL
+       BEGIN
+           INSERT OR REPLACE INTO track_bbox_rtree VALUES (NEW.id, NEW.min_lat, NEW.max_lat, NEW.min_lon, NEW.max_lon);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tracks_bbox_after_update AFTER UPDATE OF min_lat, max_lat, min_lon, max_lon ON tracks
+       BEGIN
+           DELETE FROM track_bbox_rtree WHERE id = OLD.id;
+           INSERT INTO track_bbox_rtree SELECT NEW.id, NEW.min_lat, NEW.max_lat, NEW.min_lon, NEW.max_lon WHERE NEW.min_lat IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tracks_bbox_after_delete AFTER DELETE ON tracks
+       BEGIN
+           DELETE FROM track_bbox_rtree WHERE id = OLD.id;
+       END""",
+    # Bestehende Boxen übernehmen (z.B. nach dem ersten Anlegen des Index)
+    """INSERT INTO track_bbox_rtree
+       SELECT id, min_lat, max_lat, min_lon, max_lon FROM tracks
+       WHERE min_lat IS NOT NULL AND id NOT IN (SELECT id FROM track_bbox_rtree)""",
+]
+
+# --- FTS5-Volltextindex über Name, Dateiname und Labels ---
+# rowid = Track-ID; Trigger halten den Index bei add_track, update_track_details und den Löschfunktionen synchron.
+# remove_diacritics: "hutte" findet "Hütte"; prefix: Präfixsuche ("alp*") über eigene Indizes statt Scan.
+track_search_fts = table("track_search_fts", column("rowid"), column("name"), column("original_filename"), column("labels"))
+
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS track_search_fts USING fts5(
+           name, original_filename, labels, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS tracks_search_after_insert AFTER INSERT ON tracks
+       BEGIN
+           INSERT INTO track_search_fts(rowid, name, original_filename, labels) VALUES (NEW.id, NEW.name, NEW.original_filename, NEW.labels);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tracks_search_after_update AFTER UPDATE OF name, original_filename, labels ON tracks
+       BEGIN
+           DELETE FROM track_search_fts WHERE rowid = OLD.id;
+           INSERT INTO track_search_fts(rowid, name, original_filename, labels) VALUES (NEW.id, NEW.name, NEW.original_filename, NEW.labels);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS tracks_search_after_delete AFTER DELETE ON tracks
+       BEGIN
+           DELETE FROM track_search_fts WHERE rowid = OLD.id;
+       END""",
+    # Bestehende Tracks aufnehmen (z.B. nach dem ersten Anlegen des Index)
+    """INSERT INTO track_search_fts(rowid, name, original_filename, labels)
+       SELECT id, name, original_filename, labels FROM tracks WHERE id NOT IN (SELECT rowid FROM track_search_fts)""",
+]
+
+def _add_missing_columns() -> List[str]:
+    # create_all legt in bestehenden Tabellen keine neuen Spalten an: fehlende per ALTER TABLE ergänzen.
+    # Gibt die ergänzten Spalten ("tabelle.spalte") zurück.
+    inspector = inspect(engine)
+    added_columns = []
+    with engine.begin() as connection:
+        for model_table in Base.metadata.sorted_tables:
+            existing_columns = {col["name"] for col in inspector.get_columns(model_table.name)}
+            for model_column in model_table.columns:
+                if model_column.name not in existing_columns:
+                    column_type = model_column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {model_table.name} ADD COLUMN {model_column.name} {column_type}"))
+                    print(f"Spalte {model_table.name}.{model_column.name} ergänzt.")
+                    added_columns.append(f"{model_table.name}.{model_column.name}")
+    return added_columns
+
+def _add_missing_indexes():
+    # Auch neue Indizes bestehender Tabellen legt create_all nicht an
+    with engine.begin() as connection:
+        for model_table in Base.metadata.sorted_tables:
+            for model_index in model_table.indexes:
+                model_index.create(bind=connection, checkfirst=True)
 
 def create_db_tables():
     Base.metadata.create_all(bind=engine)
+    added_columns = _add_missing_columns()
+    _add_missing_indexes()
+    with engine.begin() as connection:
+        for statement in SPATIAL_INDEX_DDL + SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+        if "track_geometry.in_density_grid" in added_columns:
+            # Bisher enthielt ein vorhandenes Raster stets alle Geometrien: als gezählt übernehmen
+            connection.execute(text("UPDATE track_geometry SET in_density_grid = 1 "
+                                    "WHERE EXISTS (SELECT 1 FROM track_density_cells)"))
     print("SQLAlchemy Datenbanktabellen überprüft/erstellt.")
 
-create_db_tables()
+def _set_track_bounds(track: TrackDB, bounds: Optional[Tuple[Tuple[float, float], Tuple[float, float]]]) -> None:
+    (track.min_lat, track.min_lon), (track.max_lat, track.max_lon) = bounds if bounds else ((None, None), (None, None))
+
+def migrate_json_labels_to_tables():
+    # Einmalige Übernahme der JSON-Labels in labels/track_labels für Tracks, die dort noch keine Einträge haben.
+    db = SessionLocal()
+    try:
+        has_label_rows = exists().where(TrackLabelDB.track_id == TrackDB.id)
+        tracks_to_migrate = db.query(TrackDB).filter(
+            TrackDB.labels.isnot(None), TrackDB.labels.notin_(["", "[]", "null"]), ~has_label_rows
+        ).all()
+        for track in tracks_to_migrate:
+            try:
+                labels_list = json.loads(track.labels)
+            except json.JSONDecodeError:
+                print(f"Warnung: Ungültiger JSON-String für Labels in DB gefunden: {track.labels}")
+                continue
+            _set_track_labels(db, track, labels_list)
+        db.commit()
+        if tracks_to_migrate:
+            print(f"Labels von {len(tracks_to_migrate)} Tracks in die Label-Tabellen übernommen.")
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler bei der Migration der Labels: {e}")
+        traceback.print_exc()
+    finally:
+        db.close()
+
+# --- Label-Hilfsfunktionen ---
+
+def _normalize_labels(labels_list: List[str]) -> List[str]:
+    return sorted({label.strip() for label in labels_list if label and label.strip()})
+
+def _set_track_labels(db: Session, track: TrackDB, labels_list: List[str]) -> List[str]:
+    # Ersetzt die Labels eines Tracks (ohne Commit) und hält die JSON-Anzeigekopie synchron.
+    labels_list = _normalize_labels(labels_list)
+    label_ids_by_name = dict(db.query(LabelDB.name, LabelDB.id).filter(LabelDB.name.in_(labels_list)).all()) if labels_list else {}
+    for name in labels_list:
+        if name not in label_ids_by_name:
+            new_label = LabelDB(name=name)
+            db.add(new_label)
+            db.flush()
+            label_ids_by_name[name] = new_label.id
+    db.query(TrackLabelDB).filter(TrackLabelDB.track_id == track.id).delete(synchronize_session=False)
+    db.add_all(TrackLabelDB(track_id=track.id, label_id=label_ids_by_name[name]) for name in labels_list)
+    track.labels = json.dumps(labels_list)
+    return labels_list
+
+# --- Statistik-Rollups ---
+
+def _rollup_month_key(track_date: Optional[datetime]) -> str:
+    return track_date.strftime('%Y-%m') if track_date else ""
+
+def _labels_by_track_id(db: Session, track_ids: List[int]) -> Dict[int, List[str]]:
+    labels_by_track_id: Dict[int, List[str]] = {track_id: [] for track_id in track_ids}
+    if track_ids:
+        rows = db.query(TrackLabelDB.track_id, LabelDB.name).join(LabelDB, LabelDB.id == TrackLabelDB.label_id) \
+            .filter(TrackLabelDB.track_id.in_(track_ids))
+        for track_id, name in rows:
+            labels_by_track_id[track_id].append(name)
+    return labels_by_track_id
+
+def _update_stats_rollup(db: Session, tracks: List[TrackDB], labels_by_track_id: Dict[int, List[str]],
+                         sign: int, dimensions: Tuple[str, ...] = ("month", "label")) -> None:
+    # Addiert (sign=+1) bzw. subtrahiert (sign=-1) die Tracks in den Rollups, ohne Commit.
+    # Erst pro Schlüssel zusammenfassen, dann ein Upsert je betroffenem Monat/Label.
+    deltas: Dict[Tuple[str, str], List[float]] = {}
+    for track in tracks:
+        keys = [("month", _rollup_month_key(track.track_date))] if "month" in dimensions else []
+        if "label" in dimensions:
+            keys += [("label", name) for name in labels_by_track_id.get(track.id, [])]
+        for rollup_key in keys:
+            delta = deltas.setdefault(rollup_key, [0, 0.0, 0.0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * (track.distance_km or 0.0)
+            delta[2] += sign * (track.gpx_parsed_total_ascent or 0.0)
+            delta[3] += sign * (track.gpx_parsed_total_descent or 0.0)
+    if not deltas:
+        return
+    upsert = sqlite_insert(TrackStatsRollupDB) # ein executemany über alle Schlüssel
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[TrackStatsRollupDB.dimension, TrackStatsRollupDB.key],
+        set_={
+            "track_count": TrackStatsRollupDB.track_count + upsert.excluded.track_count,
+            "distance_km": TrackStatsRollupDB.distance_km + upsert.excluded.distance_km,
+            "total_ascent": TrackStatsRollupDB.total_ascent + upsert.excluded.total_ascent,
+            "total_descent": TrackStatsRollupDB.total_descent + upsert.excluded.total_descent,
+        }), [{"dimension": dimension, "key": key, "track_count": count, "distance_km": distance_km,
+              "total_ascent": ascent, "total_descent": descent}
+             for (dimension, key), (count, distance_km, ascent, descent) in deltas.items()])
+    if sign < 0:
+        db.query(TrackStatsRollupDB).filter(TrackStatsRollupDB.track_count <= 0).delete(synchronize_session=False)
+
+def rebuild_track_stats_rollup(only_if_empty: bool = False):
+    # Rollups komplett aus tracks/track_labels neu berechnen (zwei GROUP BY), z.B. beim ersten Start mit Bestandsdaten.
+    db = SessionLocal()
+    try:
+        if only_if_empty and (db.query(TrackStatsRollupDB).first() is not None or db.query(TrackDB.id).first() is None):
+            return
+        sums = (func.count(TrackDB.id), func.coalesce(func.sum(TrackDB.distance_km), 0.0),
+                func.coalesce(func.sum(TrackDB.gpx_parsed_total_ascent), 0.0),
+                func.coalesce(func.sum(TrackDB.gpx_parsed_total_descent), 0.0))
+        month_key = func.coalesce(func.strftime('%Y-%m', TrackDB.track_date), "")
+        db.query(TrackStatsRollupDB).delete(synchronize_session=False)
+        rows = [("month", key, *values) for key, *values in db.query(month_key, *sums).group_by(month_key)]
+        rows += [("label", key, *values) for key, *values in db.query(LabelDB.name, *sums)
+                 .join(TrackLabelDB, TrackLabelDB.label_id == LabelDB.id)
+                 .join(TrackDB, TrackDB.id == TrackLabelDB.track_id)
+                 .group_by(LabelDB.id)]
+        db.add_all(TrackStatsRollupDB(dimension=dimension, key=key, track_count=count, distance_km=distance_km,
+                                      total_ascent=ascent, total_descent=descent)
+                   for dimension, key, count, distance_km, ascent, descent in rows)
+        db.commit()
+        print(f"Statistik-Rollups neu berechnet ({len(rows)} Einträge).")
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Berechnen der Statistik-Rollups: {e}")
+        traceback.print_exc()
+    finally:
+        db.close()
+
+# --- Dichteraster (Heatmap) ---
+
+def _update_density_grid(db: Session, geometries: List[Dict[str, array]], sign: int) -> None:
+    # Addiert (sign=+1) bzw. subtrahiert (sign=-1) die Zellen der Geometrien, ohne Commit.
+    # Zellen aller Tracks erst zusammenzählen, dann ein Upsert (executemany) je betroffener Zelle.
+    cell_arrays = []
+    for geometry in geometries:
+        for zoom, cells in gpx_utils.heatmap_cells(geometry["latitudes"], geometry["longitudes"]).items():
+            cell_arrays.append(np.column_stack((np.full(len(cells), zoom, dtype=np.int64), cells)))
+    if not cell_arrays:
+        return
+    cells, counts = np.unique(np.concatenate(cell_arrays), axis=0, return_counts=True)
+    rows = [{"zoom": zoom, "cell_x": cell_x, "cell_y": cell_y, "track_count": sign * count}
+            for (zoom, cell_x, cell_y), count in zip(cells.tolist(), counts.tolist())]
+    upsert = sqlite_insert(TrackDensityCellDB)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[TrackDensityCellDB.zoom, TrackDensityCellDB.cell_x, TrackDensityCellDB.cell_y],
+        set_={"track_count": TrackDensityCellDB.track_count + upsert.excluded.track_count}), rows)
+    if sign < 0: # Nur die betroffenen Zellen prüfen, kein Scan über das ganze Raster
+        cell_table = TrackDensityCellDB.__table__ # executemany-DELETE nur auf Core-Ebene
+        db.execute(delete(cell_table).where(
+            cell_table.c.zoom == bindparam("b_zoom"), cell_table.c.cell_x == bindparam("b_cell_x"),
+            cell_table.c.cell_y == bindparam("b_cell_y"), cell_table.c.track_count <= 0),
+            [{"b_zoom": row["zoom"], "b_cell_x": row["cell_x"], "b_cell_y": row["cell_y"]} for row in rows])
+
+def _stored_geometries(db: Session, track_ids: List[int]) -> List[Dict[str, array]]:
+    # Nur Geometrien, deren Zellen im Dichteraster gezählt sind (ohne Nachtragen aus der Datei)
+    if not track_ids:
+        return []
+    return [_geometry_from_row(row) for row in db.query(TrackGeometryDB).filter(
+        TrackGeometryDB.track_id.in_(track_ids), TrackGeometryDB.in_density_grid.is_(True))]
+
+def prepare_density_grid(db: Session) -> Optional[int]:
+    """
+    Vorbereitung des Hintergrund-Aufbaus (track_reanalysis): entfernt Zellen oberhalb von
+    gpx_utils.HEATMAP_MAX_STORED_ZOOM (Raster von davor, eine Transaktion je Stufe) und gibt die Anzahl
+    der Geometrien zurück, die noch nicht im Raster stehen (None bei Fehlern).
+    """
+    try:
+        stale_zooms = [zoom for (zoom,) in db.query(TrackDensityCellDB.zoom).distinct()
+                       .filter(TrackDensityCellDB.zoom > gpx_utils.HEATMAP_MAX_STORED_ZOOM)]
+        for zoom in stale_zooms:
+            db.query(TrackDensityCellDB).filter(TrackDensityCellDB.zoom == zoom).delete(synchronize_session=False)
+            db.commit()
+        if stale_zooms:
+            print(f"Dichteraster: Zoomstufen {', '.join(map(str, stale_zooms))} entfernt (werden jetzt beim Abruf berechnet).")
+        return db.query(func.count(TrackGeometryDB.track_id)).filter(TrackGeometryDB.in_density_grid.isnot(True)).scalar() or 0
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Vorbereiten des Dichterasters: {e}")
+        traceback.print_exc()
+        return None
+
+def get_geometries_missing_density(db: Session, limit: int) -> List[int]:
+    """Track-IDs (aufsteigend) von Geometrien, deren Zellen noch nicht im Dichteraster gezählt sind."""
+    return [track_id for (track_id,) in db.query(TrackGeometryDB.track_id)
+            .filter(TrackGeometryDB.in_density_grid.isnot(True)).order_by(TrackGeometryDB.track_id).limit(limit)]
+
+def apply_density_grid_batch(db: Session, track_ids: List[int]) -> bool:
+    """Zählt die Geometrien der Tracks im Dichteraster und markiert sie, in einer Transaktion."""
+    try:
+        rows = db.query(TrackGeometryDB).filter(TrackGeometryDB.track_id.in_(track_ids),
+                                                TrackGeometryDB.in_density_grid.isnot(True)).all()
+        _update_density_grid(db, [_geometry_from_row(row) for row in rows], sign=1)
+        for row in rows:
+            row.in_density_grid = True
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Eintragen ins Dichteraster (Track IDs {track_ids[0]}..{track_ids[-1]}): {e}")
+        traceback.print_exc()
+        return False
+
+def init_database() -> None:
+    """
+    Einmal beim Start der App bzw. eines Kommandozeilen-Werkzeugs aufrufen, nicht beim Import: Tabellen, Indizes und
+    Trigger anlegen, JSON-Labels übernehmen, leere Rollups berechnen. Die Worker-Prozesse von gpx_ingest importieren
+    dieses Modul ebenfalls und sollen DDL und Prüfungen nicht je Prozess wiederholen.
+    """
+    create_db_tables()
+    migrate_json_labels_to_tables()
+    rebuild_track_stats_rollup(only_if_empty=True)
 
 # --- Datenbank CRUD Operationen ---
 
+# --- Inhaltsadressierte GPX-Ablage ---
+
+def gpx_content_hash(gpx_file_content_bytes: bytes) -> str:
+    return hashlib.sha256(gpx_file_content_bytes).hexdigest()
+
+def gpx_object_path(content_hash: str) -> Path:
+    return GPX_OBJECT_DIR / content_hash[:2] / f"{content_hash}.gpx.gz"
+
+def _write_gpx_object(content_hash: str, gpx_file_content_bytes: bytes) -> Path:
+    # Gleicher Inhalt -> gleiche Datei: vorhandene Objekte nicht neu schreiben. Erst in eine temporäre Datei
+    # schreiben und dann umbenennen, damit parallele Worker nie eine halbe Datei sehen.
+    object_path = gpx_object_path(content_hash)
+    if not object_path.exists():
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = object_path.with_name(f"{object_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(gzip.compress(gpx_file_content_bytes, compresslevel=GPX_OBJECT_GZIP_LEVEL))
+        os.replace(temp_path, object_path)
+    return object_path
+
+def store_gpx_file(original_filename: str, gpx_file_content_bytes: bytes) -> Tuple[str, str]:
+    """
+    Legt den Inhalt komprimiert unter seinem SHA-256 in GPX_OBJECT_DIR ab (nur falls noch nicht vorhanden)
+    und gibt (stored_filename, content_hash) zurück. stored_filename ist ein eindeutiger Name je Upload.
+    Die Referenz (GpxBlobDB.ref_count) zählt erst _insert_track in der DB-Transaktion.
+    """
+    content_hash = gpx_content_hash(gpx_file_content_bytes)
+    _write_gpx_object(content_hash, gpx_file_content_bytes)
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    safe_original_filename = "".join(c if c.isalnum() or c in ('.', '_', '-') else '_' for c in original_filename)
+    return f"{timestamp}_{uuid.uuid4().hex[:8]}_{safe_original_filename}", content_hash
+
+def _acquire_gpx_blob(db: Session, content_hash: str) -> None:
+    # Referenz auf ein Objekt zählen (ohne Commit)
+    object_path = gpx_object_path(content_hash)
+    upsert = sqlite_insert(GpxBlobDB).values(content_hash=content_hash, ref_count=1,
+                                             stored_size=object_path.stat().st_size if object_path.exists() else None)
+    db.execute(upsert.on_conflict_do_update(index_elements=[GpxBlobDB.content_hash],
+                                            set_={"ref_count": GpxBlobDB.ref_count + 1}))
+
+def _release_gpx_blobs(db: Session, tracks: List[TrackDB]) -> List[Path]:
+    # Referenzen der Tracks freigeben (ohne Commit). Gibt die Dateien zurück, die nach dem Commit zu löschen sind:
+    # Objekte ohne Referenz und Altbestand-Dateien (noch nicht migrierte Tracks ohne content_hash).
+    files_to_delete = [GPX_UPLOAD_DIR / track.stored_filename for track in tracks if not track.content_hash]
+    released: Dict[str, int] = {}
+    for track in tracks:
+        if track.content_hash:
+            released[track.content_hash] = released.get(track.content_hash, 0) + 1
+    for content_hash, count in released.items():
+        db.query(GpxBlobDB).filter(GpxBlobDB.content_hash == content_hash) \
+            .update({GpxBlobDB.ref_count: GpxBlobDB.ref_count - count}, synchronize_session=False)
+    if released:
+        unreferenced = [content_hash for (content_hash,) in db.query(GpxBlobDB.content_hash).filter(
+            GpxBlobDB.content_hash.in_(list(released)), GpxBlobDB.ref_count <= 0)]
+        db.query(GpxBlobDB).filter(GpxBlobDB.content_hash.in_(unreferenced)).delete(synchronize_session=False)
+        files_to_delete += [gpx_object_path(content_hash) for content_hash in unreferenced]
+    return files_to_delete
+
+def _delete_files(paths: List[Path]) -> None:
+    for path in paths:
+        try:
+            if path.exists():
+                path.unlink()
+                print(f"Datei {path} gelöscht.")
+        except OSError as e:
+            print(f"Fehler beim Löschen der Datei {path}: {e}")
+
+def _discard_unreferenced_gpx_object(db: Session, content_hash: Optional[str]) -> None:
+    # Nach einem fehlgeschlagenen Insert: das Objekt nur löschen, wenn kein anderer Track darauf verweist
+    if content_hash and db.query(GpxBlobDB.content_hash).filter(GpxBlobDB.content_hash == content_hash).first() is None:
+        _delete_files([gpx_object_path(content_hash)])
+
+def find_track_id_by_content_hash(db: Session, content_hash: str) -> Optional[int]:
+    """ID eines Tracks mit genau diesem Dateiinhalt (Duplikaterkennung vor dem Parsen), sonst None."""
+    return db.query(TrackDB.id).filter(TrackDB.content_hash == content_hash).order_by(TrackDB.id).limit(1).scalar()
+
+def get_track_ids_by_content_hash(db: Session) -> Dict[str, int]:
+    """{content_hash: track_id} aller gespeicherten Inhalte (Duplikaterkennung beim Verzeichnis-Import)."""
+    return dict(db.query(TrackDB.content_hash, func.min(TrackDB.id)).filter(TrackDB.content_hash.isnot(None))
+                .group_by(TrackDB.content_hash))
+
+def _track_file_path(track: TrackDB) -> Path:
+    return gpx_object_path(track.content_hash) if track.content_hash else GPX_UPLOAD_DIR / track.stored_filename
+
+def _open_track_file(track: TrackDB):
+    # Binärer Datei-Stream mit dem Original-GPX, egal ob komprimiertes Objekt oder Altbestand-Datei
+    return gzip.open(_track_file_path(track), 'rb') if track.content_hash else open(_track_file_path(track), 'rb')
+
+def _insert_track(db: Session, parsed_gpx_data: Dict[str, Any], stored_filename: str) -> TrackDB:
+    # Legt Track und Geometrie an, ohne zu committen (für Einzel- und Batch-Inserts)
+    db_track = TrackDB(
+        name=parsed_gpx_data.get("track_name", "Unbenannter Track"),
+        original_filename=parsed_gpx_data.get("original_filename", "unknown.gpx"),
+        stored_filename=stored_filename, 
+        labels=json.dumps(parsed_gpx_data.get("labels_list", [])), 
+        content_hash=parsed_gpx_data.get("content_hash"),
+        analysis_version=TRACK_ANALYSIS_VERSION,
+        **{column_name: parsed_gpx_data.get(key) for key, column_name in TRACK_ANALYSIS_COLUMNS.items()}
+    )
+    if db_track.content_hash:
+        _acquire_gpx_blob(db, db_track.content_hash)
+    bounds = parsed_gpx_data.get("bounds")
+    if bounds is None and parsed_gpx_data.get("latitudes"):
+        bounds = gpx_utils.bounds_from_arrays(parsed_gpx_data["latitudes"], parsed_gpx_data["longitudes"])
+    _set_track_bounds(db_track, bounds)
+    db.add(db_track)
+    db.flush() # ID für Geometrie- und Label-Zeilen vergeben
+    _add_track_geometry(db, db_track.id, parsed_gpx_data)
+    labels_list = _set_track_labels(db, db_track, parsed_gpx_data["labels_list"]) if parsed_gpx_data.get("labels_list") else []
+    _update_stats_rollup(db, [db_track], {db_track.id: labels_list}, sign=1)
+    import_source = parsed_gpx_data.get("import_source")
+    if import_source: # merge: geänderte Dateien ersetzen ihren alten Protokolleintrag
+        db.merge(ImportedFileDB(
+            source_path=import_source["path"],
+            file_size=import_source["size"],
+            file_mtime=import_source["mtime"],
+            track_id=db_track.id
+        ))
+    return db_track
+
+def add_tracks_batch(db: Session, parsed_gpx_data_list: List[Dict[str, Any]]) -> List[Optional[int]]:
+    """
+    Speichert mehrere bereits abgelegte Tracks (mit "stored_filename", siehe gpx_ingest) in einer Transaktion.
+    Schlägt der Batch fehl, wird jeder Track einzeln über add_track versucht.
+    Optional "import_source" ({path, size, mtime}) wird in imported_files vermerkt (import_gpx).
+    """
+    if not parsed_gpx_data_list:
+        return []
+    try:
+        db_tracks = [_insert_track(db, parsed, parsed["stored_filename"]) for parsed in parsed_gpx_data_list]
+        db.commit()
+        return [db_track.id for db_track in db_tracks]
+    except Exception as e:
+        db.rollback()
+        print(f"Batch-Insert von {len(parsed_gpx_data_list)} Tracks fehlgeschlagen ({e}), versuche einzeln.")
+        return [add_track(db, parsed) for parsed in parsed_gpx_data_list]
+
+def get_imported_file_signatures(db: Session) -> Dict[str, Tuple[int, float]]:
+    """{source_path: (file_size, file_mtime)} aller bereits importierten Dateien."""
+    return {
+        source_path: (file_size, file_mtime)
+        for source_path, file_size, file_mtime in db.query(ImportedFileDB.source_path, ImportedFileDB.file_size, ImportedFileDB.file_mtime)
+    }
+
+def record_imported_duplicates(db: Session, import_sources: List[Tuple[Dict[str, Any], Optional[int]]]) -> None:
+    """Vermerkt Dateien, deren Inhalt schon als Track existiert, in imported_files (nächster Lauf überspringt sie)."""
+    if not import_sources:
+        return
+    try:
+        for import_source, track_id in import_sources:
+            db.merge(ImportedFileDB(source_path=import_source["path"], file_size=import_source["size"],
+                                    file_mtime=import_source["mtime"], track_id=track_id))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Vermerken von {len(import_sources)} doppelten Dateien: {e}")
+        traceback.print_exc()
+
 def add_track(
     db: Session,
     parsed_gpx_data: Dict[str, Any], # Hier wurde Dict verwendet
-    gpx_file_content_bytes: bytes
+    gpx_file_content_bytes: Optional[bytes] = None
 ) -> Optional[int]:
-    # ... (Rest der Funktion bleibt gleich)
+    # Ist "stored_filename" gesetzt (Datei bereits im Worker abgelegt, siehe gpx_ingest),
+    # wird gpx_file_content_bytes nicht benötigt.
     original_filename = parsed_gpx_data.get("original_filename", "unknown.gpx")
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
-    safe_original_filename = "".join(c if c.isalnum() or c in ('.', '_', '-') else '_' for c in original_filename)
-    stored_filename = f"{timestamp}_{safe_original_filename}"
-    filepath_on_server = GPX_UPLOAD_DIR / stored_filename
-
-    try:
-        with open(filepath_on_server, "wb") as f:
-            f.write(gpx_file_content_bytes)
-
-        db_track = TrackDB(
-            name=parsed_gpx_data.get("track_name", "Unbenannter Track"),
-            original_filename=original_filename,
-            stored_filename=stored_filename, 
-            distance_km=parsed_gpx_data.get("distance_km"),
-            track_date=parsed_gpx_data.get("track_date"), 
-            labels=json.dumps(parsed_gpx_data.get("labels_list", [])), 
-            gpx_parsed_total_ascent=parsed_gpx_data.get("total_ascent"),
-            gpx_parsed_total_descent=parsed_gpx_data.get("total_descent")
-        )
-        db.add(db_track)
+    stored_filename = parsed_gpx_data.get("stored_filename")
+
+    try:
+        if not stored_filename:
+            stored_filename, parsed_gpx_data["content_hash"] = store_gpx_file(original_filename, gpx_file_content_bytes)
+
+        db_track = _insert_track(db, parsed_gpx_data, stored_filename)
         db.commit()
         db.refresh(db_track)
         print(f"Track '{db_track.name}' (ID: {db_track.id}) in DB gespeichert. Datei: {stored_filename}")
@@ -88,23 +702,217 @@ def add_track(
         db.rollback()
         print(f"Fehler beim Hinzufügen des Tracks zur DB: {e}")
         traceback.print_exc() 
-        if filepath_on_server.exists():
-            try:
-                filepath_on_server.unlink()
-                print(f"Aufräumen: Datei {filepath_on_server} nach DB-Fehler gelöscht.")
-            except Exception as e_file:
-                print(f"Fehler beim Aufräumen der Datei {filepath_on_server}: {e_file}")
+        _discard_unreferenced_gpx_object(db, parsed_gpx_data.get("content_hash"))
+        return None
+
+def _add_track_geometry(db: Session, track_id: int, parsed_gpx_data: Dict[str, Any]) -> Dict[str, array]:
+    latitudes = parsed_gpx_data.get("latitudes") or array('d')
+    longitudes = parsed_gpx_data.get("longitudes") or array('d')
+    elevations = parsed_gpx_data.get("elevations") or array('d', [float('nan')] * len(latitudes))
+    db.add(TrackGeometryDB(
+        track_id=track_id,
+        point_count=len(latitudes),
+        latitudes=gpx_utils.pack_float_array(latitudes),
+        longitudes=gpx_utils.pack_float_array(longitudes),
+        elevations=gpx_utils.pack_float_array(elevations),
+        in_density_grid=True
+    ))
+    geometry = {"latitudes": latitudes, "longitudes": longitudes, "elevations": elevations}
+    _update_density_grid(db, [geometry], sign=1)
+    # Detailstufen werden bei Uploads bereits im Worker-Prozess berechnet (gpx_ingest)
+    _add_track_lod(db, track_id, geometry, parsed_gpx_data.get("lod_geometries"))
+    return geometry
+
+def _add_track_lod(db: Session, track_id: int, geometry: Dict[str, array],
+                   lod_geometries: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    if lod_geometries is None:
+        lod_geometries = gpx_utils.build_lod_geometries(geometry)
+    for lod in lod_geometries:
+        db.add(TrackGeometryLodDB(
+            track_id=track_id,
+            level=lod["level"],
+            tolerance_m=lod["tolerance_m"],
+            point_count=len(lod["latitudes"]),
+            latitudes=gpx_utils.pack_float_array(lod["latitudes"]),
+            longitudes=gpx_utils.pack_float_array(lod["longitudes"])
+        ))
+    return lod_geometries
+
+def _geometry_from_row(row: TrackGeometryDB) -> Dict[str, array]:
+    return {
+        "latitudes": gpx_utils.unpack_float_array(row.latitudes),
+        "longitudes": gpx_utils.unpack_float_array(row.longitudes),
+        "elevations": gpx_utils.unpack_float_array(row.elevations),
+    }
+
+def _backfill_track_geometry(db: Session, track: TrackDB) -> Optional[Dict[str, array]]:
+    # Für Tracks aus der Zeit vor der Geometrie-Tabelle: einmalig die Datei parsen und nachtragen.
+    filepath = _track_file_path(track)
+    if not filepath.exists():
+        print(f"Datei {filepath} für Track ID {track.id} nicht gefunden, keine Geometrie.")
+        return None
+    with _open_track_file(track) as gpx_file:
+        parsed_gpx_data = gpx_utils.parse_gpx_data_from_stream(track.original_filename or track.stored_filename, gpx_file)
+    if not parsed_gpx_data:
         return None
+    try:
+        geometry = _add_track_geometry(db, track.id, parsed_gpx_data)
+        db.commit()
+        print(f"Geometrie für Track ID {track.id} nachgetragen ({len(geometry['latitudes'])} Punkte).")
+        return geometry
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Nachtragen der Geometrie für Track ID {track.id}: {e}")
+        traceback.print_exc()
+        return None
+
+def _query_full_geometries(db: Session, track_ids: List[int]) -> Dict[int, Dict[str, array]]:
+    if not track_ids:
+        return {}
+    return {row.track_id: _geometry_from_row(row)
+            for row in db.query(TrackGeometryDB).filter(TrackGeometryDB.track_id.in_(track_ids))}
+
+def get_track_geometries(db: Session, track_ids: List[int]) -> Dict[int, Dict[str, array]]:
+    """
+    Lädt die gespeicherten Geometrien mehrerer Tracks mit einer Abfrage: {track_id: {latitudes, longitudes, elevations}}.
+    Fehlende Geometrien werden aus der Datei nachgetragen (schreibt, siehe db_async.get_track_geometry).
+    """
+    geometries = _query_full_geometries(db, track_ids)
+    missing_ids = [track_id for track_id in track_ids if track_id not in geometries]
+    if missing_ids:
+        for track in db.query(TrackDB).filter(TrackDB.id.in_(missing_ids)).all():
+            geometry = _backfill_track_geometry(db, track)
+            if geometry:
+                geometries[track.id] = geometry
+    return geometries
+
+def get_track_geometry(db: Session, track_id: int) -> Optional[Dict[str, array]]:
+    return get_track_geometries(db, [track_id]).get(track_id)
+
+def _query_lod_geometries(db: Session, track_ids: List[int], level: int) -> Dict[int, Dict[str, array]]:
+    rows = db.query(TrackGeometryLodDB).filter(
+        TrackGeometryLodDB.track_id.in_(track_ids),
+        TrackGeometryLodDB.level == level
+    ).all()
+    return {
+        row.track_id: {
+            "latitudes": gpx_utils.unpack_float_array(row.latitudes),
+            "longitudes": gpx_utils.unpack_float_array(row.longitudes),
+        }
+        for row in rows
+    }
+
+def get_track_geometries_for_level(db: Session, track_ids: List[int],
+                                   level: Optional[int]) -> Dict[int, Tuple[Optional[int], Dict[str, array]]]:
+    """
+    Nur lesend: Geometrien in der Detailstufe level (Index in gpx_utils.LOD_LEVELS, None = volle Geometrie) als
+    {track_id: (gelieferte Stufe, Geometrie)}. Fehlt einem Track die Stufe noch (Altbestand, die Stufen trägt
+    track_reanalysis nach), kommt die volle gespeicherte Geometrie mit Stufe None. Ohne Geometrie fehlt der Track.
+    """
+    if level is None:
+        return {track_id: (None, geometry) for track_id, geometry in _query_full_geometries(db, track_ids).items()}
+    geometries = {track_id: (level, geometry) for track_id, geometry in _query_lod_geometries(db, track_ids, level).items()} \
+        if track_ids else {}
+    missing_ids = [track_id for track_id in track_ids if track_id not in geometries]
+    for track_id, geometry in _query_full_geometries(db, missing_ids).items():
+        geometries[track_id] = (None, geometry)
+    return geometries
+
+def get_geometries_missing_lod(db: Session, after_track_id: int, limit: int) -> List[int]:
+    """Track-IDs (aufsteigend, > after_track_id) mit gespeicherter Geometrie, aber ohne Detailstufen."""
+    has_lod = db.query(TrackGeometryLodDB.track_id).filter(TrackGeometryLodDB.track_id == TrackGeometryDB.track_id).exists()
+    return [track_id for (track_id,) in db.query(TrackGeometryDB.track_id)
+            .filter(TrackGeometryDB.track_id > after_track_id, ~has_lod)
+            .order_by(TrackGeometryDB.track_id).limit(limit)]
+
+def apply_lod_batch(db: Session, track_ids: List[int]) -> bool:
+    """Berechnet die Detailstufen der Tracks aus der gespeicherten Geometrie, in einer Transaktion."""
+    try:
+        for track_id, geometry in _query_full_geometries(db, track_ids).items():
+            _add_track_lod(db, track_id, geometry)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Nachtragen der Detailstufen (Track IDs {track_ids[0]}..{track_ids[-1]}): {e}")
+        traceback.print_exc()
+        return False
 
 def get_track_details(db: Session, track_id: int) -> Optional[TrackDB]:
     return db.query(TrackDB).filter(TrackDB.id == track_id).first()
 
-def get_filtered_tracks(
+def _track_ids_with_labels_query(db: Session, label_filter_list: List[str], label_match_mode: str = "and"):
+    # Subquery der Track-IDs über den Index auf track_labels.label_id
+    label_names = _normalize_labels(label_filter_list)
+    query = db.query(TrackLabelDB.track_id).join(LabelDB, LabelDB.id == TrackLabelDB.label_id) \
+        .filter(LabelDB.name.in_(label_names))
+    if label_match_mode == "and":
+        query = query.group_by(TrackLabelDB.track_id).having(func.count(TrackLabelDB.label_id) == len(label_names))
+    return query
+
+def _track_ids_in_bbox_query(bbox: Tuple[float, float, float, float]):
+    # Indizierte R*Tree-Abfrage: Boxen, die das Rechteck schneiden
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return select(track_bbox_rtree.c.id).where(
+        track_bbox_rtree.c.max_lat >= min_lat,
+        track_bbox_rtree.c.min_lat <= max_lat,
+        track_bbox_rtree.c.max_lon >= min_lon,
+        track_bbox_rtree.c.min_lon <= max_lon,
+    )
+
+def get_track_ids_in_bbox(db: Session, bbox: Tuple[float, float, float, float], limit: Optional[int] = None) -> List[int]:
+    """IDs der Tracks, deren Bounding Box das Rechteck (min_lat, min_lon, max_lat, max_lon) schneidet (höchstens limit)."""
+    query = _track_ids_in_bbox_query(bbox)
+    if limit is not None:
+        query = query.limit(limit)
+    return [track_id for (track_id,) in db.execute(query)]
+
+def get_tracks_bounds(db: Session, track_ids: List[int]) -> Optional[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    """Gemeinsame Bounding Box ((min_lat, min_lon), (max_lat, max_lon)) mehrerer Tracks aus den gespeicherten Boxen."""
+    if not track_ids:
+        return None
+    min_lat, min_lon, max_lat, max_lon = db.query(
+        func.min(TrackDB.min_lat), func.min(TrackDB.min_lon), func.max(TrackDB.max_lat), func.max(TrackDB.max_lon)
+    ).filter(TrackDB.id.in_(track_ids)).one()
+    if min_lat is None:
+        return None
+    return ((min_lat, min_lon), (max_lat, max_lon))
+
+# Sortierbare Tabellenspalten (Spaltenname in der UI -> DB-Spalte); die ID dient jeweils als Tie-Breaker
+TRACK_SORT_COLUMNS = {
+    'id': TrackDB.id,
+    'name': TrackDB.name,
+    'distance': TrackDB.distance_km,
+    'date': TrackDB.track_date,
+}
+# Sortierung nach Trefferqualität der Volltextsuche (nur mit search_text, ohne Keyset: Seiten per OFFSET)
+SEARCH_RELEVANCE_SORT = 'relevance'
+SEARCH_MAX_TERMS = 8
+SEARCH_COLUMN_WEIGHTS = (10.0, 2.0, 5.0) # bm25-Gewichte für name, original_filename, labels
+
+def track_search_match_expression(search_text: Optional[str]) -> Optional[str]:
+    """FTS5-MATCH-Ausdruck aus freiem Text: jedes Wort als Präfix ("wort"*), alle Wörter müssen vorkommen."""
+    terms = re.findall(r"\w+", search_text or "")[:SEARCH_MAX_TERMS]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+def _track_search_query(match_expression: str):
+    # Treffer mit Rang (bm25: kleiner = besser) über den FTS5-Index
+    return select(track_search_fts.c.rowid.label("track_id"),
+                  func.bm25(literal_column("track_search_fts"), *SEARCH_COLUMN_WEIGHTS).label("rank")) \
+        .where(literal_column("track_search_fts").op("MATCH")(match_expression))
+
+def _filtered_tracks_query(
     db: Session,
     start_date_str: Optional[str] = None,
     end_date_str: Optional[str] = None,
-    label_filter_list: Optional[List[str]] = None
-) -> List[TrackDB]:
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    search_text: Optional[str] = None
+):
+    # label_match_mode: "and" = Track hat alle Labels, "or" = Track hat mindestens eines
+    # bbox: (min_lat, min_lon, max_lat, max_lon) -> nur Tracks, deren Box das Rechteck schneidet (R*Tree)
+    # search_text: Volltextsuche (FTS5, Präfixe) über Name, Dateiname und Labels
     query = db.query(TrackDB)
     try:
         if start_date_str:
@@ -113,26 +921,236 @@ def get_filtered_tracks(
         if end_date_str:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
             query = query.filter(TrackDB.track_date <= end_date)
-        
-        if label_filter_list:
-            for label in label_filter_list:
-                query = query.filter(TrackDB.labels.like(f'%"{label}"%'))
-        
-        return query.order_by(TrackDB.track_date.desc().nullslast(), TrackDB.id.desc()).all()
     except ValueError as ve:
         print(f"Datumsformatfehler im Filter: {ve}")
-        return db.query(TrackDB).order_by(TrackDB.track_date.desc().nullslast(), TrackDB.id.desc()).all()
+        query = db.query(TrackDB) # Wie bisher: ungültiges Datum -> ohne Datumsfilter
+    if label_filter_list:
+        query = query.filter(TrackDB.id.in_(_track_ids_with_labels_query(db, label_filter_list, label_match_mode)))
+    if bbox:
+        query = query.filter(TrackDB.id.in_(_track_ids_in_bbox_query(bbox)))
+    match_expression = track_search_match_expression(search_text)
+    if match_expression:
+        query = query.filter(TrackDB.id.in_(select(_track_search_query(match_expression).subquery().c.track_id)))
+    return query
+
+def _keyset_condition(sort_column, descending: bool, after_key: Tuple[Any, int]):
+    # Zeilen hinter after_key = (Sortwert, ID) in der Reihenfolge (sort_column, id).
+    # SQLite sortiert NULL als kleinsten Wert: aufsteigend zuerst, absteigend zuletzt.
+    after_value, after_id = after_key
+    if sort_column is TrackDB.id:
+        return TrackDB.id < after_id if descending else TrackDB.id > after_id
+    if descending:
+        if after_value is None:
+            return (sort_column.is_(None)) & (TrackDB.id < after_id)
+        return (sort_column < after_value) | ((sort_column == after_value) & (TrackDB.id < after_id)) | sort_column.is_(None)
+    if after_value is None:
+        return ((sort_column.is_(None)) & (TrackDB.id > after_id)) | sort_column.isnot(None)
+    return (sort_column > after_value) | ((sort_column == after_value) & (TrackDB.id > after_id))
+
+def _order_tracks_query(query, sort_by: str, descending: bool, match_expression: Optional[str] = None):
+    # Reihenfolge der Tabelle, für Seiten und ID-Listen gleich: (Sortwert, ID) mit NULL wie in _keyset_condition
+    # (aufsteigend zuerst, absteigend zuletzt), bei Suche nach Trefferqualität (rank, ID)
+    if sort_by == SEARCH_RELEVANCE_SORT and match_expression:
+        search_ranks = _track_search_query(match_expression).subquery()
+        return query.join(search_ranks, search_ranks.c.track_id == TrackDB.id).order_by(search_ranks.c.rank, TrackDB.id)
+    sort_column = TRACK_SORT_COLUMNS.get(sort_by, TrackDB.track_date)
+    if sort_column is TrackDB.id:
+        return query.order_by(TrackDB.id.desc() if descending else TrackDB.id)
+    if descending:
+        return query.order_by(sort_column.desc().nullslast(), TrackDB.id.desc())
+    return query.order_by(sort_column.asc().nullsfirst(), TrackDB.id)
+
+def track_sort_key(track: TrackDB, sort_by: str = 'date') -> Tuple[Any, int]:
+    """Keyset-Schlüssel (Sortwert, ID) eines Tracks, als after_key für die nächste Seite von get_filtered_tracks."""
+    return (getattr(track, TRACK_SORT_COLUMNS.get(sort_by, TrackDB.track_date).key), track.id)
+
+def get_filtered_tracks(
+    db: Session,
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    sort_by: str = 'date',
+    descending: bool = True,
+    limit: Optional[int] = None,
+    after_key: Optional[Tuple[Any, int]] = None,
+    offset: int = 0,
+    search_text: Optional[str] = None
+) -> List[TrackDB]:
+    # Seitenweise Abfrage: limit = Seitengröße, after_key = track_sort_key der letzten Zeile der Vorseite (Keyset).
+    # offset nur, wenn die Vorseite unbekannt ist (Sprung auf eine beliebige Seite).
+    # sort_by=SEARCH_RELEVANCE_SORT mit search_text: beste Treffer zuerst (descending und after_key werden ignoriert).
+    try:
+        query = _filtered_tracks_query(db, start_date_str, end_date_str, label_filter_list, label_match_mode, bbox, search_text)
+        match_expression = track_search_match_expression(search_text)
+        if sort_by == SEARCH_RELEVANCE_SORT and match_expression:
+            query = _order_tracks_query(query, sort_by, descending, match_expression)
+            if offset:
+                query = query.offset(offset)
+            return query.limit(limit).all() if limit is not None else query.all()
+        if after_key is not None:
+            query = query.filter(_keyset_condition(TRACK_SORT_COLUMNS.get(sort_by, TrackDB.track_date), descending, after_key))
+        query = _order_tracks_query(query, sort_by, descending)
+        if offset and after_key is None:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
     except Exception as e:
         print(f"Fehler beim Filtern von Tracks: {e}")
         traceback.print_exc() # Hier wird traceback verwendet
         return []
 
+def count_filtered_tracks(
+    db: Session,
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    search_text: Optional[str] = None
+) -> int:
+    """Anzahl der Tracks, die get_filtered_tracks mit denselben Filtern liefern würde (für die Seitenanzeige)."""
+    try:
+        query = _filtered_tracks_query(db, start_date_str, end_date_str, label_filter_list, label_match_mode, bbox, search_text)
+        return query.with_entities(func.count(TrackDB.id)).scalar() or 0
+    except Exception as e:
+        print(f"Fehler beim Zählen von Tracks: {e}")
+        traceback.print_exc()
+        return 0
+
+def get_filtered_track_ids(
+    db: Session,
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    search_text: Optional[str] = None,
+    sort_by: str = 'date',
+    descending: bool = True
+) -> List[int]:
+    """
+    IDs aller Tracks, die den Filtern entsprechen, in der Reihenfolge von get_filtered_tracks mit derselben
+    Sortierung (Standard: neueste zuerst), ohne die Zeilen zu laden (z.B. für den Export).
+    """
+    try:
+        query = _filtered_tracks_query(db, start_date_str, end_date_str, label_filter_list, label_match_mode, bbox, search_text)
+        query = _order_tracks_query(query.with_entities(TrackDB.id), sort_by, descending, track_search_match_expression(search_text))
+        return [track_id for track_id, in query]
+    except Exception as e:
+        print(f"Fehler beim Abrufen gefilterter Track-IDs: {e}")
+        traceback.print_exc()
+        return []
+
+def _totals_from_row(row) -> Dict[str, float]:
+    track_count, distance_km, ascent, descent = row
+    return {"track_count": track_count or 0, "distance_km": distance_km or 0.0,
+            "total_ascent": ascent or 0.0, "total_descent": descent or 0.0}
+
+def _track_totals_columns():
+    return (func.count(TrackDB.id), func.sum(TrackDB.distance_km),
+            func.sum(TrackDB.gpx_parsed_total_ascent), func.sum(TrackDB.gpx_parsed_total_descent))
+
+def get_tracks_totals(db: Session, track_ids: List[int]) -> Dict[str, float]:
+    """Anzahl und Summen (Distanz, Anstieg, Abstieg) der Tracks in track_ids, per SUM/COUNT in SQL."""
+    if not track_ids:
+        return _totals_from_row((0, None, None, None))
+    return _totals_from_row(db.query(*_track_totals_columns()).filter(TrackDB.id.in_(track_ids)).one())
+
+def get_filtered_tracks_totals(
+    db: Session,
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    search_text: Optional[str] = None
+) -> Dict[str, float]:
+    """Wie get_tracks_totals, aber für alle Tracks, die den Filtern entsprechen."""
+    query = _filtered_tracks_query(db, start_date_str, end_date_str, label_filter_list, label_match_mode, bbox, search_text)
+    return _totals_from_row(query.with_entities(*_track_totals_columns()).one())
+
+def get_stats_rollup(db: Session, dimension: str) -> List[Dict[str, Any]]:
+    """Vorberechnete Summen je Monat (dimension="month") oder Label (dimension="label"), nach Schlüssel sortiert."""
+    rows = db.query(TrackStatsRollupDB).filter(TrackStatsRollupDB.dimension == dimension).order_by(TrackStatsRollupDB.key)
+    return [{"key": row.key, "track_count": row.track_count, "distance_km": row.distance_km,
+             "total_ascent": row.total_ascent, "total_descent": row.total_descent} for row in rows]
+
+def get_catalogue_totals(db: Session) -> Dict[str, float]:
+    """Summen über den ganzen Katalog aus den Monats-Rollups (jeder Track zählt in genau einem Monat)."""
+    return _totals_from_row(db.query(
+        func.sum(TrackStatsRollupDB.track_count), func.sum(TrackStatsRollupDB.distance_km),
+        func.sum(TrackStatsRollupDB.total_ascent), func.sum(TrackStatsRollupDB.total_descent)
+    ).filter(TrackStatsRollupDB.dimension == "month").one())
+
+# Geometrien je Abfrage für Heatmap-Kacheln oberhalb der gespeicherten Zoomstufen
+DENSITY_TILE_BATCH_SIZE = 200
+
+def get_density_tile_cells(db: Session, zoom: int, tile_x: int, tile_y: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Zellen einer Heatmap-Kachel: (x, y relativ zur Kachel, Track-Anzahl) als ndarrays. Bis HEATMAP_MAX_STORED_ZOOM
+    eine Bereichsabfrage auf dem Primärschlüssel, darüber aus den Geometrien der Tracks in der Kachel (R*Tree).
+    """
+    if zoom > gpx_utils.HEATMAP_MAX_STORED_ZOOM:
+        return _density_tile_cells_from_geometries(db, zoom, tile_x, tile_y)
+    tile_size = gpx_utils.HEATMAP_TILE_SIZE
+    min_x, min_y = tile_x * tile_size, tile_y * tile_size
+    rows = db.query(TrackDensityCellDB.cell_x, TrackDensityCellDB.cell_y, TrackDensityCellDB.track_count).filter(
+        TrackDensityCellDB.zoom == zoom,
+        TrackDensityCellDB.cell_x.between(min_x, min_x + tile_size - 1),
+        TrackDensityCellDB.cell_y.between(min_y, min_y + tile_size - 1)).all()
+    cells = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return cells[:, 0] - min_x, cells[:, 1] - min_y, cells[:, 2]
+
+def _density_tile_cells_from_geometries(db: Session, zoom: int, tile_x: int, tile_y: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Vereinfachte Geometrie der zum Zoom passenden Detailstufe, ohne Nachtragen (Lesepfad): fehlt sie, die volle
+    track_ids = get_track_ids_in_bbox(db, gpx_utils.heatmap_tile_bbox(zoom, tile_x, tile_y))
+    level = gpx_utils.lod_level_for_zoom(zoom)
+    cell_x, cell_y, track_counts = [], [], []
+    for start in range(0, len(track_ids), DENSITY_TILE_BATCH_SIZE):
+        batch_ids = track_ids[start:start + DENSITY_TILE_BATCH_SIZE]
+        geometries = _query_lod_geometries(db, batch_ids, level) if level is not None else {}
+        missing_ids = [track_id for track_id in batch_ids if track_id not in geometries]
+        if missing_ids:
+            geometries.update({row.track_id: _geometry_from_row(row) for row in
+                               db.query(TrackGeometryDB).filter(TrackGeometryDB.track_id.in_(missing_ids))})
+        batch_x, batch_y, batch_counts = gpx_utils.heatmap_tile_cells(list(geometries.values()), zoom, tile_x, tile_y)
+        cell_x.append(batch_x)
+        cell_y.append(batch_y)
+        track_counts.append(batch_counts)
+    if not track_counts:
+        return gpx_utils.heatmap_tile_cells([], zoom, tile_x, tile_y)
+    # Zellen mehrerer Batches zusammenzählen
+    cells, inverse = np.unique(np.column_stack((np.concatenate(cell_x), np.concatenate(cell_y))), axis=0, return_inverse=True)
+    return cells[:, 0], cells[:, 1], np.bincount(inverse.ravel(), weights=np.concatenate(track_counts)).astype(np.int64)
+
+def get_filtered_tracks_by_ids(
+    db: Session,
+    track_ids: List[int],
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    label_filter_list: Optional[List[str]] = None,
+    label_match_mode: str = "and",
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    search_text: Optional[str] = None
+) -> List[TrackDB]:
+    """Die Tracks aus track_ids, die den Filtern entsprechen (z.B. um eine Auswahl nach Filteränderung zu bereinigen)."""
+    if not track_ids:
+        return []
+    query = _filtered_tracks_query(db, start_date_str, end_date_str, label_filter_list, label_match_mode, bbox, search_text)
+    return query.filter(TrackDB.id.in_(track_ids)).all()
+
 def update_track_details(db: Session, track_id: int, new_name: str, new_labels_list: List[str]) -> bool:
     track = db.query(TrackDB).filter(TrackDB.id == track_id).first()
     if track:
         track.name = new_name.strip() if new_name.strip() else "Unbenannter Track"
-        track.labels = json.dumps(sorted(list(set(new_labels_list))))
         try:
+            # Nur die Label-Rollups ändern sich: alte Labels abziehen, neue addieren
+            _update_stats_rollup(db, [track], _labels_by_track_id(db, [track.id]), sign=-1, dimensions=("label",))
+            new_labels_list = _set_track_labels(db, track, new_labels_list)
+            _update_stats_rollup(db, [track], {track.id: new_labels_list}, sign=1, dimensions=("label",))
             db.commit()
             print(f"Track ID {track_id} aktualisiert.")
             return True
@@ -143,78 +1161,372 @@ def update_track_details(db: Session, track_id: int, new_name: str, new_labels_l
             return False
     return False
 
+# IDs je DELETE ... WHERE id IN (...) und Transaktion: bleibt unter dem SQLite-Variablenlimit, hält die
+# Schreibsperre kurz und begrenzt den Speicher (Geometrien des Chunks werden für das Dichteraster geladen)
+DELETE_CHUNK_SIZE = 500
+
+def _delete_tracks_chunk(db: Session, track_ids: List[int]) -> int:
+    # Löscht die Tracks mit einem DELETE, ohne Commit. Rollups, Dichteraster und Blob-Referenzen werden aus den
+    # Spalten fortgeschrieben (keine ORM-Objekte); Geometrien, Detailstufen und Labels folgen per ON DELETE CASCADE,
+    # R*Tree und Suchindex per Trigger. Freie Dateien landen als Grabstein in file_tombstones.
+    tracks = db.query(TrackDB.id, TrackDB.track_date, TrackDB.distance_km, TrackDB.gpx_parsed_total_ascent,
+                      TrackDB.gpx_parsed_total_descent, TrackDB.content_hash, TrackDB.stored_filename) \
+        .filter(TrackDB.id.in_(track_ids)).all()
+    if not tracks:
+        return 0
+    existing_ids = [track.id for track in tracks]
+    _update_stats_rollup(db, tracks, _labels_by_track_id(db, existing_ids), sign=-1)
+    _update_density_grid(db, _stored_geometries(db, existing_ids), sign=-1)
+    _add_file_tombstones(db, _release_gpx_blobs(db, tracks)) # Gemeinsam genutzte Objekte bleiben liegen
+    db.execute(delete(TrackDB.__table__).where(TrackDB.__table__.c.id.in_(existing_ids)))
+    return len(existing_ids)
+
 def delete_track_by_id_with_file(db: Session, track_id: int) -> Optional[str]:
-    track = db.query(TrackDB).filter(TrackDB.id == track_id).first()
-    if track:
-        track_name_for_notification = track.name
-        filepath_to_delete = GPX_UPLOAD_DIR / track.stored_filename
-        try:
-            db.delete(track)
-            db.commit()
-            print(f"Track ID {track_id} aus DB gelöscht.")
-            if filepath_to_delete.exists():
-                filepath_to_delete.unlink()
-                print(f"Datei {filepath_to_delete} gelöscht.")
-            else:
-                print(f"Datei {filepath_to_delete} für Track ID {track_id} nicht gefunden.")
-            return track_name_for_notification
-        except Exception as e:
-            db.rollback()
-            print(f"Fehler beim Löschen von Track ID {track_id} (oder zugehöriger Datei): {e}")
-            traceback.print_exc() # Hier wird traceback verwendet
-            return None
-    return None
+    track_name_for_notification = db.query(TrackDB.name).filter(TrackDB.id == track_id).scalar()
+    if track_name_for_notification is None:
+        return None
+    try:
+        _delete_tracks_chunk(db, [track_id])
+        db.commit()
+        print(f"Track ID {track_id} aus DB gelöscht.")
+        return track_name_for_notification
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Löschen von Track ID {track_id}: {e}")
+        traceback.print_exc()
+        return None
 
 def delete_multiple_tracks_with_files(db: Session, track_ids: List[int]) -> Tuple[int, List[str]]:
+    """
+    Löscht die Tracks in Chunks von DELETE_CHUNK_SIZE (je Chunk eine Transaktion). Die Dateien löscht erst
+    sweep_file_tombstones nach dem Commit. Bei einem Fehler bleiben bereits gelöschte Chunks gelöscht,
+    der fehlgeschlagene Chunk und die restlichen bleiben vollständig erhalten.
+    """
     if not track_ids:
         return 0, []
-    
-    tracks_to_delete = db.query(TrackDB).filter(TrackDB.id.in_(track_ids)).all()
+    unique_track_ids = sorted(set(track_ids))
     deleted_count = 0
-    errors = []
-
-    for track in tracks_to_delete:
-        filepath_to_delete = GPX_UPLOAD_DIR / track.stored_filename
+    for start in range(0, len(unique_track_ids), DELETE_CHUNK_SIZE):
+        chunk = unique_track_ids[start:start + DELETE_CHUNK_SIZE]
         try:
-            db.delete(track)
-            if filepath_to_delete.exists():
-                filepath_to_delete.unlink()
-            # Zähle erst nach erfolgreichem Commit, aber hier erstmal optimistisch
-            # deleted_count += 1 # Besser erst nach dem Commit zählen oder im Commit-Block anpassen
+            deleted_count += _delete_tracks_chunk(db, chunk)
+            db.commit()
         except Exception as e:
-            errors.append(f"Fehler bei Track ID {track.id} ('{track.name}'): {e}")
-            print(f"Fehler beim Vorbereiten des Löschens für Track ID {track.id}: {e}")
-    
+            db.rollback()
+            print(f"Fehler beim Löschen der Tracks (IDs {chunk[0]}..{chunk[-1]}): {e}")
+            traceback.print_exc()
+            not_deleted = len(unique_track_ids) - start
+            return deleted_count, [f"DB-Fehler beim Löschen, {not_deleted} Tracks nicht gelöscht: {e}"]
+    print(f"{deleted_count} Tracks aus DB gelöscht.")
+    return deleted_count, []
+
+def _add_file_tombstones(db: Session, paths: List[Path]) -> None:
+    if paths:
+        db.execute(sqlite_insert(FileTombstoneDB).on_conflict_do_nothing(index_elements=[FileTombstoneDB.path]),
+                   [{"path": str(path)} for path in paths])
+
+def _content_hash_of_object_file(file_name: str) -> Optional[str]:
+    # '<sha256>.gpx.gz' -> '<sha256>' (Gegenstück zu gpx_object_path)
+    return file_name[:-len(".gpx.gz")] if file_name.endswith(".gpx.gz") else None
+
+# Verwaiste Dateien erst ab diesem Alter entfernen: Uploads und import_gpx legen die Datei vor dem Commit des Tracks ab
+ORPHAN_MIN_AGE_S = 3600
+SWEEP_BATCH_SIZE = 1000
+
+def sweep_file_tombstones(db: Session) -> int:
+    """
+    Entfernt die Dateien aus file_tombstones (nach dem Commit der Löschung) samt entpackter Kopien in
+    GPX_READ_CACHE_DIR. Objekte, die inzwischen wieder referenziert sind (gleicher Inhalt erneut hochgeladen),
+    und wieder verwendete Altbestand-Namen bleiben liegen. Gibt die Anzahl gelöschter Dateien zurück.
+    """
+    removed = 0
     try:
-        db.commit()
-        deleted_count = len(tracks_to_delete) # Wenn Commit erfolgreich, wurden alle markierten gelöscht
-        print(f"{deleted_count} Tracks und ihre Dateien (falls vorhanden) aus DB gelöscht.")
-    except Exception as e_commit:
+        while True:
+            paths = [Path(path) for (path,) in db.query(FileTombstoneDB.path).order_by(FileTombstoneDB.path).limit(SWEEP_BATCH_SIZE)]
+            if not paths:
+                break
+            hashes = {path: _content_hash_of_object_file(path.name) for path in paths if path.parent.parent == GPX_OBJECT_DIR}
+            referenced_hashes = {content_hash for (content_hash,) in db.query(GpxBlobDB.content_hash)
+                                 .filter(GpxBlobDB.content_hash.in_([h for h in hashes.values() if h]))}
+            referenced_names = {name for (name,) in db.query(TrackDB.stored_filename).filter(
+                TrackDB.content_hash.is_(None), TrackDB.stored_filename.in_([path.name for path in paths if path not in hashes]))}
+            for path in paths:
+                content_hash = hashes.get(path)
+                if content_hash in referenced_hashes or (path not in hashes and path.name in referenced_names):
+                    continue
+                try:
+                    path.unlink(missing_ok=True)
+                    if content_hash:
+                        (GPX_READ_CACHE_DIR / f"{content_hash}.gpx").unlink(missing_ok=True)
+                    removed += 1
+                except OSError as e:
+                    print(f"Fehler beim Löschen der Datei {path}: {e}")
+            db.query(FileTombstoneDB).filter(FileTombstoneDB.path.in_([str(path) for path in paths])).delete(synchronize_session=False)
+            db.commit()
+        if removed:
+            print(f"{removed} Dateien gelöschter Tracks entfernt.")
+    except Exception as e:
         db.rollback()
-        errors.append(f"Fehler beim finalen DB-Commit: {e_commit}")
-        print(f"Fehler beim finalen DB-Commit für Massenlöschung: {e_commit}")
-        traceback.print_exc() # Hier wird traceback verwendet
-        return 0, errors + [f"DB-Commit fehlgeschlagen, keine Tracks gelöscht."] 
+        print(f"Fehler beim Entfernen der Dateien gelöschter Tracks: {e}")
+        traceback.print_exc()
+    return removed
 
-    return deleted_count, errors
+def reconcile_orphaned_gpx_files(db: Session, min_age_s: float = ORPHAN_MIN_AGE_S) -> int:
+    """
+    Ein Durchlauf über GPX_UPLOAD_DIR (Altbestand-Dateien und objects/<xx>/): Dateien älter als min_age_s ohne
+    Track bzw. Blob-Referenz und liegengebliebene temporäre Dateien werden als Grabstein vermerkt und
+    anschließend von sweep_file_tombstones entfernt. Gibt die Anzahl gefundener Dateien zurück.
+    """
+    try:
+        # Referenzen vor dem Scan laden: später gespeicherte Dateien sind jünger als min_age_s
+        known_hashes = {content_hash for (content_hash,) in db.query(GpxBlobDB.content_hash)}
+        known_names = {name for (name,) in db.query(TrackDB.stored_filename).filter(TrackDB.content_hash.is_(None))}
+        cutoff = datetime.now().timestamp() - min_age_s
+        orphans: List[Path] = []
+        with os.scandir(GPX_UPLOAD_DIR) as upload_entries:
+            for entry in upload_entries:
+                if entry.is_file(follow_symlinks=False):
+                    if entry.name not in known_names and entry.stat().st_mtime < cutoff:
+                        orphans.append(Path(entry.path))
+                elif entry.is_dir(follow_symlinks=False) and entry.path == str(GPX_OBJECT_DIR):
+                    for prefix_entry in os.scandir(entry.path):
+                        if not prefix_entry.is_dir(follow_symlinks=False):
+                            continue
+                        for object_entry in os.scandir(prefix_entry.path):
+                            if object_entry.is_file(follow_symlinks=False) \
+                                    and _content_hash_of_object_file(object_entry.name) not in known_hashes \
+                                    and object_entry.stat().st_mtime < cutoff:
+                                orphans.append(Path(object_entry.path))
+        _add_file_tombstones(db, orphans)
+        db.commit()
+        if orphans:
+            print(f"{len(orphans)} verwaiste Dateien in {GPX_UPLOAD_DIR} gefunden.")
+        return len(orphans)
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Abgleich der GPX-Dateien: {e}")
+        traceback.print_exc()
+        return 0
 
 
 def get_all_unique_labels(db: Session) -> List[str]:
-    all_labels_json_strings = db.query(TrackDB.labels).distinct().all()
-    unique_labels_set = set()
-    for (labels_json,) in all_labels_json_strings:
-        if labels_json and labels_json.strip() and labels_json != "null":
-            try:
-                labels_list = json.loads(labels_json)
-                for label in labels_list:
-                    if label and label.strip():
-                        unique_labels_set.add(label.strip())
-            except json.JSONDecodeError:
-                print(f"Warnung: Ungültiger JSON-String für Labels in DB gefunden: {labels_json}")
-    return sorted(list(unique_labels_set))
+    """Alle Labels, die mindestens einem Track zugeordnet sind, alphabetisch."""
+    return [name for name, _ in get_label_counts(db)]
+
+def get_label_counts(db: Session) -> List[Tuple[str, int]]:
+    """[(label, anzahl_tracks), ...] alphabetisch, mit einem einzigen GROUP BY."""
+    return db.query(LabelDB.name, func.count(TrackLabelDB.track_id)) \
+        .join(TrackLabelDB, TrackLabelDB.label_id == LabelDB.id) \
+        .group_by(LabelDB.id) \
+        .order_by(LabelDB.name) \
+        .all()
+
+def get_track_labels(db: Session, track_id: int) -> List[str]:
+    return [name for (name,) in db.query(LabelDB.name)
+            .join(TrackLabelDB, TrackLabelDB.label_id == LabelDB.id)
+            .filter(TrackLabelDB.track_id == track_id)
+            .order_by(LabelDB.name)]
 
 def get_gpx_filepath(db: Session, track_id: int) -> Optional[Path]:
-    stored_filename = db.query(TrackDB.stored_filename).filter(TrackDB.id == track_id).scalar()
-    if stored_filename:
-        return GPX_UPLOAD_DIR / stored_filename
-    return None
\ No newline at end of file
+    """
+    Pfad einer lesbaren, unkomprimierten GPX-Datei des Tracks. Komprimierte Objekte werden dafür einmalig
+    nach GPX_READ_CACHE_DIR entpackt (Name = Inhalts-Hash, also für alle Tracks mit gleichem Inhalt geteilt).
+    """
+    track = db.query(TrackDB).filter(TrackDB.id == track_id).first()
+    if not track:
+        return None
+    if not track.content_hash:
+        return GPX_UPLOAD_DIR / track.stored_filename
+    cached_path = GPX_READ_CACHE_DIR / f"{track.content_hash}.gpx"
+    try:
+        os.utime(cached_path) # Zugriff vermerken (LRU in trim_gpx_read_cache)
+        return cached_path
+    except FileNotFoundError:
+        pass
+    object_path = gpx_object_path(track.content_hash)
+    if not object_path.exists():
+        return None
+    GPX_READ_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = cached_path.with_name(f"{cached_path.name}.{uuid.uuid4().hex}.tmp")
+    with gzip.open(object_path, 'rb') as source, open(temp_path, 'wb') as target:
+        shutil.copyfileobj(source, target) # blockweise, auch große Dateien nicht ganz im Speicher
+    os.replace(temp_path, cached_path)
+    trim_gpx_read_cache()
+    return cached_path
+
+def trim_gpx_read_cache(max_bytes: int = GPX_READ_CACHE_MAX_BYTES, max_age_s: float = GPX_READ_CACHE_MAX_AGE_S) -> int:
+    """
+    Räumt GPX_READ_CACHE_DIR auf: entfernt Kopien, die länger als max_age_s nicht benutzt wurden, und danach
+    die am längsten unbenutzten, bis höchstens max_bytes übrig sind. Kopien jünger als GPX_READ_CACHE_MIN_AGE_S
+    bleiben liegen. Gibt die Anzahl entfernter Dateien zurück.
+    """
+    try:
+        with os.scandir(GPX_READ_CACHE_DIR) as cache_entries:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, Path(entry.path))
+                       for entry in cache_entries if entry.is_file(follow_symlinks=False)]
+    except FileNotFoundError:
+        return 0
+    now = datetime.now().timestamp()
+    total_bytes = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in sorted(entries): # älteste zuerst
+        age_s = now - mtime
+        if age_s < GPX_READ_CACHE_MIN_AGE_S or (total_bytes <= max_bytes and age_s <= max_age_s):
+            break
+        try:
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            removed += 1
+        except OSError as e:
+            print(f"Fehler beim Löschen der Datei {path}: {e}")
+    return removed
+
+def get_track_files(db: Session, track_ids: List[int]) -> List[Tuple[int, str, bool, str, Optional[datetime]]]:
+    """
+    Gespeicherte Dateien der Tracks in der Reihenfolge von track_ids, ohne Kopie im Lese-Cache wie bei
+    get_gpx_filepath: [(track_id, Dateipfad, gzip-komprimiert, Dateiname, Datum), ...]. Fehlende IDs entfallen.
+    """
+    rows = db.query(TrackDB.id, TrackDB.content_hash, TrackDB.stored_filename, TrackDB.original_filename, TrackDB.track_date) \
+        .filter(TrackDB.id.in_(track_ids)).all()
+    rows_by_id = {row.id: row for row in rows}
+    track_files = []
+    for track_id in track_ids:
+        row = rows_by_id.get(track_id)
+        if row is not None:
+            track_files.append((row.id, str(_track_file_path(row)), bool(row.content_hash),
+                                row.original_filename or row.stored_filename, row.track_date))
+    return track_files
+
+def _tracks_needing_analysis_query(db: Session, after_track_id: int):
+    return db.query(TrackDB).filter(TrackDB.id > after_track_id) \
+        .filter((TrackDB.analysis_version.is_(None)) | (TrackDB.analysis_version < TRACK_ANALYSIS_VERSION))
+
+def start_background_job(db: Session, job_name: str, restart: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Lädt den Checkpoint eines Hintergrund-Jobs bzw. legt ihn an. Gilt er für eine ältere TRACK_ANALYSIS_VERSION
+    (oder restart=True), beginnt der Job wieder bei der ersten Track-ID.
+    Gibt {last_track_id, processed, failed, remaining} zurück, None bei Fehlern.
+    """
+    try:
+        job = db.query(BackgroundJobDB).filter(BackgroundJobDB.name == job_name).first()
+        if job is None:
+            job = BackgroundJobDB(name=job_name, target_version=TRACK_ANALYSIS_VERSION, last_track_id=0, processed=0, failed=0)
+            db.add(job)
+        if restart or job.target_version != TRACK_ANALYSIS_VERSION:
+            job.target_version = TRACK_ANALYSIS_VERSION
+            job.last_track_id, job.processed, job.failed = 0, 0, 0
+            job.started_at, job.finished_at = datetime.now(), None
+        job.updated_at = datetime.now()
+        db.commit()
+        return {"last_track_id": job.last_track_id, "processed": job.processed, "failed": job.failed,
+                "remaining": _tracks_needing_analysis_query(db, job.last_track_id).count()}
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Laden des Jobs {job_name}: {e}")
+        traceback.print_exc()
+        return None
+
+def get_tracks_for_analysis(db: Session, after_track_id: int, limit: int) -> List[Tuple[int, str, bool, str, bool]]:
+    """
+    Nächste Tracks (nach ID sortiert, ID > after_track_id), deren abgeleitete Spalten älter als
+    TRACK_ANALYSIS_VERSION sind: [(track_id, Dateipfad, gzip-komprimiert, Dateiname, Geometrie fehlt), ...].
+    """
+    tracks = _tracks_needing_analysis_query(db, after_track_id).order_by(TrackDB.id).limit(limit).all()
+    track_ids_with_geometry = {track_id for (track_id,) in db.query(TrackGeometryDB.track_id)
+                               .filter(TrackGeometryDB.track_id.in_([track.id for track in tracks]))}
+    return [(track.id, str(_track_file_path(track)), bool(track.content_hash),
+             track.original_filename or track.stored_filename, track.id not in track_ids_with_geometry) for track in tracks]
+
+def apply_track_analysis_batch(db: Session, job_name: str, last_track_id: int,
+                               results: Dict[int, Optional[Dict[str, Any]]]) -> bool:
+    """
+    Schreibt die Ergebnisse eines Batches ({track_id: Werte aus TRACK_ANALYSIS_COLUMNS + "bounds"} bzw. None,
+    wenn die Datei nicht lesbar war) und den Checkpoint last_track_id in einer Transaktion. Fehlt einem
+    solchen Track noch die Bounding Box, wird sie aus der gespeicherten Geometrie übernommen.
+    Enthalten die Werte "geometry" (Tracks ohne gespeicherte Geometrie), wird sie samt Detailstufen und
+    Dichteraster nachgetragen.
+    Rollups werden mit den alten Werten aus- und den neuen eingebucht; der R*Tree folgt per Trigger.
+    """
+    try:
+        analyzed = {track_id: values for track_id, values in results.items() if values is not None}
+        tracks = db.query(TrackDB).filter(TrackDB.id.in_(list(analyzed))).all() if analyzed else []
+        if tracks:
+            labels_by_track_id = _labels_by_track_id(db, [track.id for track in tracks])
+            _update_stats_rollup(db, tracks, labels_by_track_id, sign=-1)
+            for track in tracks:
+                values = analyzed[track.id]
+                for key, column_name in TRACK_ANALYSIS_COLUMNS.items():
+                    setattr(track, column_name, values.get(key))
+                _set_track_bounds(track, values.get("bounds"))
+                track.analysis_version = TRACK_ANALYSIS_VERSION
+                if values.get("geometry") and not db.query(TrackGeometryDB.track_id).filter(TrackGeometryDB.track_id == track.id).first():
+                    _add_track_geometry(db, track.id, values["geometry"])
+            _update_stats_rollup(db, tracks, labels_by_track_id, sign=1)
+        _fill_bounds_from_geometry(db, [track_id for track_id, values in results.items() if values is None])
+        db.query(BackgroundJobDB).filter(BackgroundJobDB.name == job_name).update({
+            BackgroundJobDB.last_track_id: last_track_id,
+            BackgroundJobDB.processed: BackgroundJobDB.processed + len(tracks),
+            BackgroundJobDB.failed: BackgroundJobDB.failed + (len(results) - len(analyzed)),
+            BackgroundJobDB.updated_at: datetime.now(),
+        }, synchronize_session=False)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Speichern der Analyse-Ergebnisse (bis Track ID {last_track_id}): {e}")
+        traceback.print_exc()
+        return False
+
+def _fill_bounds_from_geometry(db: Session, track_ids: List[int]) -> None:
+    # Tracks ohne lesbare Datei (z.B. Altbestand von vor den Bounding Boxen) erhalten sie aus der gespeicherten Geometrie
+    if not track_ids:
+        return
+    rows = db.query(TrackDB, TrackGeometryDB).join(TrackGeometryDB, TrackGeometryDB.track_id == TrackDB.id) \
+        .filter(TrackDB.id.in_(track_ids), TrackDB.min_lat.is_(None))
+    for track, geometry_row in rows:
+        geometry = _geometry_from_row(geometry_row)
+        _set_track_bounds(track, gpx_utils.bounds_from_arrays(geometry["latitudes"], geometry["longitudes"]))
+
+def finish_background_job(db: Session, job_name: str) -> None:
+    try:
+        db.query(BackgroundJobDB).filter(BackgroundJobDB.name == job_name) \
+            .update({BackgroundJobDB.finished_at: datetime.now()}, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler beim Abschließen des Jobs {job_name}: {e}")
+        traceback.print_exc()
+
+def migrate_gpx_files_to_content_store(db: Session, batch_size: int = 100) -> Tuple[int, int]:
+    """
+    Übernimmt den Altbestand (Dateien unter stored_filename) in die inhaltsadressierte Ablage; gleiche Inhalte
+    teilen sich danach ein Objekt. Läuft nur auf ausdrücklichen Aufruf (python -m track_reanalysis --migrate-files).
+    Die alten Dateien werden im selben Batch als Grabstein vermerkt und erst von sweep_file_tombstones entfernt.
+    Gibt (übernommen, nicht gefunden) zurück.
+    """
+    migrated, missing = 0, 0
+    try:
+        track_ids = [track_id for (track_id,) in db.query(TrackDB.id).filter(TrackDB.content_hash.is_(None)).order_by(TrackDB.id)]
+        for start in range(0, len(track_ids), batch_size):
+            legacy_files = []
+            for track in db.query(TrackDB).filter(TrackDB.id.in_(track_ids[start:start + batch_size])):
+                legacy_path = GPX_UPLOAD_DIR / track.stored_filename
+                if not legacy_path.is_file():
+                    missing += 1
+                    continue
+                gpx_file_content_bytes = legacy_path.read_bytes()
+                track.content_hash = gpx_content_hash(gpx_file_content_bytes)
+                _write_gpx_object(track.content_hash, gpx_file_content_bytes)
+                _acquire_gpx_blob(db, track.content_hash)
+                legacy_files.append(legacy_path)
+            _add_file_tombstones(db, legacy_files)
+            db.commit()
+            migrated += len(legacy_files)
+        if migrated or missing:
+            print(f"{migrated} GPX-Dateien in die inhaltsadressierte Ablage übernommen"
+                  f"{f', {missing} Dateien nicht gefunden' if missing else ''}.")
+    except Exception as e:
+        db.rollback()
+        print(f"Fehler bei der Migration der GPX-Dateien: {e}")
+        traceback.print_exc()
+    return migrated, missing
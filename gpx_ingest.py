@@ -0,0 +1,98 @@
+# projekt_gpx_viewer/gpx_ingest.py
+"""
+Verarbeitung hochgeladener GPX-Dateien außerhalb des NiceGUI-Event-Loops.
+Parsen, Detailstufen und Dateiablage laufen in einem Prozess-Pool (mehrere Dateien parallel
+über alle Kerne), die Datenbank-Zugriffe in Threads. Bereits gespeicherte Inhalte (gleicher SHA-256)
+werden vor dem Parsen erkannt und nicht erneut verarbeitet.
+"""
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import traceback
+
+import db_config
+import gpx_utils
+import metrics
+
+# Anzahl Worker-Prozesse für das Parsen (Umgebungsvariable GPX_PARSE_WORKERS, Standard: alle Kerne)
+GPX_PARSE_WORKERS = int(os.environ.get("GPX_PARSE_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_parse_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Gibt den (lazy erzeugten) Prozess-Pool für das Parsen zurück."""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ProcessPoolExecutor(max_workers=GPX_PARSE_WORKERS)
+        print(f"GPX-Parse-Pool mit {GPX_PARSE_WORKERS} Prozessen gestartet.")
+    return _parse_executor
+
+
+def shutdown_parse_executor() -> None:
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=True, cancel_futures=True)
+        _parse_executor = None
+
+
+def prepare_gpx_upload(original_filename: str, file_content_bytes: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Läuft im Worker-Prozess: parst die Datei, berechnet die Detailstufen und legt die Datei ab.
+    Das Ergebnis (inkl. "stored_filename", "content_hash" und "lod_geometries") kann direkt an db_config.add_track gehen.
+    """
+    parsed_gpx_data = gpx_utils.parse_gpx_data_from_content(original_filename, file_content_bytes)
+    if not parsed_gpx_data:
+        return None
+    parsed_gpx_data["lod_geometries"] = gpx_utils.build_lod_geometries(parsed_gpx_data)
+    parsed_gpx_data["stored_filename"], parsed_gpx_data["content_hash"] = \
+        db_config.store_gpx_file(original_filename, file_content_bytes)
+    return parsed_gpx_data
+
+
+def find_duplicate_track(file_content_bytes: bytes) -> Optional[int]:
+    """Läuft in einem Thread: ID eines Tracks mit identischem Dateiinhalt oder None."""
+    db = db_config.SessionLocal()
+    try:
+        return db_config.find_track_id_by_content_hash(db, db_config.gpx_content_hash(file_content_bytes))
+    finally:
+        db.close()
+
+
+def insert_prepared_track(parsed_gpx_data: Dict[str, Any]) -> Optional[int]:
+    """Läuft in einem Thread: speichert einen vorbereiteten Track mit eigener Session."""
+    db = db_config.SessionLocal()
+    try:
+        return db_config.add_track(db, parsed_gpx_data)
+    finally:
+        db.close()
+
+
+async def ingest_gpx_upload(original_filename: str, file_content_bytes: bytes) -> Optional[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Verarbeitet eine hochgeladene Datei, ohne den Event-Loop zu blockieren.
+    Gibt (track_id, parsed_gpx_data) zurück, (track_id des vorhandenen Tracks, None) für bereits
+    gespeicherte Inhalte oder None bei Fehlern.
+    """
+    duplicate_track_id = await asyncio.to_thread(find_duplicate_track, file_content_bytes)
+    if duplicate_track_id:
+        print(f"{original_filename} ist bereits als Track ID {duplicate_track_id} gespeichert, wird nicht erneut verarbeitet.")
+        return duplicate_track_id, None
+    loop = asyncio.get_running_loop()
+    try:
+        with metrics.timer('parse_upload'): # Wartezeit auf einen freien Worker eingeschlossen
+            parsed_gpx_data = await loop.run_in_executor(get_parse_executor(), prepare_gpx_upload,
+                                                         original_filename, file_content_bytes)
+    except Exception as e:
+        print(f"Fehler im Parse-Worker für {original_filename}: {e}")
+        traceback.print_exc()
+        return None
+    if not parsed_gpx_data:
+        return None
+    metrics.record_points('parse_upload', len(parsed_gpx_data["latitudes"]))
+    with metrics.timer('db.add_track'):
+        new_track_id = await asyncio.to_thread(insert_prepared_track, parsed_gpx_data)
+    if not new_track_id:
+        return None
+    return new_track_id, parsed_gpx_data
@@ -1,9 +1,24 @@
 # projekt_gpx_viewer/gpx_utils.py
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, BinaryIO, Iterator
 from datetime import datetime # datetime direkt importieren
+from array import array # Kompakte Float-Arrays für die Geometrie-Ablage
+import io
+import math
+import re
+import struct
+import sys
+import zlib
+import xml.etree.ElementTree as ET # Streaming-Parser (expat)
+from xml.sax.saxutils import escape, quoteattr # Export: Text und Attribute in XML
+import numpy as np # Vektorisierte Geometrie-Berechnungen (Vereinfachung)
 import gpxpy
 import gpxpy.gpx # Für GPXXMLSyntaxException
+import gpxpy.gpxfield # parse_time, identisch zur gpxpy-Zeitinterpretation
+import gpxpy.geo # Distanz-Konstanten (ONE_DEGREE, EARTH_RADIUS)
 import traceback # Für detaillierte Fehlerausgabe
+from itertools import accumulate
+
+import track_metrics # Vektorisierte Kennzahlen (Distanz, Anstieg, Bewegungszeit, Geschwindigkeit)
 
 # Hilfsfunktion zur sicheren Extraktion von Zeitstempeln
 def _get_time_from_gpx_element(element: Any) -> Optional[datetime]:
@@ -14,13 +29,210 @@ def _get_time_from_gpx_element(element: Any) -> Optional[datetime]:
         return element.time.replace(tzinfo=None)
     return None
 
+# Größe der Blöcke, in denen der Streaming-Parser die Bytes an expat übergibt
+STREAM_CHUNK_SIZE_BYTES = 1024 * 1024
+
+
 def parse_gpx_data_from_content(original_filename: str, file_content_bytes: bytes) -> Optional[Dict[str, Any]]:
     """
     Parst GPX-Daten aus Bytes und gibt ein strukturiertes Dictionary zurück.
     Beinhaltet: track_name, distance_km, track_date (datetime), total_ascent, total_descent,
-                 original_filename, points (List[List[float]]).
-    Das Feld 'elevation_data' für das Chart wird separat über get_elevation_data_for_chart geholt.
+                 die Kennzahlen aus track_metrics.METRIC_COLUMNS (Bewegungszeit, Geschwindigkeiten, Höhen-Extreme),
+                 original_filename, bounds, latitudes/longitudes/elevations (array('d'), Höhe NaN falls unbekannt).
+    Die Koordinaten-Arrays werden von db_config.add_track als Geometrie gespeichert,
+    damit Karte und Höhenprofil die GPX-Datei nicht erneut parsen müssen.
+    Nutzt den Streaming-Parser; gpxpy dient nur noch als Fallback für Dateien, die dieser nicht lesen kann.
+    """
+    return parse_gpx_data_from_stream(original_filename, io.BytesIO(file_content_bytes), fallback_content_bytes=file_content_bytes)
+
+
+def parse_gpx_data_from_stream(original_filename: str, stream: BinaryIO,
+                               fallback_content_bytes: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parst eine GPX-Datei in einem einzigen Durchlauf aus einem Byte-Stream (expat über XMLPullParser).
+    Bereits verarbeitete Elemente werden sofort verworfen, der Speicherbedarf wächst daher nur mit
+    den kompakten Koordinaten-Arrays. Die Kennzahlen berechnet track_metrics am Ende vektorisiert, sie
+    entsprechen denen von gpxpy (length_3d, get_uphill_downhill, get_moving_data, erster Zeitstempel).
+    Bei XML-Fehlern wird auf gpxpy zurückgefallen (fallback_content_bytes oder erneutes Lesen des Streams).
     """
+    try:
+        return _parse_gpx_stream(original_filename, stream)
+    except _GPXStreamFormatError as e_format:
+        print(f"Warnung: Streaming-Parser kann {original_filename} nicht lesen ({e_format}), nutze gpxpy.")
+    except ET.ParseError as e_xml:
+        print(f"Warnung: XML-Fehler im Streaming-Parser für {original_filename} ({e_xml}), nutze gpxpy.")
+    except Exception as e:
+        print(f"Fehler im Streaming-Parser für {original_filename}: {e}, nutze gpxpy.")
+        traceback.print_exc()
+
+    if fallback_content_bytes is None:
+        stream.seek(0)
+        fallback_content_bytes = stream.read()
+    return _parse_gpx_data_with_gpxpy(original_filename, fallback_content_bytes)
+
+
+class _GPXStreamFormatError(Exception):
+    """Datei ist wohlgeformtes XML, aber kein GPX, das der Streaming-Parser versteht."""
+
+
+def _local_tag(tag: str) -> str:
+    # '{http://www.topografix.com/GPX/1/1}trkpt' -> 'trkpt'
+    return tag[tag.rfind('}') + 1:]
+
+
+def _parse_gpx_stream(original_filename: str, stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack: List[ET.Element] = []
+    local_stack: List[str] = []
+    local_tags: Dict[str, str] = {} # Cache für _local_tag, es gibt nur wenige verschiedene Tags
+
+    gpx_name: Optional[str] = None
+    gpx_time: Optional[datetime] = None
+    first_track_name: Optional[str] = None
+    first_route_name: Optional[str] = None
+    track_count = 0
+    route_count = 0
+    # Wie bisher: Zeitstempel der Segment-Anfänge, Tracks haben Vorrang vor Routen
+    first_track_point_time: Optional[datetime] = None
+    first_route_point_time: Optional[datetime] = None
+
+    # Routenpunkte werden nur verwendet, wenn die Datei keine Trackpunkte enthält
+    track_lats, track_lons, track_eles = array('d'), array('d'), array('d')
+    # Zeiten (Text) und Segment-Anfänge der Trackpunkte, ausgewertet am Ende vektorisiert (track_metrics)
+    track_times: List[Optional[str]] = []
+    track_segment_starts: List[int] = []
+    route_lats, route_lons, route_eles = array('d'), array('d'), array('d')
+
+    point_lat = point_lon = 0.0
+    point_ele: Optional[float] = None
+    point_time_str: Optional[str] = None
+    is_first_point_of_container = False
+
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE_BYTES)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        for event, elem in parser.read_events():
+            if event == 'start':
+                tag = local_tags.get(elem.tag)
+                if tag is None:
+                    tag = local_tags[elem.tag] = _local_tag(elem.tag)
+                parent_tag = local_stack[-1] if local_stack else None
+                if parent_tag is None and tag != 'gpx':
+                    raise _GPXStreamFormatError(f"Wurzelelement <{tag}> statt <gpx>")
+                if tag in ('trkpt', 'rtept') and parent_tag in ('trkseg', 'rte'):
+                    point_lat = float(elem.attrib['lat'])
+                    point_lon = float(elem.attrib['lon'])
+                    point_ele = None
+                    point_time_str = None
+                elif tag == 'trkseg' and parent_tag == 'trk':
+                    track_segment_starts.append(len(track_lats))
+                    is_first_point_of_container = True
+                elif tag == 'trk' and parent_tag == 'gpx':
+                    track_count += 1
+                elif tag == 'rte' and parent_tag == 'gpx':
+                    route_count += 1
+                    is_first_point_of_container = True
+                stack.append(elem)
+                local_stack.append(tag)
+                continue
+
+            # event == 'end'
+            tag = local_stack.pop()
+            stack.pop()
+            parent_tag = local_stack[-1] if local_stack else None
+            if tag == 'ele' and parent_tag in ('trkpt', 'rtept'):
+                point_ele = _to_float_or_none(elem.text)
+            elif tag == 'time' and parent_tag in ('trkpt', 'rtept'):
+                point_time_str = elem.text
+            elif tag == 'trkpt' and parent_tag == 'trkseg':
+                track_lats.append(point_lat)
+                track_lons.append(point_lon)
+                track_eles.append(point_ele if point_ele is not None else math.nan)
+                track_times.append(point_time_str)
+                if is_first_point_of_container:
+                    is_first_point_of_container = False
+                    if first_track_point_time is None and point_time_str:
+                        first_track_point_time = _parse_time_naive(point_time_str)
+            elif tag == 'rtept' and parent_tag == 'rte':
+                route_lats.append(point_lat)
+                route_lons.append(point_lon)
+                route_eles.append(point_ele if point_ele is not None else math.nan)
+                if is_first_point_of_container:
+                    is_first_point_of_container = False
+                    if first_route_point_time is None and point_time_str:
+                        first_route_point_time = _parse_time_naive(point_time_str)
+            elif tag == 'name':
+                if parent_tag in ('gpx', 'metadata') and gpx_name is None:
+                    gpx_name = elem.text
+                elif parent_tag == 'trk' and track_count == 1 and first_track_name is None:
+                    first_track_name = elem.text
+                elif parent_tag == 'rte' and route_count == 1 and first_route_name is None:
+                    first_route_name = elem.text
+            elif tag == 'time' and parent_tag in ('gpx', 'metadata') and gpx_time is None:
+                gpx_time = _parse_time_naive(elem.text)
+
+            # Verarbeitetes Element sofort aus dem Baum entfernen (begrenzter Speicher)
+            if stack:
+                stack[-1].remove(elem)
+        if not chunk:
+            break
+
+    if not track_count and not route_count:
+        print(f"Warnung: Keine Tracks oder Routen in Datei {original_filename} gefunden.")
+        return None
+
+    track_name = gpx_name or first_track_name or first_route_name
+    if not track_name: # Fallback auf Dateinamen ohne Extension
+        track_name = original_filename.rsplit('.', 1)[0] if '.' in original_filename else original_filename
+
+    if track_lats:
+        latitudes, longitudes, elevations = track_lats, track_lons, track_eles
+    else: # Fallback auf Routenpunkte
+        latitudes, longitudes, elevations = route_lats, route_lons, route_eles
+
+    # Kennzahlen wie bisher nur aus Trackpunkten (reine Routen-Dateien: Distanz 0)
+    metrics = track_metrics.compute_track_metrics(track_lats, track_lons, track_eles,
+                                                  track_metrics.times_to_seconds(track_times), track_segment_starts)
+    return {
+        "original_filename": original_filename,
+        "track_name": track_name or "Unbenannter Track",
+        "track_date": gpx_time or first_track_point_time or first_route_point_time,
+        **metrics,
+        "bounds": bounds_from_arrays(latitudes, longitudes),
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "elevations": elevations,
+    }
+
+
+def _to_float_or_none(text: Optional[str]) -> Optional[float]:
+    if text is None or not text.strip():
+        return None
+    return float(text)
+
+
+def _parse_time_naive(text: Optional[str]) -> Optional[datetime]:
+    if not text or not text.strip():
+        return None
+    try:
+        parsed = gpxpy.gpxfield.parse_time(text.strip())
+    except gpxpy.gpx.GPXException:
+        return None
+    return parsed.replace(tzinfo=None) if parsed else None
+
+
+def bounds_from_arrays(latitudes: array, longitudes: array) -> Optional[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    """Bounding Box ((min_lat, min_lon), (max_lat, max_lon)) der Punkte oder None."""
+    if not latitudes:
+        return None
+    return ((min(latitudes), min(longitudes)), (max(latitudes), max(longitudes)))
+
+
+def _parse_gpx_data_with_gpxpy(original_filename: str, file_content_bytes: bytes) -> Optional[Dict[str, Any]]:
+    """Bisheriger gpxpy-basierter Parser, Fallback für Dateien, die der Streaming-Parser ablehnt."""
     try:
         gpx_content_str = file_content_bytes.decode('utf-8', errors='replace') # replace für ungültige Bytes
         gpx = gpxpy.parse(gpx_content_str)
@@ -40,7 +252,8 @@ def parse_gpx_data_from_content(original_filename: str, file_content_bytes: byte
         
         # Gesamtdistanz
         # gpx.length_3d() ist präferiert, dann gpx.length_2d()
-        distance_m = gpx.length_3d() if gpx.length_3d() is not None else (gpx.length_2d() if gpx.length_2d() is not None else 0.0)
+        length_3d_m = gpx.length_3d() # einmal berechnen, jeder Aufruf läuft über alle Punkte
+        distance_m = length_3d_m if length_3d_m is not None else (gpx.length_2d() or 0.0)
         distance_km = distance_m / 1000.0
 
         # Track-Datum (erster Zeitstempel im Track oder GPX-Metadaten)
@@ -71,17 +284,26 @@ def parse_gpx_data_from_content(original_filename: str, file_content_bytes: byte
         except Exception as e_ele:
             print(f"Warnung: Konnte Anstieg/Abstieg für {original_filename} nicht berechnen: {e_ele}")
 
-        # Geographische Punkte für die Kartenanzeige sammeln
-        points_list: List[List[float]] = []
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for point in segment.points:
-                    points_list.append([point.latitude, point.longitude])
-        if not points_list and gpx.routes: # Fallback auf Routenpunkte
-            for route in gpx.routes:
-                for point in route.points:
-                    points_list.append([point.latitude, point.longitude])
-        
+        # Geographische Punkte (inkl. Höhe) für Karte und Höhenprofil sammeln
+        latitudes, longitudes, elevations = array('d'), array('d'), array('d')
+        gpx_points = [point for track in gpx.tracks for segment in track.segments for point in segment.points]
+        if not gpx_points and gpx.routes: # Fallback auf Routenpunkte
+            gpx_points = [point for route in gpx.routes for point in route.points]
+        for point in gpx_points:
+            latitudes.append(point.latitude)
+            longitudes.append(point.longitude)
+            elevations.append(point.elevation if point.elevation is not None else math.nan)
+
+        # Zeit-/Geschwindigkeits- und Höhen-Kennzahlen wie im Streaming-Parser (nur Trackpunkte)
+        track_segments = [segment.points for track in gpx.tracks for segment in track.segments]
+        track_points = [point for segment_points in track_segments for point in segment_points]
+        segment_starts = list(accumulate([0] + [len(segment_points) for segment_points in track_segments[:-1]]))
+        track_times = [_get_time_from_gpx_element(point) for point in track_points]
+        extra_metrics = track_metrics.compute_track_metrics(
+            [point.latitude for point in track_points], [point.longitude for point in track_points],
+            [point.elevation if point.elevation is not None else math.nan for point in track_points],
+            track_metrics.times_to_seconds([time.isoformat() if time else None for time in track_times]), segment_starts)
+
         parsed_result = {
             "original_filename": original_filename,
             "track_name": track_name or "Unbenannter Track",
@@ -89,7 +311,11 @@ def parse_gpx_data_from_content(original_filename: str, file_content_bytes: byte
             "track_date": track_date_obj, # Kann None sein, DB sollte das erlauben (nullable=True)
             "total_ascent": round(uphill, 2),
             "total_descent": round(downhill, 2),
-            "points": points_list, # Für Karten-Polyline
+            **{column: extra_metrics[column] for column in track_metrics.METRIC_COLUMNS},
+            "bounds": bounds_from_arrays(latitudes, longitudes),
+            "latitudes": latitudes, # Für Karten-Polyline und Höhenprofil
+            "longitudes": longitudes,
+            "elevations": elevations,
             # "labels_list": [] # Wird initial leer sein, Bearbeitung später
         }
         # print(f"DEBUG gpx_utils: Parsed data for {original_filename}: {parsed_result}")
@@ -105,6 +331,213 @@ def parse_gpx_data_from_content(original_filename: str, file_content_bytes: byte
         return None
 
 
+# --- Export: mehrere GPX-Dateien zu einer zusammenführen (gestreamt) ---
+
+GPX_NAMESPACES = ("http://www.topografix.com/GPX/1/1", "http://www.topografix.com/GPX/1/0")
+_XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+GPX_EXPORT_TAGS = ("wpt", "rte", "trk") # Übernommene Elemente direkt unter <gpx>
+GPX_EXPORT_CREATOR = "GPX Track Manager"
+MERGED_GPX_FOOTER = "</gpx>\n"
+_XML_TEXT_SPECIAL = re.compile(r'[&<>]')
+_XML_ATTRIBUTE_SPECIAL = re.compile(r'[&<>"\n\r\t]')
+
+
+def merged_gpx_header(name: str, created: datetime) -> str:
+    """XML-Deklaration, <gpx>-Wurzel (GPX 1.1 als Default-Namensraum) und <metadata> der zusammengeführten Datei."""
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<gpx version="1.1" creator={quoteattr(GPX_EXPORT_CREATOR)} xmlns="{GPX_NAMESPACES[0]}">\n'
+            f'<metadata><name>{escape(name)}</name><time>{created.strftime("%Y-%m-%dT%H:%M:%SZ")}</time></metadata>\n')
+
+
+def _xml_text(text: str) -> str:
+    return escape(text) if _XML_TEXT_SPECIAL.search(text) else text
+
+
+def _xml_attribute(value: str) -> str:
+    return quoteattr(value) if _XML_ATTRIBUTE_SPECIAL.search(value) else f'"{value}"'
+
+
+def iter_gpx_elements_xml(original_filename: str, stream: BinaryIO, tags: Tuple[str, ...] = GPX_EXPORT_TAGS) -> Iterator[str]:
+    """
+    Die Elemente tags direkt unter <gpx> einer Datei als XML-Text für merged_gpx_header, stückweise je gelesenem
+    Block (Speicher unabhängig von der Dateigröße). GPX-Elemente (1.0/1.1) ohne Präfix, Erweiterungen behalten
+    ihren Namensraum. Reihenfolge wie in der Datei. Bei einem Fehler mitten in der Datei werden die offenen
+    Elemente geschlossen, die Ausgabe bleibt wohlgeformt.
+    """
+    parser = ET.XMLPullParser(events=('start-ns', 'start', 'end'))
+    stack: List[ET.Element] = []
+    # Je offenem Element: Name in der Ausgabe (None = wird nicht übernommen), hat Kindelemente, deklarierte Namensräume
+    output_names: List[Optional[str]] = []
+    has_children: List[bool] = []
+    scopes: List[frozenset] = []
+    prefixes: Dict[str, str] = {} # Namensraum -> Präfix in der Ausgabe (aus den Deklarationen der Datei)
+    names: Dict[str, Tuple[str, Optional[str]]] = {} # Cache: Tag/Attribut -> (Name in der Ausgabe, zu deklarierender Namensraum)
+    out: List[str] = []
+
+    def output_name(name: str) -> Tuple[str, Optional[str]]:
+        cached = names.get(name)
+        if cached is None:
+            namespace, _, local_name = name[1:].rpartition('}') if name[0] == '{' else ('', '', name)
+            if not namespace or namespace in GPX_NAMESPACES:
+                cached = (local_name, None)
+            elif namespace == _XML_NAMESPACE:
+                cached = (f"xml:{local_name}", None)
+            else:
+                if namespace not in prefixes:
+                    prefixes[namespace] = f"ns{len(prefixes)}"
+                cached = (f"{prefixes[namespace]}:{local_name}", namespace)
+            names[name] = cached
+        return cached
+
+    try:
+        while True:
+            chunk = stream.read(STREAM_CHUNK_SIZE_BYTES)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if not stack and _local_tag(elem.tag) != 'gpx':
+                        raise _GPXStreamFormatError(f"Wurzelelement <{_local_tag(elem.tag)}> statt <gpx>")
+                    parent_copied = bool(output_names) and output_names[-1] is not None
+                    if output_names:
+                        has_children[-1] = True
+                    name: Optional[str] = None
+                    scope: frozenset = frozenset()
+                    if parent_copied or (len(stack) == 1 and _local_tag(elem.tag) in tags):
+                        name, namespace = output_name(elem.tag)
+                        used_namespaces = [namespace] if namespace else []
+                        attributes = ""
+                        if elem.attrib:
+                            attribute_parts = []
+                            for key, value in elem.attrib.items():
+                                attribute_name, attribute_namespace = output_name(key)
+                                if attribute_namespace:
+                                    used_namespaces.append(attribute_namespace)
+                                attribute_parts.append(f" {attribute_name}={_xml_attribute(value)}")
+                            attributes = "".join(attribute_parts)
+                        if parent_copied:
+                            scope = scopes[-1]
+                            declared = {namespace for namespace in used_namespaces if namespace not in scope}
+                        else: # Übernommenes Element: alle bisher bekannten Namensräume der Datei deklarieren
+                            declared = set(prefixes)
+                        if declared:
+                            scope = scope | declared
+                            attributes = "".join(f' xmlns:{prefixes[namespace]}={_xml_attribute(namespace)}'
+                                                 for namespace in sorted(declared)) + attributes
+                        out.append(f"<{name}{attributes}>")
+                    stack.append(elem)
+                    output_names.append(name)
+                    has_children.append(False)
+                    scopes.append(scope)
+                    continue
+                if event == 'start-ns':
+                    prefix, namespace = elem
+                    if namespace not in GPX_NAMESPACES and namespace not in prefixes \
+                            and prefix and prefix != 'xml' and prefix not in prefixes.values():
+                        prefixes[namespace] = prefix
+                    continue
+
+                # event == 'end'
+                stack.pop()
+                scopes.pop()
+                name = output_names.pop()
+                if not has_children.pop() and name is not None and elem.text:
+                    out.append(_xml_text(elem.text))
+                if name is not None:
+                    out.append(f"</{name}>")
+                    if not output_names or output_names[-1] is None:
+                        out.append("\n")
+                # Verarbeitetes Element sofort aus dem Baum entfernen (begrenzter Speicher)
+                if stack:
+                    stack[-1].remove(elem)
+            if out:
+                yield "".join(out)
+                out.clear()
+            if not chunk:
+                break
+    except (ET.ParseError, _GPXStreamFormatError) as e:
+        print(f"Fehler beim Übernehmen von {original_filename} in den GPX-Export: {e}")
+        out.extend(f"</{name}>" for name in reversed(output_names) if name is not None)
+        if out:
+            yield "".join(out) + "\n"
+
+
+def pack_float_array(values: array) -> bytes:
+    """Serialisiert ein array('d') (oder float64-ndarray) plattformunabhängig (Little Endian) für die DB."""
+    if sys.byteorder != 'little':
+        values = array('d', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_float_array(blob: Optional[bytes]) -> array:
+    """Gegenstück zu pack_float_array."""
+    values = array('d')
+    if blob:
+        values.frombytes(blob)
+        if sys.byteorder != 'little':
+            values.byteswap()
+    return values
+
+
+def points_from_geometry(geometry: Dict[str, array]) -> List[List[float]]:
+    """Wandelt eine gespeicherte Geometrie in [[lat, lon], ...] für Leaflet um."""
+    return [[lat, lon] for lat, lon in zip(geometry["latitudes"], geometry["longitudes"])]
+
+
+# Genauigkeit (Nachkommastellen) des Encoded-Polyline-Formats für Kartengeometrien: 1e-5 Grad ≈ 1 m
+POLYLINE_PRECISION = 5
+
+
+def encode_polyline(columns: Any, precision: Any = POLYLINE_PRECISION) -> str:
+    """
+    Google Encoded Polyline (https://developers.google.com/maps/documentation/utilities/polylinealgorithm),
+    verallgemeinert auf beliebig viele Spalten: die Werte werden zeilenweise verschachtelt, je Spalte auf
+    `precision` Nachkommastellen gerundet (eine Zahl oder eine pro Spalte) und als Differenz zum Vorgänger
+    in 5-Bit-Blöcken als ASCII-Zeichen 63..126 kodiert. Typisch 2-4 Bytes pro Wert statt ca. 20 als JSON.
+    Gegenstück: decode_polyline (Python) und decodePolyline (Browser, main.py).
+    """
+    values = np.column_stack([np.asarray(column, dtype=np.float64) for column in columns])
+    if not values.size:
+        return ""
+    factors = 10.0 ** np.broadcast_to(np.asarray(precision, dtype=np.float64), values.shape[1:])
+    scaled = np.round(values * factors).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=0).ravel()
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64) # Vorzeichen ins unterste Bit
+    # Ein Block pro angefangene 5 Bit (mindestens einer), alle außer dem letzten mit Fortsetzungsbit 0x20
+    bit_lengths = np.zeros(len(zigzag), dtype=np.int64)
+    nonzero = zigzag > 0
+    bit_lengths[nonzero] = np.floor(np.log2(zigzag[nonzero].astype(np.float64))).astype(np.int64) + 1
+    chunk_counts = np.maximum((bit_lengths + 4) // 5, 1)
+    chunk_positions = np.arange(int(chunk_counts.max()))
+    chunks = (zigzag[:, None] >> (5 * chunk_positions[None, :]).astype(np.uint64)) & np.uint64(0x1f)
+    chunks |= np.where(chunk_positions[None, :] < chunk_counts[:, None] - 1, np.uint64(0x20), np.uint64(0))
+    # Boolesche Maske liest zeilenweise: Blöcke eines Werts bleiben in Reihenfolge hintereinander
+    encoded = (chunks[chunk_positions[None, :] < chunk_counts[:, None]] + np.uint64(63)).astype(np.uint8)
+    return encoded.tobytes().decode('ascii')
+
+
+def decode_polyline(encoded: str, precision: Any = POLYLINE_PRECISION, dimensions: int = 2) -> np.ndarray:
+    """Gegenstück zu encode_polyline: ndarray der Form (n, dimensions)."""
+    chunks = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if not len(chunks):
+        return np.zeros((0, dimensions))
+    value_ends = np.flatnonzero(chunks < 0x20)
+    value_starts = np.concatenate(([0], value_ends[:-1] + 1))
+    position_in_value = np.arange(len(chunks)) - np.repeat(value_starts, value_ends - value_starts + 1)
+    zigzag = np.add.reduceat((chunks & 0x1f) << (5 * position_in_value), value_starts)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    factors = 10.0 ** np.broadcast_to(np.asarray(precision, dtype=np.float64), (dimensions,))
+    return np.cumsum(deltas.reshape(-1, dimensions), axis=0) / factors
+
+
+def encode_geometry_polyline(geometry: Dict[str, array]) -> str:
+    """Kartengeometrie (lat, lon) als Encoded Polyline für Leaflet."""
+    return encode_polyline((geometry["latitudes"], geometry["longitudes"]))
+
+
 def get_points_from_gpx_file(gpx_filepath_str: str) -> List[List[float]]:
     """Extrahiert alle geographischen Punkte [[lat, lon], ...] aus einer GPX-Datei."""
     points = []
@@ -173,60 +606,326 @@ def get_bounds_for_points(points_list: List[List[float]]) -> Optional[Tuple[Tupl
         return None
 
 
-def get_elevation_data_for_chart(gpx_filepath_str: str) -> Optional[Dict[str, Any]]:
+# Vereinfachungsstufen (Level-of-Detail) für die Kartenanzeige: (Toleranz in Metern, maximaler Zoom).
+# Die Toleranz entspricht grob einem Pixel beim jeweiligen Zoom in mittleren Breiten.
+# Oberhalb des Zooms der letzten Stufe wird die volle Geometrie angezeigt.
+LOD_LEVELS: List[Tuple[float, int]] = [(400.0, 8), (100.0, 10), (25.0, 12), (6.0, 14)]
+
+
+def lod_level_for_zoom(zoom: Optional[float]) -> Optional[int]:
+    """Index in LOD_LEVELS für den Leaflet-Zoom oder None für die volle Geometrie."""
+    if zoom is None:
+        return 0
+    for level, (_, max_zoom) in enumerate(LOD_LEVELS):
+        if zoom <= max_zoom:
+            return level
+    return None
+
+
+def compute_point_significance(latitudes: array, longitudes: array, min_tolerance_m: float = 0.0) -> np.ndarray:
     """
-    Extrahiert Höhendaten entlang der Strecke für ein Chart.
-    Gibt ein Dict zurück: {"categories": [distanzen_km], "series_data": [höhen_m]}
+    Douglas-Peucker-Rangfolge: Für jeden Punkt die Toleranz (in Metern), bis zu der er erhalten bleibt.
+    Werte werden auf die Toleranz des übergeordneten Schritts begrenzt, sodass die Stufen verschachtelt sind
+    (ein Punkt einer groben Stufe ist in jeder feineren enthalten). Endpunkte erhalten inf.
+    Unterhalb von min_tolerance_m wird nicht weiter unterteilt (Signifikanz 0).
     """
-    categories_dist_km: List[float] = []
-    series_elev_m: List[float] = []
-    current_total_distance_km = 0.0
-    
-    try:
-        with open(gpx_filepath_str, 'r', encoding='utf-8') as f:
-            gpx_file_content = f.read()
-            if not gpx_file_content.strip(): return None
-            gpx = gpxpy.parse(gpx_file_content)
+    n = len(latitudes)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+    significance[0] = significance[-1] = np.inf
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    # Flächentreue genug für die Vereinfachung: äquirektanguläre Projektion um die mittlere Breite
+    x = lon * (math.cos(math.radians(float(lat.mean()))) * gpxpy.geo.ONE_DEGREE)
+    y = lat * gpxpy.geo.ONE_DEGREE
 
-        all_gpx_points_in_order = []
-        for track in gpx.tracks:
-            for segment in track.segments:
-                all_gpx_points_in_order.extend(segment.points)
-        if not all_gpx_points_in_order and gpx.routes: # Fallback
-            for route in gpx.routes:
-                all_gpx_points_in_order.extend(route.points)
-        
-        if not all_gpx_points_in_order:
-            return None
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, parent_significance = stack.pop()
+        if last - first < 2:
+            continue
+        xs, ys = x[first + 1:last], y[first + 1:last]
+        x0, y0 = x[first], y[first]
+        dx, dy = x[last] - x0, y[last] - y0
+        segment_len_sq = dx * dx + dy * dy
+        if segment_len_sq > 0: # Abstand zur Strecke first-last (nicht zur Geraden, wichtig für Rundkurse)
+            t = np.clip(((xs - x0) * dx + (ys - y0) * dy) / segment_len_sq, 0.0, 1.0)
+            distances = np.hypot(xs - (x0 + t * dx), ys - (y0 + t * dy))
+        else:
+            distances = np.hypot(xs - x0, ys - y0)
+        max_pos = int(distances.argmax())
+        max_distance = float(distances[max_pos])
+        if max_distance < min_tolerance_m:
+            continue
+        split = first + 1 + max_pos
+        split_significance = min(max_distance, parent_significance)
+        significance[split] = split_significance
+        stack.append((first, split, split_significance))
+        stack.append((split, last, split_significance))
+    return significance
 
-        previous_point_for_dist_calc = None
-        for point in all_gpx_points_in_order:
-            if point.elevation is not None: # Nur Punkte mit Höhendaten berücksichtigen
-                if previous_point_for_dist_calc:
-                    # Berechne Distanzinkrement zum vorherigen Punkt (egal ob dieser Höhe hatte)
-                    # distance_increment_m = point.distance_3d(previous_point_for_dist_calc) # 3D ist genauer
-                    # Robuster für Chart: 2D-Distanz, da Höhen oft ungenau sind
-                    distance_increment_m = point.distance_2d(previous_point_for_dist_calc)
-                    if distance_increment_m is not None:
-                         current_total_distance_km += distance_increment_m / 1000.0
-                
-                categories_dist_km.append(round(current_total_distance_km, 3))
-                series_elev_m.append(round(point.elevation, 2))
-            
-            # Aktualisiere immer den previous_point_for_dist_calc, um die Distanz kontinuierlich zu machen
-            previous_point_for_dist_calc = point 
 
-        if categories_dist_km and series_elev_m:
-            return {"categories": categories_dist_km, "series_data": series_elev_m}
+def build_lod_geometries(geometry: Dict[str, array]) -> List[Dict[str, Any]]:
+    """
+    Berechnet die vereinfachten Geometrien aller LOD_LEVELS in einem Douglas-Peucker-Durchlauf.
+    Gibt [{"level", "tolerance_m", "latitudes", "longitudes"}, ...] zurück (Arrays als float64-ndarray).
+    """
+    latitudes, longitudes = geometry["latitudes"], geometry["longitudes"]
+    if not len(latitudes):
+        return []
+    finest_tolerance_m = min(tolerance for tolerance, _ in LOD_LEVELS)
+    significance = compute_point_significance(latitudes, longitudes, min_tolerance_m=finest_tolerance_m)
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    lod_geometries = []
+    for level, (tolerance_m, _) in enumerate(LOD_LEVELS):
+        keep = significance >= tolerance_m
+        lod_geometries.append({
+            "level": level,
+            "tolerance_m": tolerance_m,
+            "latitudes": lat[keep],
+            "longitudes": lon[keep],
+        })
+    return lod_geometries
+
+
+# Maximale Anzahl Punkte, die an das Höhenprofil-Chart gesendet werden (LTTB-Downsampling)
+ELEVATION_CHART_MAX_POINTS = 800
+
+
+def haversine_distances_m(latitudes: Any, longitudes: Any) -> np.ndarray:
+    """Vektorisierte Haversine-Distanzen (Meter) zwischen aufeinanderfolgenden Punkten (Länge n-1)."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    if len(lat) < 2:
+        return np.zeros(0)
+    d_lat = np.diff(lat)
+    d_lon = np.diff(lon)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(d_lon / 2) ** 2
+    return 2 * gpxpy.geo.EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def compute_elevation_profile(geometry: Dict[str, array]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Volles Höhenprofil einer Geometrie: (distanzen_km, höhen_m) als ndarrays.
+    Die Distanz läuft über alle Punkte, ins Profil kommen nur Punkte mit Höhe.
+    """
+    elevations = np.asarray(geometry["elevations"], dtype=np.float64)
+    if not len(elevations):
         return None
-        
+    cumulative_km = np.concatenate(([0.0], np.cumsum(haversine_distances_m(geometry["latitudes"], geometry["longitudes"])))) / 1000.0
+    has_elevation = ~np.isnan(elevations)
+    if not has_elevation.any():
+        return None
+    return cumulative_km[has_elevation], elevations[has_elevation]
+
+
+def lttb_downsample_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: wählt `threshold` Indizes, die die Form der Kurve erhalten
+    (Spitzen und Täler bleiben sichtbar). Erster und letzter Punkt sind immer enthalten.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold-2 Buckets zwischen erstem und letztem Punkt
+    bucket_edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_end = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(areas.argmax())
+        indices[bucket + 1] = selected
+    return indices
+
+
+def _elevation_chart_window(distances_km: np.ndarray, elevations_m: np.ndarray, max_points: int,
+                            start_km: Optional[float], end_km: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    if start_km is not None or end_km is not None:
+        first = max(int(np.searchsorted(distances_km, start_km if start_km is not None else -np.inf, side='left')) - 1, 0)
+        last = min(int(np.searchsorted(distances_km, end_km if end_km is not None else np.inf, side='right')) + 1, len(distances_km))
+        distances_km, elevations_m = distances_km[first:last], elevations_m[first:last]
+    indices = lttb_downsample_indices(distances_km, elevations_m, max_points)
+    return distances_km[indices], elevations_m[indices]
+
+
+def get_elevation_chart_series(distances_km: np.ndarray, elevations_m: np.ndarray,
+                               max_points: int = ELEVATION_CHART_MAX_POINTS,
+                               start_km: Optional[float] = None, end_km: Optional[float] = None) -> List[List[float]]:
+    """
+    [[km, m], ...] für eine echart-Serie mit Wert-Achse, auf max_points reduziert.
+    Mit start_km/end_km wird nur der Ausschnitt (in voller Auflösung als Basis) reduziert,
+    plus je ein Nachbarpunkt, damit die Linie am Rand nicht abbricht.
+    """
+    distances_km, elevations_m = _elevation_chart_window(distances_km, elevations_m, max_points, start_km, end_km)
+    return np.column_stack((np.round(distances_km, 3), np.round(elevations_m, 2))).tolist()
+
+
+# Genauigkeit der kodierten Höhenprofil-Serie: Distanz auf Meter (3 Stellen km), Höhe auf Dezimeter
+ELEVATION_CHART_PRECISION = (3, 1)
+
+
+def get_elevation_chart_series_encoded(distances_km: np.ndarray, elevations_m: np.ndarray,
+                                       max_points: int = ELEVATION_CHART_MAX_POINTS,
+                                       start_km: Optional[float] = None, end_km: Optional[float] = None) -> str:
+    """Wie get_elevation_chart_series, aber als Encoded Polyline mit ELEVATION_CHART_PRECISION (decodePolyline im Browser)."""
+    distances_km, elevations_m = _elevation_chart_window(distances_km, elevations_m, max_points, start_km, end_km)
+    return encode_polyline((distances_km, elevations_m), ELEVATION_CHART_PRECISION)
+
+
+def get_elevation_data_for_chart(gpx_filepath_str: str, max_points: int = ELEVATION_CHART_MAX_POINTS) -> Optional[Dict[str, Any]]:
+    """
+    Höhenprofil direkt aus einer GPX-Datei (Streaming-Parser, vektorisierte Distanzen, LTTB).
+    Gibt ein Dict zurück: {"series_data": [[distanz_km, höhe_m], ...], "total_km": float}
+    """
+    try:
+        with open(gpx_filepath_str, 'rb') as f:
+            parsed = parse_gpx_data_from_stream(gpx_filepath_str, f)
+        if not parsed:
+            return None
+        profile = compute_elevation_profile(parsed)
+        if profile is None:
+            return None
+        distances_km, elevations_m = profile
+        return {
+            "series_data": get_elevation_chart_series(distances_km, elevations_m, max_points=max_points),
+            "total_km": round(float(distances_km[-1]), 3),
+        }
     except FileNotFoundError:
         print(f"Fehler: GPX-Datei nicht gefunden für Höhenprofil: {gpx_filepath_str}")
         return None
-    except gpxpy.gpx.GPXXMLSyntaxException as e_gpx_syntax:
-        print(f"GPX Syntax Fehler beim Lesen der Höhendaten aus {gpx_filepath_str}: {e_gpx_syntax}")
-        return None
     except Exception as e:
         print(f"Fehler beim Extrahieren der Höhendaten aus {gpx_filepath_str}: {e}")
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+
+# --- Dichte-Heatmap (Kacheln im Web-Mercator-Raster, siehe db_config.TrackDensityCellDB) ---
+# Eine Zelle ist ein Pixel einer 256er-Kachel der jeweiligen Zoomstufe. Gespeichert werden nur die Stufen
+# 0..HEATMAP_MAX_STORED_ZOOM (die Zeilenzahl wächst je Stufe um Faktor 2 bis 4); Kacheln bis HEATMAP_MAX_ZOOM
+# entstehen beim Abruf aus den Geometrien der Kachel (heatmap_tile_cells), darüber skaliert Leaflet (maxNativeZoom).
+HEATMAP_MAX_ZOOM = 13 # ca. 13 m pro Zelle in Mitteleuropa
+HEATMAP_MAX_STORED_ZOOM = 10 # ca. 100 m pro Zelle
+HEATMAP_TILE_SIZE = 256
+HEATMAP_SATURATION_TRACKS = 50 # Ab so vielen Tracks pro Zelle volle Farbe (logarithmische Skala)
+HEATMAP_MAX_GAP_PIXELS = HEATMAP_TILE_SIZE # Längere Sprünge (GPS-Aussetzer) werden nicht durchgezogen
+# Farbverlauf (gelb -> dunkelrot) mit zunehmender Deckkraft
+HEATMAP_COLOR_STOPS = np.array([
+    [255, 237, 160, 110],
+    [254, 178, 76, 170],
+    [240, 59, 32, 210],
+    [189, 0, 38, 240],
+], dtype=np.float64)
+_MERCATOR_MAX_LAT = 85.05112878
+
+
+def _mercator_pixels(latitudes: Any, longitudes: Any, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Weltpixel-Koordinaten (x, y) der Punkte in der Zoomstufe
+    lat = np.clip(np.asarray(latitudes, dtype=np.float64), -_MERCATOR_MAX_LAT, _MERCATOR_MAX_LAT)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    world_pixels = HEATMAP_TILE_SIZE * 2 ** zoom
+    lat_rad = np.radians(lat)
+    return ((lon + 180.0) / 360.0 * world_pixels,
+            (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * world_pixels)
+
+
+def _line_pixels(x: np.ndarray, y: np.ndarray, segments: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Punkte entlang der Verbindungen aufeinanderfolgender Punkte (höchstens 1 Pixel Abstand), samt Endpunkten.
+    # segments: Maske der zu zeichnenden Verbindungen (Standard: alle)
+    dx, dy = np.diff(x), np.diff(y)
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+    steps[(steps < 1) | (steps > HEATMAP_MAX_GAP_PIXELS)] = 1
+    indices = np.arange(len(steps)) if segments is None else np.flatnonzero(segments)
+    segment_steps = steps[indices]
+    segment = np.repeat(indices, segment_steps)
+    fraction = (np.arange(len(segment)) - np.repeat(np.cumsum(segment_steps) - segment_steps, segment_steps)) / steps[segment]
+    return (np.concatenate((x[segment] + dx[segment] * fraction, x[indices + 1])),
+            np.concatenate((y[segment] + dy[segment] * fraction, y[indices + 1])))
+
+
+def heatmap_cells(latitudes: Any, longitudes: Any, max_zoom: int = HEATMAP_MAX_STORED_ZOOM) -> Dict[int, np.ndarray]:
+    """
+    Zellen, die ein Track berührt, je Zoomstufe 0..max_zoom: {zoom: ndarray (k, 2) mit eindeutigen (x, y)}.
+    Aufeinanderfolgende Punkte werden im Raster der höchsten Stufe verbunden, damit auch dünn
+    aufgezeichnete Tracks eine durchgehende Linie ergeben. Jeder Track zählt pro Zelle nur einmal.
+    """
+    if not len(latitudes):
+        return {}
+    x, y = _mercator_pixels(latitudes, longitudes, max_zoom)
+    if len(x) > 1:
+        x, y = _line_pixels(x, y)
+    world_pixels = HEATMAP_TILE_SIZE * 2 ** max_zoom
+    cells = np.unique(np.column_stack((
+        np.clip(np.floor(x), 0, world_pixels - 1), np.clip(np.floor(y), 0, world_pixels - 1))).astype(np.int64), axis=0)
+    cells_by_zoom = {max_zoom: cells}
+    for zoom in range(max_zoom - 1, -1, -1):
+        cells = np.unique(cells >> 1, axis=0)
+        cells_by_zoom[zoom] = cells
+    return cells_by_zoom
+
+
+def heatmap_tile_bbox(zoom: int, tile_x: int, tile_y: int) -> Tuple[float, float, float, float]:
+    """Rechteck (min_lat, min_lon, max_lat, max_lon) einer Web-Mercator-Kachel."""
+    def latitude(pixel_y: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * pixel_y / 2 ** zoom))))
+    return (latitude(tile_y + 1), tile_x / 2 ** zoom * 360.0 - 180.0,
+            latitude(tile_y), (tile_x + 1) / 2 ** zoom * 360.0 - 180.0)
+
+
+def heatmap_tile_cells(geometries: List[Dict[str, Any]], zoom: int, tile_x: int,
+                       tile_y: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Zellen einer Kachel direkt aus Geometrien (für Stufen über HEATMAP_MAX_STORED_ZOOM): (x, y relativ zur
+    Kachel, Track-Anzahl) wie db_config.get_density_tile_cells. Gezeichnet werden nur Verbindungen, deren
+    Rechteck die Kachel schneidet, der Aufwand hängt also kaum von der Länge der Tracks ab.
+    """
+    min_x, min_y = tile_x * HEATMAP_TILE_SIZE, tile_y * HEATMAP_TILE_SIZE
+    cell_arrays = []
+    for geometry in geometries:
+        if not len(geometry["latitudes"]):
+            continue
+        x, y = _mercator_pixels(geometry["latitudes"], geometry["longitudes"], zoom)
+        if len(x) > 1:
+            touches_tile = (np.maximum(x[:-1], x[1:]) >= min_x) & (np.minimum(x[:-1], x[1:]) < min_x + HEATMAP_TILE_SIZE) \
+                & (np.maximum(y[:-1], y[1:]) >= min_y) & (np.minimum(y[:-1], y[1:]) < min_y + HEATMAP_TILE_SIZE)
+            x, y = _line_pixels(x, y, touches_tile)
+        cells = np.column_stack((np.floor(x) - min_x, np.floor(y) - min_y)).astype(np.int64)
+        cells = cells[((cells >= 0) & (cells < HEATMAP_TILE_SIZE)).all(axis=1)]
+        if len(cells):
+            cell_arrays.append(np.unique(cells, axis=0)) # Jeder Track zählt pro Zelle nur einmal
+    if not cell_arrays:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    cells, track_counts = np.unique(np.concatenate(cell_arrays), axis=0, return_counts=True)
+    return cells[:, 0], cells[:, 1], track_counts
+
+
+def _png_rgba(pixels: np.ndarray) -> bytes:
+    # Minimaler PNG-Encoder (RGBA, 8 Bit, Filter "None" je Zeile), damit kein Bildmodul nötig ist
+    height, width = pixels.shape[:2]
+    raw = np.concatenate((np.zeros((height, 1), dtype=np.uint8), pixels.reshape(height, width * 4)), axis=1)
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def render_heatmap_tile(cell_x: np.ndarray, cell_y: np.ndarray, track_counts: np.ndarray) -> bytes:
+    """PNG-Kachel (HEATMAP_TILE_SIZE²) aus Zellen mit Koordinaten relativ zur Kachel und ihrer Track-Anzahl."""
+    pixels = np.zeros((HEATMAP_TILE_SIZE, HEATMAP_TILE_SIZE, 4), dtype=np.uint8)
+    if len(track_counts):
+        intensity = np.clip(np.log1p(np.asarray(track_counts, dtype=np.float64)) / math.log1p(HEATMAP_SATURATION_TRACKS), 0.0, 1.0)
+        stop_positions = np.linspace(0.0, 1.0, len(HEATMAP_COLOR_STOPS))
+        colors = np.column_stack([np.interp(intensity, stop_positions, HEATMAP_COLOR_STOPS[:, channel]) for channel in range(4)])
+        pixels[np.asarray(cell_y), np.asarray(cell_x)] = np.round(colors).astype(np.uint8)
+    return _png_rgba(pixels)
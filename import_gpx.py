@@ -0,0 +1,167 @@
+# projekt_gpx_viewer/import_gpx.py
+"""
+Massen-Import eines GPX-Archivs von der Kommandozeile:
+
+    python -m import_gpx VERZEICHNIS [--workers N] [--batch-size N]
+
+Nutzt dieselbe Verarbeitung wie der Upload (gpx_ingest.prepare_gpx_upload, db_config.add_track-Logik),
+parst die Dateien in einem Prozess-Pool und speichert sie in Batches von --batch-size Tracks pro Transaktion.
+Bereits importierte Dateien (gleicher Pfad, Größe und Änderungszeit, siehe imported_files) werden
+übersprungen, ein abgebrochener Lauf kann also einfach erneut gestartet werden. Dateien, deren Inhalt
+(SHA-256) schon gespeichert ist, werden ohne Parsen als Duplikat vermerkt.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+import traceback
+
+import db_config
+import gpx_ingest
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def find_gpx_files(directory: Path) -> List[Path]:
+    """Alle .gpx-Dateien unterhalb von directory (rekursiv, Groß-/Kleinschreibung egal), sortiert."""
+    return sorted(p for p in directory.rglob('*') if p.is_file() and p.suffix.lower() == '.gpx')
+
+
+def _flush_batch(batch: List[Dict[str, Any]], duplicates: List[Tuple[Dict[str, Any], Optional[int]]],
+                 waiting: Dict[str, List[Dict[str, Any]]], known_content: Dict[str, int], stats: Dict[str, float]) -> None:
+    if not batch and not duplicates:
+        return
+    db = db_config.SessionLocal()
+    try:
+        track_ids = db_config.add_tracks_batch(db, batch)
+        for parsed_gpx_data, track_id in zip(batch, track_ids):
+            # Dateien mit gleichem Inhalt erst jetzt zuordnen, da die Track-ID feststeht
+            same_content = waiting.pop(parsed_gpx_data["content_hash"], [])
+            if track_id:
+                known_content[parsed_gpx_data["content_hash"]] = track_id
+                duplicates.extend((source, track_id) for source in same_content)
+                stats["imported"] += 1
+                stats["duplicates"] += len(same_content)
+                stats["points"] += len(parsed_gpx_data["latitudes"])
+            else:
+                stats["failed"] += 1 + len(same_content)
+        db_config.record_imported_duplicates(db, duplicates)
+    finally:
+        db.close()
+    duplicates.clear()
+    batch.clear()
+
+
+def run_import(directory: Path, workers: int = gpx_ingest.GPX_PARSE_WORKERS,
+               batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, float]:
+    """Importiert alle neuen/geänderten GPX-Dateien aus directory und gibt Statistiken zurück."""
+    started = time.perf_counter()
+    stats: Dict[str, float] = {"found": 0, "skipped": 0, "duplicates": 0, "imported": 0, "failed": 0, "points": 0}
+
+    db = db_config.SessionLocal()
+    try:
+        known_signatures = db_config.get_imported_file_signatures(db)
+        known_content = db_config.get_track_ids_by_content_hash(db) # Duplikate ohne Parsen erkennen
+    finally:
+        db.close()
+
+    pending_files = []
+    for path in find_gpx_files(directory):
+        stats["found"] += 1
+        source_path = str(path.resolve())
+        file_stat = path.stat()
+        if known_signatures.get(source_path) == (file_stat.st_size, file_stat.st_mtime):
+            stats["skipped"] += 1
+            continue
+        pending_files.append({"path": source_path, "size": file_stat.st_size, "mtime": file_stat.st_mtime})
+    print(f"{int(stats['found'])} GPX-Dateien gefunden, {int(stats['skipped'])} bereits importiert, "
+          f"{len(pending_files)} zu verarbeiten ({workers} Worker, Batches à {batch_size}).")
+
+    batch: List[Dict[str, Any]] = []
+    duplicates: List[Tuple[Dict[str, Any], Optional[int]]] = []
+    # Dateien mit dem Inhalt einer noch nicht gespeicherten Datei (wird geparst bzw. wartet im Batch), je Inhalts-Hash.
+    # Sie werden erst mit deren Track-ID als Duplikat vermerkt; scheitert diese, bleiben sie für den nächsten Lauf offen.
+    waiting: Dict[str, List[Dict[str, Any]]] = {}
+    in_flight: Dict[Future, Tuple[Dict[str, Any], str]] = {}
+    max_in_flight = workers * 4 # Begrenzt den Speicher für fertig geparste, noch nicht gespeicherte Tracks
+    next_file = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while next_file < len(pending_files) or in_flight:
+                while next_file < len(pending_files) and len(in_flight) < max_in_flight:
+                    source = pending_files[next_file]
+                    next_file += 1
+                    with open(source["path"], 'rb') as f:
+                        file_content_bytes = f.read()
+                    content_hash = db_config.gpx_content_hash(file_content_bytes)
+                    if content_hash in known_content:
+                        duplicates.append((source, known_content[content_hash]))
+                        stats["duplicates"] += 1
+                        continue
+                    if content_hash in waiting:
+                        waiting[content_hash].append(source)
+                        continue
+                    waiting[content_hash] = []
+                    in_flight[executor.submit(gpx_ingest.prepare_gpx_upload, os.path.basename(source["path"]),
+                                              file_content_bytes)] = (source, content_hash)
+                if not in_flight:
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, content_hash = in_flight.pop(future)
+                    try:
+                        parsed_gpx_data: Optional[Dict[str, Any]] = future.result()
+                    except Exception as e:
+                        print(f"Fehler beim Parsen von {source['path']}: {e}")
+                        parsed_gpx_data = None
+                    if not parsed_gpx_data:
+                        stats["failed"] += 1 + len(waiting.pop(content_hash, [])) # gleicher Inhalt, gleiches Ergebnis
+                        continue
+                    parsed_gpx_data["import_source"] = source
+                    batch.append(parsed_gpx_data)
+                    if len(batch) >= batch_size:
+                        _flush_batch(batch, duplicates, waiting, known_content, stats)
+                        print(f"  {int(stats['imported'])}/{len(pending_files)} importiert ...")
+    finally:
+        # Auch bei Abbruch (Strg+C) die bereits geparsten Tracks speichern
+        _flush_batch(batch, duplicates, waiting, known_content, stats)
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Importiert alle GPX-Dateien eines Verzeichnisses in die Track-Datenbank.")
+    arg_parser.add_argument("directory", type=Path, help="Verzeichnis mit GPX-Dateien (wird rekursiv durchsucht)")
+    arg_parser.add_argument("--workers", type=int, default=gpx_ingest.GPX_PARSE_WORKERS,
+                            help=f"Anzahl Parse-Prozesse (Standard: {gpx_ingest.GPX_PARSE_WORKERS})")
+    arg_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Tracks pro DB-Transaktion (Standard: {DEFAULT_BATCH_SIZE})")
+    args = arg_parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        print(f"Fehler: {args.directory} ist kein Verzeichnis.")
+        return 2
+    try:
+        db_config.init_database()
+        stats = run_import(args.directory, workers=max(args.workers, 1), batch_size=max(args.batch_size, 1))
+    except KeyboardInterrupt:
+        print("Abgebrochen. Bereits gespeicherte Tracks bleiben erhalten, ein erneuter Lauf setzt fort.")
+        return 130
+    except Exception as e:
+        print(f"Import fehlgeschlagen: {e}")
+        traceback.print_exc()
+        return 1
+
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"Fertig in {seconds:.1f} s: {int(stats['imported'])} importiert, {int(stats['skipped'])} übersprungen, "
+          f"{int(stats['duplicates'])} Duplikate, {int(stats['failed'])} fehlgeschlagen.")
+    print(f"Durchsatz: {stats['imported'] / seconds:.1f} Dateien/s, {stats['points'] / seconds:,.0f} Punkte/s")
+    return 0 if not stats["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
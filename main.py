@@ -1,15 +1,22 @@
 # projekt_gpx_viewer/main.py
-from nicegui import ui, app, Client
+from nicegui import ui, app, Client, background_tasks
 from datetime import datetime
 import json
 from typing import List, Dict, Any, Optional, Tuple, Set # Set hier importiert, wird aber nur intern verwendet
 import asyncio
+import math
 import traceback
 from pathlib import Path
 
 # Lokale Importe
 import db_config
+import db_async # Async-Variante der DB-Funktionen für die Handler (blockiert den Event-Loop nicht)
 import gpx_utils
+import gpx_ingest
+import track_reanalysis # Dichteraster und Neuberechnung älterer Tracks im Hintergrund
+import client_state
+import metrics
+import track_api # registriert die HTTP-Routen (/api/tracks/...)
 import design
 
 # Global variables for the edit dialog (not stored in app.storage)
@@ -18,35 +25,76 @@ name_input_for_dialog: Optional[ui.input] = None
 labels_input_for_dialog: Optional[ui.input] = None
 current_editing_track_id: Optional[int] = None
 
+# Browse-Modus der Karte: alle Tracks im sichtbaren Ausschnitt nachladen
+VIEWPORT_DEBOUNCE_SECONDS = 0.3 # Wartezeit nach der letzten Kartenbewegung
+VIEWPORT_MAX_TRACKS = 500 # Mehr Tracks pro Ausschnitt werden nicht gezeichnet (hineinzoomen)
+
+# Heatmap aller Tracks: Kacheln aus dem Dichteraster (track_api.get_heatmap_tile_route)
+HEATMAP_TILE_URL = '/api/heatmap/{z}/{x}/{y}.png'
+
+# Tabelle: serverseitige Seiten (Quasar @request), es wird nur die sichtbare Seite übertragen
+TABLE_ROWS_PER_PAGE = 50
+SEARCH_DEBOUNCE_MS = 300 # Suche erst nach dieser Tipp-Pause auslösen (Quasar-Prop debounce)
+
 # Lade Leaflet CSS explizit
 ui.add_head_html('<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" integrity="sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY=" crossorigin=""/>')
+# Encoded Polyline (gpx_utils.encode_polyline) dekodieren: precision je Spalte, Ergebnis [[wert, ...], ...]
+# Track-Polylinien tragen ihre Geometrie-URL in den Optionen (geometryUrl) und laden die Punkte beim Hinzufügen
+# zur Karte selbst per HTTP (siehe track_api.py, der Browser-Cache greift). Das gilt auch für Layer, die NiceGUI
+# nach einem Reconnect oder Neuaufbau der Karte aus den gespeicherten args neu anlegt.
+ui.add_head_html('''<script>
+function decodePolyline(encoded, precision = 5, dimensions = 2) {
+  const factors = Array.from({length: dimensions}, (_, i) => 10 ** (Array.isArray(precision) ? precision[i] : precision));
+  const last = new Array(dimensions).fill(0);
+  const rows = [];
+  let index = 0;
+  while (index < encoded.length) {
+    const row = new Array(dimensions);
+    for (let d = 0; d < dimensions; d++) {
+      let result = 0, factor = 1, chunk;
+      do {
+        chunk = encoded.charCodeAt(index++) - 63;
+        result += (chunk & 0x1f) * factor; // Multiplikation statt Shift: Werte über 2^31 bleiben korrekt
+        factor *= 32;
+      } while (chunk >= 0x20);
+      last[d] += result % 2 ? -(result + 1) / 2 : result / 2;
+      row[d] = last[d] / factors[d];
+    }
+    rows.push(row);
+  }
+  return rows;
+}
+async function loadTrackGeometry(layer) {
+  const url = layer.options?.geometryUrl;
+  if (!url || layer.geometryRequested) return;
+  layer.geometryRequested = true;
+  const response = await fetch(url);
+  if (response.ok) layer.setLatLngs(decodePolyline(await response.text()));
+}
+function installTrackGeometryLoader(mapId) {
+  const map = getElement(mapId)?.map;
+  if (!map || map.trackGeometryLoader) return;
+  map.trackGeometryLoader = true;
+  map.eachLayer(loadTrackGeometry); // schon vor dieser Installation hinzugefügte Layer
+  map.on('layeradd', (e) => loadTrackGeometry(e.layer));
+}
+</script>''')
 styled_header = design.apply_design_and_get_header()
 
 
 async def init_app_storage(client: Client):
     await client.connected()
-    db = db_config.SessionLocal()
-    try:
-        app.storage.user.setdefault('tracks_in_table_data', []) # List[Dict]
-        # all_db_labels_options wird dynamisch in update_all_db_labels_options_ui gesetzt
-        app.storage.user.setdefault('selected_track_ids_list', []) # <--- Speichere IDs als LISTE
-        app.storage.user.setdefault('filter_date_from_str', None) # String
-        app.storage.user.setdefault('filter_date_to_str', None) # String
-        app.storage.user.setdefault('filter_labels_list', []) # List[str]
-        app.storage.user.setdefault('map_needs_initial_fit', True) # Boolean
-    finally:
-        db.close()
-    
-    print("DEBUG: init_app_storage complete.")
+    # Auswahl, Tabellen- und Kartendaten liegen im Prozess-Speicher (client_state), persistiert werden nur die Filter
+    state = client_state.get_client_state()
+    client.on_disconnect(state.flush_prefs) # Ausstehende Filteränderungen nicht verlieren
+
     # Initiales Laden der Tracks nach kurzer Verzögerung
     ui.timer(0.5, initial_load_and_map_setup, once=True)
 
 
 async def initial_load_and_map_setup():
-    print("DEBUG: initial_load_and_map_setup called.")
     map_view = app.storage.client.get('ui_map_view')
     if map_view:
-        print("DEBUG: Running invalidateSize on map_view.")
         # Leaflet braucht manchmal einen Tick, nachdem es im DOM ist
         map_view.run_method('invalidateSize')
         await asyncio.sleep(0.1) 
@@ -61,6 +109,7 @@ async def main_page(client: Client):
     global edit_dialog_instance, name_input_for_dialog, labels_input_for_dialog
 
     styled_header()
+    state = client_state.get_client_state()
 
     with ui.column().classes('w-full p-4 items-center gap-4'):
         with ui.row().classes('w-full max-w-6xl justify-center gap-4'):
@@ -68,37 +117,60 @@ async def main_page(client: Client):
                 with ui.card_section(): ui.label('GPX Hochladen').classes('text-lg font-semibold')
                 ui.separator()
                 with ui.card_section():
+                    # Alle ausgewählten Dateien kommen gebündelt an und werden parallel verarbeitet
                     ui.upload(label='GPX-Datei(en) auswählen oder hierhin ziehen',
-                               on_upload=handle_gpx_upload, multiple=True, auto_upload=True) \
+                               on_multi_upload=handle_gpx_multi_upload, multiple=True, auto_upload=True) \
                         .props('accept=".gpx" flat bordered').classes('w-full')
+                    upload_progress_ui = ui.column().classes('w-full gap-0 mt-2')
             
             with ui.card().classes('w-full md:w-1/2 lg:w-2/3 shadow-lg'):
                 with ui.card_section(): ui.label('Filter').classes('text-lg font-semibold')
                 ui.separator()
                 with ui.card_section(), ui.column().classes('gap-2'):
+                    # Volltextsuche (FTS5, Präfixe); ohne gewählte Spalte sortiert die Tabelle nach Trefferqualität
+                    search_input_ui = ui.input(
+                        label='Suche (Name, Datei, Labels)',
+                        value=state.prefs['filter_search_text'],
+                        on_change=lambda e: update_filter_settings('search', e.value)
+                    ).props(f'dense outlined clearable debounce={SEARCH_DEBOUNCE_MS}').classes('w-full')
+                    with search_input_ui.add_slot('prepend'):
+                        ui.icon('search')
                     with ui.row().classes('w-full items-center gap-2'):
                         date_from_input = ui.date(
-                            value=app.storage.user.get('filter_date_from_str'),
+                            value=state.prefs['filter_date_from_str'],
                             on_change=lambda e: update_filter_settings('date_from', e.value)
                         ).props('label="Von Datum" dense outlined clearable').classes('flex-grow')
                         
                         date_to_input = ui.date(
-                            value=app.storage.user.get('filter_date_to_str'),
+                            value=state.prefs['filter_date_to_str'],
                             on_change=lambda e: update_filter_settings('date_to', e.value)
                         ).props('label="Bis Datum" dense outlined clearable').classes('flex-grow')
 
-                    # Optionen werden dynamisch in update_all_db_labels_options_ui gesetzt
-                    label_select_ui = ui.select(
-                        options=[], # Initial leer, wird gefüllt
-                        label='Nach Label(s) filtern',
-                        value=app.storage.user.get('filter_labels_list', []),
-                        multiple=True, clearable=True,
-                        on_change=lambda e: update_filter_settings('labels', e.value)
-                    ).props('dense outlined').classes('w-full')
+                    with ui.row().classes('w-full items-center gap-2 no-wrap'):
+                        # Optionen werden dynamisch in update_all_db_labels_options_ui gesetzt
+                        label_select_ui = ui.select(
+                            options=[], # Initial leer, wird gefüllt
+                            label='Nach Label(s) filtern',
+                            value=state.prefs['filter_labels_list'],
+                            multiple=True, clearable=True,
+                            on_change=lambda e: update_filter_settings('labels', e.value)
+                        ).props('dense outlined').classes('flex-grow')
+                        label_mode_toggle_ui = ui.toggle(
+                            {'and': 'Alle', 'or': 'Eines'},
+                            value=state.prefs['filter_labels_mode'],
+                            on_change=lambda e: update_filter_settings('labels_mode', e.value)
+                        ).props('dense no-caps').tooltip('Tracks mit allen bzw. mindestens einem der Labels')
                     
-                    ui.button('Filter zurücksetzen', icon='restart_alt',
-                              on_click=lambda: reset_all_filters(date_from_input, date_to_input, label_select_ui)) \
-                        .props('flat dense color=grey-7').classes('mt-2 self-start')
+                    with ui.row().classes('w-full items-center gap-2 mt-2'):
+                        ui.button('Filter zurücksetzen', icon='restart_alt',
+                                  on_click=lambda: reset_all_filters(date_from_input, date_to_input, label_select_ui, label_mode_toggle_ui,
+                                                                     search_input_ui)) \
+                            .props('flat dense color=grey-7')
+                        # Räumlicher Filter über den R*Tree der Track-Bounding-Boxen
+                        bbox_filter_button_ui = ui.button('Kartenausschnitt', icon='crop_free', on_click=toggle_bbox_filter) \
+                            .props('flat dense').tooltip('Nur Tracks im aktuellen Kartenausschnitt anzeigen (erneut klicken zum Aufheben)')
+                        bbox_filter_button_ui.bind_text_from(state.prefs, 'filter_bbox',
+                                                             backward=lambda bbox: 'Kartenausschnitt ✓' if bbox else 'Kartenausschnitt')
 
         with ui.splitter(value=60).classes('w-full max-w-7xl h-[calc(100vh-250px)] min-h-[400px] mt-4 shadow-md') as splitter:
             with splitter.before, ui.column().classes('w-full h-full p-0'):
@@ -106,23 +178,53 @@ async def main_page(client: Client):
                 with map_card:
                     map_view_ui = ui.leaflet(center=(50.0, 10.0), zoom=5, draw_control=False) \
                                     .classes('w-full h-full')
-                    # Tile Layer wird in update_map_and_related_stats gesetzt/erneuert
+                    map_view_ui.on('init', install_track_geometry_loader) # Track-Layer laden ihre Punkte selbst
+                    map_view_ui.on('map-zoomend', handle_map_zoom_change) # Detailstufe an Zoom anpassen
+                    map_view_ui.on('map-moveend', handle_map_view_change) # Browse-Modus: Ausschnitt nachladen (auch nach Zoom)
+                    # Tile-Layer einmalig setzen; die Track-Layer gleicht draw_track_polylines einzeln ab
+                    map_view_ui.clear_layers()
+                    map_view_ui.tile_layer(
+                        url_template='https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
+                        options={
+                            'attribution': '© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+                        }
+                    )
+                    if state.prefs['map_heatmap']:
+                        show_heatmap_layer(map_view_ui, True)
 
                     with ui.element('div').style('position: absolute; bottom: 10px; left: 10px; background-color: rgba(255,255,255,0.8); padding: 5px; border-radius: 3px; z-index: 1000; box-shadow: 0 0 5px rgba(0,0,0,0.3);'):
                         stats_total_distance_ui = ui.label("Gesamtstrecke: 0.00 km")
                         stats_total_ascent_ui = ui.label("Gesamtanstieg: 0 m")
+                        ui.switch('Alle Tracks im Ausschnitt', value=state.prefs['map_browse_mode'],
+                                  on_change=toggle_map_browse_mode).props('dense')
+                        ui.switch('Heatmap aller Tracks', value=state.prefs['map_heatmap'],
+                                  on_change=toggle_map_heatmap).props('dense')
 
             with splitter.after, ui.column().classes('w-full h-full'):
                 with ui.card().classes('w-full h-full flex flex-col'):
                     with ui.card_section():
                         with ui.row().classes('w-full justify-between items-center'):
-                            ui.label('Meine Tracks').classes('text-lg font-semibold')
+                            with ui.column().classes('gap-0'):
+                                ui.label('Meine Tracks').classes('text-lg font-semibold')
+                                filter_totals_ui = ui.label('').classes('text-xs text-grey-7') # Summen der gefilterten Tracks
+                            ui.space()
+                            ui.button(icon='bar_chart', on_click=open_catalogue_stats_dialog) \
+                                .props('flat dense round').tooltip('Statistik nach Monat und Label')
+                            with ui.button(icon='download').props('flat dense round').tooltip('Tracks exportieren'):
+                                with ui.menu():
+                                    export_selection_zip_ui = ui.menu_item('Auswahl als ZIP', on_click=lambda: export_tracks('selection', 'zip'))
+                                    export_selection_gpx_ui = ui.menu_item('Auswahl als eine GPX-Datei', on_click=lambda: export_tracks('selection', 'gpx'))
+                                    ui.separator()
+                                    ui.menu_item('Filterergebnis als ZIP', on_click=lambda: export_tracks('filter', 'zip'))
+                                    ui.menu_item('Filterergebnis als eine GPX-Datei', on_click=lambda: export_tracks('filter', 'gpx'))
+                                for export_item_ui in (export_selection_zip_ui, export_selection_gpx_ui):
+                                    export_item_ui.bind_enabled_from(state, 'selected_track_ids', backward=lambda ids_list: bool(ids_list))
                             delete_selected_button_ui = ui.button(icon='delete_sweep',
                                                                  on_click=confirm_delete_selected_tracks,
                                                                  color='negative') \
                                 .props('flat dense round').tooltip('Ausgewählte Tracks löschen')
                             # Bind enabled state to the LIST of selected IDs
-                            delete_selected_button_ui.bind_enabled_from(app.storage.user, 'selected_track_ids_list', backward=lambda ids_list: bool(ids_list))
+                            delete_selected_button_ui.bind_enabled_from(state, 'selected_track_ids', backward=lambda ids_list: bool(ids_list))
                     
                     columns_def = [
                         {'name': 'id', 'label': 'ID', 'field': 'id', 'sortable': True, 'align': 'left', 'style': 'width: 5%'},
@@ -132,14 +234,15 @@ async def main_page(client: Client):
                         {'name': 'labels', 'label': 'Labels', 'field': 'labels_str', 'align': 'left', 'style': 'max-width: 150px; white-space: normal;'},
                         {'name': 'actions', 'label': '', 'field': 'id', 'align': 'right', 'style': 'width: 10%'}
                     ]
+                    # rowsNumber macht die Pagination serverseitig: Seite/Sortierung lösen 'request' aus (handle_table_request)
                     track_table_ui = ui.table(columns=columns_def,
-                                           rows=app.storage.user.get('tracks_in_table_data', []),
+                                           rows=[],
                                            row_key='id', selection='multiple',
                                            on_select=handle_table_selection_change, # This updates selected_track_ids_list
-                                           # Initial selection from storage
-                                           
-                                           pagination={'rowsPerPage': 100, 'sortBy': 'track_date', 'descending': True}) \
-                        .classes('w-full flex-grow').props('flat dense bordered virtual-scroll')
+                                           pagination={'rowsPerPage': TABLE_ROWS_PER_PAGE, 'sortBy': 'date', 'descending': True,
+                                                       'page': 1, 'rowsNumber': 0}) \
+                        .classes('w-full flex-grow').props('flat dense bordered :rows-per-page-options="[25, 50, 100, 200]"')
+                    track_table_ui.on('request', handle_table_request)
                     
                     track_table_ui.add_slot('body-cell-actions', '''
                         <q-td :props="props" style="text-align: right; padding: 0;">
@@ -167,42 +270,64 @@ async def main_page(client: Client):
     app.storage.client['ui_track_table'] = track_table_ui
     app.storage.client['ui_stats_dist'] = stats_total_distance_ui
     app.storage.client['ui_stats_asc'] = stats_total_ascent_ui
+    app.storage.client['ui_filter_totals'] = filter_totals_ui
     app.storage.client['ui_elevation_chart_container'] = elevation_chart_container_ui
     app.storage.client['ui_label_select_filter'] = label_select_ui
+    app.storage.client['ui_upload_progress'] = upload_progress_ui
+
+
+async def handle_gpx_multi_upload(e: Any):
+    # Parsen im Prozess-Pool (gpx_ingest), DB in Threads; die UI bleibt für alle Clients bedienbar.
+    state = client_state.get_client_state()
+    progress_container = app.storage.client.get('ui_upload_progress')
+    status_icons: List[Optional[ui.icon]] = []
+    if progress_container:
+        progress_container.clear()
+        with progress_container:
+            for filename in e.names:
+                with ui.row().classes('items-center gap-1 text-sm'):
+                    status_icons.append(ui.icon('hourglass_empty', color='grey'))
+                    ui.label(filename)
+    else:
+        status_icons = [None] * len(e.names)
+
+    duplicate_track_ids: List[int] = []
+
+    async def process_single_file(filename: str, content: Any, status_icon: Optional[ui.icon]) -> Optional[int]:
+        result = await gpx_ingest.ingest_gpx_upload(filename, content.read())
+        if status_icon:
+            status_icon.props(f'name={"check_circle" if result else "error"} color={"positive" if result else "negative"}')
+        if not result:
+            ui.notify(f"Konnte GPX-Daten aus {filename} nicht verarbeiten.", type='negative')
+            return None
+        if result[1] is None: # Gleicher Inhalt schon gespeichert: vorhandenen Track auswählen
+            if status_icon: status_icon.props('name=content_copy color=grey')
+            ui.notify(f"{filename} ist bereits vorhanden (Track ID {result[0]}).", type='info')
+            duplicate_track_ids.append(result[0])
+        return result[0]
 
-
-async def handle_gpx_upload(e: Any):
-    filename = e.name
-    content_bytes = e.content.read()
-    
-    parsed_data = gpx_utils.parse_gpx_data_from_content(filename, content_bytes)
-    if not parsed_data:
-        ui.notify(f"Konnte GPX-Daten aus {filename} nicht verarbeiten.", type='negative')
-        return
-
-    db = db_config.SessionLocal()
     try:
-        new_track_id = db_config.add_track(
-            db=db,
-            parsed_gpx_data=parsed_data,
-            gpx_file_content_bytes=content_bytes
-        )
-        if new_track_id:
-            ui.notify(f"Track '{parsed_data.get('track_name', filename)}' hochgeladen.", type='positive')
-            
-            # <--- HIER: Neuen Track als Liste von IDs speichern --->
-            app.storage.user['selected_track_ids_list'] = [new_track_id]
-            
-            app.storage.user['map_needs_initial_fit'] = True
-            await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
-        else:
-            ui.notify("Fehler beim Speichern des Tracks.", type='negative')
+        new_track_ids = await asyncio.gather(*(
+            process_single_file(filename, content, status_icon)
+            for filename, content, status_icon in zip(e.names, e.contents, status_icons)
+        ))
     except Exception as ex_upload:
-        print(f"ERROR during handle_gpx_upload: {ex_upload}")
+        print(f"ERROR during handle_gpx_multi_upload: {ex_upload}")
         traceback.print_exc()
         ui.notify(f"Schwerer Fehler beim Upload: {ex_upload}", type='negative', multi_line=True)
-    finally:
-        db.close()
+        return
+
+    new_track_ids = list(dict.fromkeys(track_id for track_id in new_track_ids if track_id))
+    if not new_track_ids:
+        return
+    uploaded_count = len(set(new_track_ids) - set(duplicate_track_ids))
+    if uploaded_count:
+        ui.notify(f"{uploaded_count} von {len(e.names)} Track(s) hochgeladen.", type='positive')
+    if state.select_tracks(new_track_ids):
+        ui.notify(f"Nur die ersten {client_state.MAX_SELECTED_TRACKS} hochgeladenen Tracks ausgewählt.", type='info')
+    state.map_needs_initial_fit = True
+    refresh_heatmap_layer()
+    await load_tracks_from_db_and_refresh_ui() # Einmal am Ende statt pro Datei
 
 
 def format_track_for_display(track_db_obj: db_config.TrackDB) -> Dict[str, Any]:
@@ -220,242 +345,497 @@ def format_track_for_display(track_db_obj: db_config.TrackDB) -> Dict[str, Any]:
         'total_ascent': track_db_obj.gpx_parsed_total_ascent,
     }
 
-async def load_tracks_from_db_and_refresh_ui(is_initial_load: bool = False):
-    print(f"DEBUG: load_tracks_from_db_and_refresh_ui. Initial: {is_initial_load}")
-    db = db_config.SessionLocal()
+def current_track_filters() -> Dict[str, Any]:
+    """Die aktiven Filter des Clients als Argumente für db_config.get_filtered_tracks/count_filtered_tracks."""
+    state = client_state.get_client_state()
+    bbox = state.prefs['filter_bbox']
+    return {
+        'start_date_str': state.prefs['filter_date_from_str'],
+        'end_date_str': state.prefs['filter_date_to_str'],
+        'label_filter_list': state.prefs['filter_labels_list'],
+        'label_match_mode': state.prefs['filter_labels_mode'],
+        'bbox': tuple(bbox) if bbox else None,
+        'search_text': state.prefs['filter_search_text'] or None,
+    }
+
+def table_sort_order(pagination: Dict[str, Any], search_text: Optional[str]) -> Tuple[str, bool]:
+    # Ohne Sortierspalte: bei aktiver Suche nach Trefferqualität, sonst nach Datum
+    return pagination.get('sortBy') or (db_config.SEARCH_RELEVANCE_SORT if search_text else 'date'), bool(pagination.get('descending'))
+
+@metrics.timed('table_page')
+async def load_table_page(track_table: ui.table, pagination: Dict[str, Any]) -> None:
+    # Lädt genau eine Seite (Sortierung in SQL) und setzt rowsNumber aus einer COUNT-Abfrage
+    state = client_state.get_client_state()
+    filters = current_track_filters()
+    rows_per_page = pagination.get('rowsPerPage') or TABLE_ROWS_PER_PAGE
+    sort_by, descending = table_sort_order(pagination, filters['search_text'])
+    total_tracks = await db_async.count_filtered_tracks(**filters)
+    page = min(max(int(pagination.get('page') or 1), 1), max(math.ceil(total_tracks / rows_per_page), 1))
+
+    # Keyset-Pagination: Schlüssel der letzten Zeile jeder geladenen Seite merken; beim Blättern zur
+    # Folgeseite setzt die Abfrage dort an, nur bei Sprüngen auf unbekannte Seiten wird OFFSET benutzt.
+    cursor_state = [sort_by, descending, rows_per_page]
+    if not state.table_page_cursors or state.table_page_cursors['state'] != cursor_state:
+        state.table_page_cursors = {'state': cursor_state, 'keys': {}}
+    tracks_on_page = await db_async.get_filtered_tracks(**filters, sort_by=sort_by, descending=descending,
+                                                        limit=rows_per_page, after_key=state.table_page_cursors['keys'].get(page - 1),
+                                                        offset=(page - 1) * rows_per_page)
+    if tracks_on_page:
+        state.remember_page_cursor(page, db_config.track_sort_key(tracks_on_page[-1], sort_by))
+
+    track_table.rows = [format_track_for_display(t) for t in tracks_on_page]
+    state.record_bytes_sent('ws_table', len(json.dumps(track_table.rows, default=str)))
+    track_table.pagination = {'page': page, 'rowsPerPage': rows_per_page, 'sortBy': sort_by,
+                              'descending': descending, 'rowsNumber': total_tracks}
+
+async def handle_table_request(e: Any):
+    # Quasar @request: Seite, Seitengröße oder Sortierung wurde in der Tabelle geändert
+    track_table = app.storage.client.get('ui_track_table')
+    if not track_table:
+        return
+    await load_table_page(track_table, e.args.get('pagination', {}))
+
+@metrics.timed('table_refresh')
+async def load_tracks_from_db_and_refresh_ui(is_initial_load: bool = False, reset_page: bool = False):
+    # reset_page: nach Filteränderungen wieder auf Seite 1, sonst (Bearbeiten, Löschen, Upload) auf der aktuellen Seite bleiben
+    state = client_state.get_client_state()
     try:
-        date_from = app.storage.user.get('filter_date_from_str')
-        date_to = app.storage.user.get('filter_date_to_str')
-        labels = app.storage.user.get('filter_labels_list', [])
-        
-        tracks_from_db = db_config.get_filtered_tracks(db, date_from, date_to, labels)
-        app.storage.user['tracks_in_table_data'] = [format_track_for_display(t) for t in tracks_from_db]
-        
         track_table = app.storage.client.get('ui_track_table')
         if track_table:
-            # 1. Aktualisiere die Zeilen der Tabelle mit den (möglicherweise gefilterten) Daten
-            current_table_rows_data = app.storage.user.get('tracks_in_table_data', [])
-            track_table.rows = current_table_rows_data
-            
-            # 2. Hole die Liste der IDs, die ausgewählt sein sollen, aus dem Storage
-            ids_to_select_from_storage = app.storage.user.get('selected_track_ids_list', [])
-            
-            # 3. Finde die tatsächlichen Zeilen-Objekte (Dictionaries) in den
-            #    aktuellen Tabellenzeilen, die diesen IDs entsprechen.
-            #    Dies stellt sicher, dass nur Zeilen ausgewählt werden, die auch angezeigt werden.
-            selected_row_objects_for_table = [
-                row_data for row_data in current_table_rows_data 
-                if row_data['id'] in ids_to_select_from_storage
-            ]
-            
-            # 4. Setze die .selected Eigenschaft der Tabelle mit der Liste der Zeilen-Objekte
-            track_table.selected = selected_row_objects_for_table
-            
-            # 5. (Optional, aber gute Praxis) Aktualisiere die Liste der ausgewählten IDs im Storage,
-            #    damit sie konsistent mit dem ist, was tatsächlich ausgewählt und sichtbar ist.
-            app.storage.user['selected_track_ids_list'] = [row['id'] for row in selected_row_objects_for_table]
-            
-            # 6. Fordere ein UI-Update für die Tabelle an (obwohl .selected Zuweisung dies oft impliziert)
+            # Daten haben sich geändert: gemerkte Keyset-Schlüssel verwerfen und die aktuelle Seite neu laden
+            state.table_page_cursors = None
+            pagination = dict(track_table.pagination)
+            if reset_page or is_initial_load:
+                pagination['page'] = 1
+            await load_table_page(track_table, pagination)
+
+            # Auswahl auf Tracks beschränken, die noch existieren und den Filtern entsprechen (auch auf anderen Seiten)
+            selected_tracks = await db_async.get_filtered_tracks_by_ids(state.selected_track_ids, **current_track_filters())
+            track_table.selected = [format_track_for_display(t) for t in selected_tracks]
+            state.selected_track_ids = [t.id for t in selected_tracks]
             track_table.update()
-
-            print(f"DEBUG: Table rows updated: {len(track_table.rows)} tracks.")
-            print(f"DEBUG:   Requested selected IDs from storage: {ids_to_select_from_storage}")
-            print(f"DEBUG:   Actual selected row objects set in table: {len(track_table.selected)} items.")
-            print(f"DEBUG:   Updated selected_track_ids_list in storage: {app.storage.user['selected_track_ids_list']}")
         else:
             print("WARNING: ui_track_table not in client storage for update.")
 
-        # Labels nach Laden der Tracks aktualisieren
-        update_all_db_labels_options_ui(db_session=db)
+        # Summen der gefilterten Tracks per SUM/COUNT
+        filter_totals_label = app.storage.client.get('ui_filter_totals')
+        if filter_totals_label:
+            filter_totals = await db_async.get_filtered_tracks_totals(**current_track_filters())
+            filter_totals_label.set_text(f"{filter_totals['track_count']} Tracks · {filter_totals['distance_km']:.0f} km · "
+                                         f"{filter_totals['total_ascent']:.0f} m Anstieg")
 
-        await update_map_and_related_stats(is_initial_map_fit=(is_initial_load or app.storage.user.get('map_needs_initial_fit', False)))
-        if is_initial_load or app.storage.user.get('map_needs_initial_fit', False):
-            app.storage.user['map_needs_initial_fit'] = False
+        # Labels nach Laden der Tracks aktualisieren
+        await update_all_db_labels_options_ui()
+
+        await update_map_and_related_stats(is_initial_map_fit=(is_initial_load or state.map_needs_initial_fit))
+        if is_initial_load or state.map_needs_initial_fit:
+            state.map_needs_initial_fit = False
+        if state.prefs['map_browse_mode'] and app.storage.client.get('ui_map_view'):
+            # Browse-Modus: Ausschnitt neu laden (neue/gelöschte Tracks), läuft über handle_map_view_change
+            app.storage.client['ui_map_view'].run_map_method('fire', 'moveend')
     except Exception as e_load:
         print(f"ERROR in load_tracks_from_db_and_refresh_ui: {e_load}")
         traceback.print_exc()
         ui.notify(f"Fehler beim Laden/Aktualisieren der Tracks: {e_load}", type='negative')
-    finally:
-        db.close()
 
-def update_all_db_labels_options_ui(db_session: Optional[db_config.Session] = None):
-    db_to_use = db_session if db_session else db_config.SessionLocal()
-    try:
-        new_labels = db_config.get_all_unique_labels(db_to_use)
-        # Speichere die Label-Optionen selbst NICHT im persistenten Storage,
-        # da sie sich ständig ändern und frisch aus der DB geholt werden.
-        # Stattdessen speichern wir sie in einem temporären Attribut oder nutzen sie direkt.
-        # app.storage.user['all_db_labels_options'] = new_labels # <-- Diese Zeile entfernen/ändern
-
-        label_select = app.storage.client.get('ui_label_select_filter')
-        if label_select:
-            # Hier verwenden wir die neue Liste direkt
-            label_select.options = new_labels
-            
-            # Behalte nur gültige Labels im Filter bei
-            current_filter_value = app.storage.user.get('filter_labels_list', [])
-            valid_filter_value = [val for val in current_filter_value if val in new_labels]
-            app.storage.user['filter_labels_list'] = valid_filter_value # Update Storage
-            label_select.set_value(valid_filter_value)
-            # label_select.update() # set_value sollte UI aktualisieren
-        print(f"DEBUG: Updated label filter options: {new_labels}")
-    finally:
-        if not db_session:
-            db_to_use.close()
+async def update_all_db_labels_options_ui():
+    state = client_state.get_client_state()
+    label_counts = await db_async.get_label_counts() # Ein GROUP BY über track_labels
+    new_labels = [name for name, _ in label_counts]
+    # Speichere die Label-Optionen selbst NICHT im persistenten Storage,
+    # da sie sich ständig ändern und frisch aus der DB geholt werden.
+    # Stattdessen speichern wir sie in einem temporären Attribut oder nutzen sie direkt.
+    # app.storage.user['all_db_labels_options'] = new_labels # <-- Diese Zeile entfernen/ändern
+
+    label_select = app.storage.client.get('ui_label_select_filter')
+    if label_select:
+        # Optionen als {label: "label (anzahl)"}, der Wert bleibt der reine Label-Name
+        label_select.options = {name: f"{name} ({count})" for name, count in label_counts}
+        
+        # Behalte nur gültige Labels im Filter bei
+        current_filter_value = state.prefs['filter_labels_list']
+        valid_filter_value = [val for val in current_filter_value if val in new_labels]
+        state.set_pref('filter_labels_list', valid_filter_value) # Update Storage
+        label_select.set_value(valid_filter_value)
+        # label_select.update() # set_value sollte UI aktualisieren
 
 
 async def update_filter_settings(filter_type: str, value: Any):
-    if filter_type == 'date_from': app.storage.user['filter_date_from_str'] = value
-    elif filter_type == 'date_to': app.storage.user['filter_date_to_str'] = value
-    elif filter_type == 'labels': app.storage.user['filter_labels_list'] = value if isinstance(value, list) else ([value] if value is not None else [])
+    state = client_state.get_client_state()
+    if filter_type == 'date_from': state.set_pref('filter_date_from_str', value)
+    elif filter_type == 'date_to': state.set_pref('filter_date_to_str', value)
+    elif filter_type == 'labels': state.set_pref('filter_labels_list', value if isinstance(value, list) else ([value] if value is not None else []))
+    elif filter_type == 'labels_mode':
+        state.set_pref('filter_labels_mode', value or 'and')
+        if not state.prefs['filter_labels_list']: return # Ohne Labels ändert der Modus nichts
+    elif filter_type == 'search':
+        search_text = (value or '').strip()
+        if search_text == state.prefs['filter_search_text']: return
+        state.set_pref('filter_search_text', search_text)
+        track_table = app.storage.client.get('ui_track_table')
+        if track_table:
+            # Neue Suche: Treffer nach Relevanz (keine Sortierspalte), ohne Suche wieder nach Datum
+            track_table.pagination = {**track_table.pagination, 'sortBy': None if search_text else 'date', 'descending': not search_text}
     
-    app.storage.user['map_needs_initial_fit'] = True
-    await load_tracks_from_db_and_refresh_ui()
-
-async def reset_all_filters(date_from_ui: ui.date, date_to_ui: ui.date, label_select_ui: ui.select):
-    app.storage.user['filter_date_from_str'] = None
-    app.storage.user['filter_date_to_str'] = None
-    app.storage.user['filter_labels_list'] = []
+    state.map_needs_initial_fit = True
+    await load_tracks_from_db_and_refresh_ui(reset_page=True)
+
+async def reset_all_filters(date_from_ui: ui.date, date_to_ui: ui.date, label_select_ui: ui.select, label_mode_ui: ui.toggle,
+                            search_input_ui: ui.input):
+    state = client_state.get_client_state()
+    state.set_pref('filter_search_text', '')
+    state.set_pref('filter_date_from_str', None)
+    state.set_pref('filter_date_to_str', None)
+    state.set_pref('filter_labels_list', [])
+    state.set_pref('filter_labels_mode', 'and')
+    state.set_pref('filter_bbox', None)
     date_from_ui.set_value(None)
     date_to_ui.set_value(None)
     label_select_ui.set_value([]) # Setze auch UI Wert
+    label_mode_ui.set_value('and')
+    search_input_ui.set_value('')
     
-    app.storage.user['map_needs_initial_fit'] = True
-    await load_tracks_from_db_and_refresh_ui()
+    state.map_needs_initial_fit = True
+    await load_tracks_from_db_and_refresh_ui(reset_page=True)
+
+async def get_map_viewport_bbox() -> Optional[List[float]]:
+    """Aktueller Kartenausschnitt als [min_lat, min_lon, max_lat, max_lon] (vom Browser erfragt)."""
+    map_view = app.storage.client.get('ui_map_view')
+    if not map_view:
+        return None
+    try:
+        leaflet_bounds = await map_view.run_map_method('getBounds', timeout=3.0)
+        south_west, north_east = leaflet_bounds['_southWest'], leaflet_bounds['_northEast']
+        return [south_west['lat'], south_west['lng'], north_east['lat'], north_east['lng']]
+    except Exception as e_bounds:
+        print(f"ERROR reading map bounds: {e_bounds}")
+        return None
+
+async def toggle_bbox_filter():
+    state = client_state.get_client_state()
+    if state.prefs['filter_bbox']:
+        state.set_pref('filter_bbox', None)
+    else:
+        bbox = await get_map_viewport_bbox()
+        if not bbox:
+            ui.notify("Kartenausschnitt konnte nicht ermittelt werden.", type='warning'); return
+        state.set_pref('filter_bbox', bbox)
+    await load_tracks_from_db_and_refresh_ui(reset_page=True)
 
 async def handle_table_selection_change(e: Any):
     # e.selection ist eine Liste von ausgewählten Zeilen-Objekten
-    selected_ids_set = {item['id'] for item in e.selection} if e.selection else set()
-    
-    # <--- HIER: Selektion als LISTE im Storage speichern --->
-    app.storage.user['selected_track_ids_list'] = list(selected_ids_set)
+    state = client_state.get_client_state()
+    selected_ids_list = [item['id'] for item in e.selection] if e.selection else []
     
-    print(f"DEBUG handle_table_selection_change: selected_track_ids_list = {app.storage.user['selected_track_ids_list']}")
+    # <--- HIER: Selektion als LISTE im Client-Zustand speichern (höchstens MAX_SELECTED_TRACKS) --->
+    if state.select_tracks(selected_ids_list):
+        kept_ids_set = set(state.selected_track_ids)
+        e.sender.selected = [item for item in e.selection if item['id'] in kept_ids_set]
+        e.sender.update()
+        ui.notify(f"Höchstens {client_state.MAX_SELECTED_TRACKS} Tracks auswählbar, weitere wurden abgewählt.", type='warning')
+
     await update_map_and_related_stats(is_initial_map_fit=False) # Bei Selektion nicht unbedingt neu fitten, außer es ist der erste Track
 
+def install_track_geometry_loader(e: Any) -> None:
+    # Nach jedem 'init' der Karte (erster Aufbau, Reconnect) steht ein neues Leaflet-Objekt im Browser
+    ui.run_javascript(f"installTrackGeometryLoader({e.sender.id})")
+
+def add_track_layer(map_view: ui.leaflet, track_id: int, lod_level: Optional[int], style: Dict[str, Any]):
+    # Leere Polylinie mit Geometrie-URL; die Punkte holt der Browser beim Hinzufügen über track_api (HTTP-Cache mit ETag)
+    return map_view.generic_layer(name='polyline', args=[[], {**style, 'geometryUrl': track_api.geometry_url(track_id, lod_level)}])
+
+@metrics.timed('map_draw')
+def draw_track_polylines(map_view: ui.leaflet, track_ids: List[int], zoom: Optional[float]) -> None:
+    """
+    Gleicht die Track-Layer der Karte mit track_ids in der zum Zoom passenden Detailstufe (gpx_utils.LOD_LEVELS) ab.
+    Gesendet werden nur Änderungen: neue Tracks kommen hinzu, abgewählte (oder in anderer Detailstufe gezeichnete)
+    werden entfernt, der Tile-Layer bleibt unberührt.
+    Im Browse-Modus werden zusätzlich die Tracks des Kartenausschnitts (map_viewport_track_ids) blass darunter gezeichnet.
+    """
+    state = client_state.get_client_state()
+    lod_level = gpx_utils.lod_level_for_zoom(zoom)
+    state.map_lod_level = lod_level
+    state.map_drawn_track_ids = list(track_ids)
+    selected_ids_set = set(track_ids)
+    # Ausgewählte Tracks werden hervorgehoben gezeichnet, nicht zusätzlich blass
+    viewport_ids_set = set(state.map_viewport_track_ids) - selected_ids_set
+
+    for layer_registry, wanted_ids_set in ((state.map_selected_layers, selected_ids_set),
+                                           (state.map_viewport_layers, viewport_ids_set)):
+        for track_id, (layer, layer_level) in list(layer_registry.items()):
+            if track_id not in wanted_ids_set or layer_level != lod_level:
+                map_view.remove_layer(layer)
+                del layer_registry[track_id]
+
+    added_viewport_layers = False
+    for track_id in viewport_ids_set - state.map_viewport_layers.keys():
+        layer = add_track_layer(map_view, track_id, lod_level, {'color': design.SECONDARY_COLOR_HEX, 'weight': 2, 'opacity': 0.6})
+        state.map_viewport_layers[track_id] = (layer, lod_level)
+        added_viewport_layers = True
+    if added_viewport_layers:
+        # Neue blasse Layer liegen sonst über den schon gezeichneten ausgewählten Tracks
+        for layer, _ in state.map_selected_layers.values():
+            layer.run_method('bringToFront')
+
+    for track_id in track_ids:
+        if track_id not in state.map_selected_layers:
+            layer = add_track_layer(map_view, track_id, lod_level, {'color': design.PRIMARY_COLOR_HEX, 'weight': 3})
+            state.map_selected_layers[track_id] = (layer, lod_level)
+
+async def handle_map_zoom_change(e: Any):
+    # Beim Zoomen nur neu zeichnen, wenn sich die Detailstufe ändert
+    state = client_state.get_client_state()
+    if state.prefs['map_browse_mode']:
+        return # Im Browse-Modus zeichnet handle_map_view_change nach dem Nachladen neu
+    zoom = e.args.get('zoom')
+    if gpx_utils.lod_level_for_zoom(zoom) == state.map_lod_level:
+        return
+    map_view = app.storage.client.get('ui_map_view')
+    if map_view:
+        draw_track_polylines(map_view, state.map_drawn_track_ids, zoom)
+
+async def load_viewport_tracks(zoom: Optional[float]):
+    # Nur der jeweils letzte Abruf zählt: eine neue Kartenbewegung bricht den vorherigen ab
+    state = client_state.get_client_state()
+    previous_task = state.viewport_load_task
+    if previous_task and not previous_task.done():
+        previous_task.cancel()
+    state.viewport_load_task = asyncio.current_task()
+
+    await asyncio.sleep(VIEWPORT_DEBOUNCE_SECONDS) # Entprellen: beim Weiterschieben wird dieser Abruf abgebrochen
+    map_view = app.storage.client.get('ui_map_view')
+    bbox = await get_map_viewport_bbox()
+    if not map_view or not bbox:
+        return
+    # Erst nach dem Entprellen messen, abgebrochene Abrufe zählen nicht als Fehler
+    with metrics.timer('viewport_load'):
+        # IDs der Tracks, deren Box den Ausschnitt schneidet (Geometrien lädt der Browser)
+        viewport_track_ids = await db_async.get_track_ids_in_bbox(tuple(bbox), limit=VIEWPORT_MAX_TRACKS)
+        if not state.prefs['map_browse_mode']:
+            return # Während des Ladens ausgeschaltet
+        state.map_viewport_track_ids = viewport_track_ids
+        if len(viewport_track_ids) >= VIEWPORT_MAX_TRACKS:
+            ui.notify(f"Mehr als {VIEWPORT_MAX_TRACKS} Tracks im Ausschnitt, bitte hineinzoomen.", type='info')
+        draw_track_polylines(map_view, state.map_drawn_track_ids, zoom)
+
+async def handle_map_view_change(e: Any):
+    # Leaflet 'moveend' kommt nach jedem Verschieben und Zoomen
+    state = client_state.get_client_state()
+    if state.prefs['map_browse_mode']:
+        await load_viewport_tracks(e.args.get('zoom'))
+
+async def toggle_map_browse_mode(e: Any):
+    state = client_state.get_client_state()
+    state.set_pref('map_browse_mode', bool(e.value))
+    map_view = app.storage.client.get('ui_map_view')
+    if not map_view:
+        return
+    if e.value:
+        await load_viewport_tracks(map_view.zoom)
+    else:
+        previous_task = state.viewport_load_task
+        if previous_task and not previous_task.done():
+            previous_task.cancel()
+        state.map_viewport_track_ids = []
+        draw_track_polylines(map_view, state.map_drawn_track_ids, map_view.zoom)
+
+def show_heatmap_layer(map_view: ui.leaflet, visible: bool) -> None:
+    state = client_state.get_client_state()
+    if visible and state.map_heatmap_layer is None:
+        # Bis HEATMAP_MAX_ZOOM liefert der Server Kacheln (oberhalb der gespeicherten Stufen aus der Geometrie),
+        # darüber vergrößert Leaflet die Kacheln der höchsten Stufe
+        state.map_heatmap_layer = map_view.tile_layer(url_template=HEATMAP_TILE_URL, options={
+            'maxNativeZoom': gpx_utils.HEATMAP_MAX_ZOOM, 'maxZoom': 19, 'opacity': 0.8})
+    elif not visible and state.map_heatmap_layer is not None:
+        map_view.remove_layer(state.map_heatmap_layer)
+        state.map_heatmap_layer = None
+
+def refresh_heatmap_layer() -> None:
+    # Nach Upload/Löschen: Kacheln neu anfordern (no-cache + ETag, unveränderte Kacheln kommen als 304)
+    heatmap_layer = client_state.get_client_state().map_heatmap_layer
+    if heatmap_layer is not None:
+        heatmap_layer.run_method('redraw')
+
+async def toggle_map_heatmap(e: Any):
+    client_state.get_client_state().set_pref('map_heatmap', bool(e.value))
+    map_view = app.storage.client.get('ui_map_view')
+    if map_view:
+        show_heatmap_layer(map_view, bool(e.value))
+
+def elevation_series_js(encoded_series: str) -> str:
+    # Dynamische echart-Option (":data"): die Serie geht kodiert über den Websocket und wird im Browser dekodiert
+    return f"decodePolyline({json.dumps(encoded_series)}, {list(gpx_utils.ELEVATION_CHART_PRECISION)}, 2)"
+
+async def handle_elevation_chart_zoom(e: Any):
+    # Beim Zoomen in das Höhenprofil den sichtbaren Bereich aus der vollen Auflösung neu reduzieren
+    state = client_state.get_client_state()
+    elevation_profile = state.elevation_profile
+    if not elevation_profile:
+        return
+    zoom_args = (e.args.get('batch') or [e.args])[0]
+    start_percent = zoom_args.get('start', 0) or 0
+    end_percent = zoom_args.get('end', 100) if zoom_args.get('end') is not None else 100
+    distances_km, elevations_m = elevation_profile
+    total_km = float(distances_km[-1])
+    elevation_chart = e.sender
+    with metrics.timer('chart_zoom'):
+        encoded_series = gpx_utils.get_elevation_chart_series_encoded(
+            distances_km, elevations_m,
+            start_km=total_km * start_percent / 100.0, end_km=total_km * end_percent / 100.0)
+    state.record_bytes_sent('ws_chart', len(encoded_series))
+    elevation_chart.options['series'][0][':data'] = elevation_series_js(encoded_series)
+    # Zoom-Zustand übernehmen, sonst setzt das Update den Ausschnitt zurück
+    elevation_chart.options['dataZoom'][0].update({"start": start_percent, "end": end_percent})
+    elevation_chart.update()
+
+@metrics.timed('map_update')
 async def update_map_and_related_stats(is_initial_map_fit: bool = False):
+    state = client_state.get_client_state()
     map_view = app.storage.client.get('ui_map_view')
     stats_dist = app.storage.client.get('ui_stats_dist')
     stats_asc = app.storage.client.get('ui_stats_asc')
     chart_container = app.storage.client.get('ui_elevation_chart_container')
     
-    # <--- HIER: Selektion als LISTE aus Storage holen und zu Set konvertieren für Logik --->
-    selected_ids_list = app.storage.user.get('selected_track_ids_list', [])
+    # <--- HIER: Selektion als LISTE aus dem Client-Zustand holen und zu Set konvertieren für Logik --->
+    selected_ids_list = state.selected_track_ids
     selected_ids_set: Set[int] = set(selected_ids_list)
     
     if not map_view: print("CRITICAL: map_view not found."); return
-    print(f"DEBUG update_map_and_stats: IDs: {selected_ids_list}, InitialFit: {is_initial_map_fit}")
-
-    map_view.clear_layers()
-    map_view.tile_layer(
-        url_template='https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
-        options={
-            'attribution': '© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-        }
-    ) # Standard-Tile-Layer neu setzen!
 
     if chart_container: chart_container.clear()
     else: print("WARNING: chart_container not found.")
 
     if not selected_ids_set: # Check if set is empty
+        draw_track_polylines(map_view, [], map_view.zoom)
         if stats_dist: stats_dist.set_text("Gesamtstrecke: 0.00 km")
         if stats_asc: stats_asc.set_text("Gesamtanstieg: 0 m")
         return # No tracks selected -> Nothing to plot or summarize
 
-    # Details für ausgewählte Tracks aus dem Table-Store holen (effizienter)
-    tracks_in_table_data = app.storage.user.get('tracks_in_table_data', [])
-    selected_track_display_data = [t for t in tracks_in_table_data if t['id'] in selected_ids_set]
-
-    total_dist_km = 0.0
-    total_asc_m = 0.0
-    all_track_points_for_bounds = []
-    
-    db = db_config.SessionLocal() # Session für Dateipfade benötigt
-    try:
-        for track_data in selected_track_display_data:
-            total_dist_km += track_data.get('distance_km', 0.0) or 0
-            total_asc_m += track_data.get('total_ascent', 0.0) or 0
-
-            gpx_file_path = db_config.get_gpx_filepath(db, track_data['id'])
-            if gpx_file_path and gpx_file_path.exists():
-                points = gpx_utils.get_points_from_gpx_file(str(gpx_file_path))
-                if points:
-                    map_view.generic_layer(name='polyline', args=[points, {'color': design.PRIMARY_COLOR_HEX, 'weight': 3}])
-                    all_track_points_for_bounds.extend(points)
-            else:
-                print(f"WARNING: GPX file path not found or file does not exist for track ID {track_data['id']} (Filename: {track_data.get('stored_filename', 'N/A')}).")
-    finally:
-        db.close()
+    selected_track_ids = list(selected_ids_list)
+    draw_track_polylines(map_view, selected_track_ids, map_view.zoom)
+    # Summen per SUM/COUNT und gespeicherte Bounding Boxen, keine Punktdaten nötig
+    selection_totals = await db_async.get_tracks_totals(selected_track_ids)
+    stored_bounds = await db_async.get_tracks_bounds(selected_track_ids)
 
-    if stats_dist: stats_dist.set_text(f"Gesamtstrecke: {total_dist_km:.2f} km")
-    if stats_asc: stats_asc.set_text(f"Gesamtanstieg: {total_asc_m:.0f} m")
+    if stats_dist: stats_dist.set_text(f"Gesamtstrecke: {selection_totals['distance_km']:.2f} km")
+    if stats_asc: stats_asc.set_text(f"Gesamtanstieg: {selection_totals['total_ascent']:.0f} m")
 
-    if all_track_points_for_bounds and map_view:
-        bounds = gpx_utils.get_bounds_for_points(all_track_points_for_bounds)
+    if stored_bounds and map_view:
+        # get_bounds_for_points polstert degenerierte Boxen und prüft den Wertebereich
+        bounds = gpx_utils.get_bounds_for_points([list(stored_bounds[0]), list(stored_bounds[1])])
         if bounds:
-            print(f"DEBUG: Calculated bounds: {bounds}")
             if is_initial_map_fit or len(selected_ids_set) > 0: # Fitten, wenn initial ODER wenn was ausgewählt ist
                 try:
                     map_view.run_method('invalidateSize')
                     await asyncio.sleep(0.1)
                     map_view.run_method('fitBounds', [[bounds[0][0], bounds[0][1]], [bounds[1][0], bounds[1][1]]], timeout=5.0)
-                    print("DEBUG: fitBounds call attempted.")
                 except Exception as e_fit:
                     print(f"ERROR calling fitBounds: {e_fit}")
-        else: print("DEBUG: Could not calculate bounds.")
     elif map_view: # Kein Track ausgewählt ODER keine Punkte im ausgewählten Track
-        print("DEBUG: No points to fit bounds, setting default center/zoom.")
         map_view.set_center((50.0, 10.0))
         map_view.set_zoom(5)
 
     # Höhenprofil
-    if len(selected_track_display_data) == 1 and chart_container:
-        track_for_profile = selected_track_display_data[0]
-        db_chart = db_config.SessionLocal()
-        try:
-            gpx_file_path_chart = db_config.get_gpx_filepath(db_chart, track_for_profile['id'])
-            if gpx_file_path_chart and gpx_file_path_chart.exists():
-                elevation_chart_data = gpx_utils.get_elevation_data_for_chart(str(gpx_file_path_chart))
-                if elevation_chart_data:
-                    with chart_container:
-                        ui.echart({
-                            "title": {"text": f"Höhenprofil: {track_for_profile.get('name', 'Unbenannt')}", "left": 'center', "textStyle": {"fontSize": 14}},
-                            "grid": {"left": '60px', "right": '30px', "bottom": '50px', "top": '50px', "containLabel": False},
-                            "tooltip": {"trigger": 'axis', "axisPointer": {"type": 'cross'}},
-                            "xAxis": {"type": 'category', "boundaryGap": False, "data": elevation_chart_data["categories"], "name": "Distanz (km)", "nameLocation": "middle", "nameGap": 25},
-                            "yAxis": {"type": 'value', "name": "Höhe (m)", "axisLabel": {"formatter": '{value} m'}},
-                            "series": [{"name": "Höhe", "type": 'line', "smooth": True, "data": elevation_chart_data["series_data"],
-                                        "lineStyle": {"color": design.PRIMARY_COLOR_HEX},
-                                        "areaStyle": {"color": design.SECONDARY_COLOR_HEX, "opacity": 0.3}}]
-                        }).classes('w-full h-full')
-                else:
-                    with chart_container: ui.label("Keine Höhendaten verfügbar.").classes('p-2 text-center text-grey')
+    if len(selected_track_ids) == 1 and chart_container:
+        # Höhenprofil immer aus der vollen Geometrie, nicht aus der Kartenstufe
+        track_details = await db_async.get_track_details(selected_track_ids[0])
+        if track_details is None:
+            # Inzwischen (z.B. in einem anderen Tab) gelöscht: aus der Auswahl nehmen, kein Höhenprofil
+            state.selected_track_ids = [track_id for track_id in state.selected_track_ids if track_id != selected_track_ids[0]]
+            state.elevation_profile = None
+            with chart_container: ui.label("Track nicht mehr vorhanden.").classes('p-2 text-center text-grey')
+            return
+        track_for_profile = format_track_for_display(track_details)
+        geometry_for_profile = await db_async.get_track_geometry(track_for_profile['id'])
+        if geometry_for_profile:
+            with metrics.timer('chart_build'):
+                elevation_profile = gpx_utils.compute_elevation_profile(geometry_for_profile)
+                encoded_series = gpx_utils.get_elevation_chart_series_encoded(*elevation_profile) if elevation_profile else ""
+            metrics.record_points('chart_build', len(geometry_for_profile["latitudes"]))
+            # Volle Auflösung nur im (nicht persistierten) Client-Zustand, für das Nachladen beim Zoomen
+            state.elevation_profile = elevation_profile
+            if elevation_profile:
+                distances_km, elevations_m = elevation_profile
+                state.record_bytes_sent('ws_chart', len(encoded_series))
+                with chart_container:
+                    elevation_chart = ui.echart({
+                        "title": {"text": f"Höhenprofil: {track_for_profile.get('name', 'Unbenannt')}", "left": 'center', "textStyle": {"fontSize": 14}},
+                        "grid": {"left": '60px', "right": '30px', "bottom": '50px', "top": '50px', "containLabel": False},
+                        "tooltip": {"trigger": 'axis', "axisPointer": {"type": 'cross'}},
+                        "xAxis": {"type": 'value', "min": 0, "max": round(float(distances_km[-1]), 3), "name": "Distanz (km)", "nameLocation": "middle", "nameGap": 25},
+                        "yAxis": {"type": 'value', "name": "Höhe (m)", "axisLabel": {"formatter": '{value} m'}},
+                        # Zoomen per Mausrad/Ziehen; der Ausschnitt wird in handle_elevation_chart_zoom nachgeladen
+                        "dataZoom": [{"type": 'inside', "xAxisIndex": 0, "filterMode": 'none', "start": 0, "end": 100}],
+                        "series": [{"name": "Höhe", "type": 'line', "smooth": True, "showSymbol": False,
+                                    ":data": elevation_series_js(encoded_series),
+                                    "lineStyle": {"color": design.PRIMARY_COLOR_HEX},
+                                    "areaStyle": {"color": design.SECONDARY_COLOR_HEX, "opacity": 0.3}}]
+                    }).classes('w-full h-full')
+                    elevation_chart.on('chart:datazoom', handle_elevation_chart_zoom, throttle=0.2)
             else:
-                with chart_container: ui.label("GPX-Datei für Höhenprofil nicht gefunden.").classes('p-2 text-center text-grey')
-        finally:
-            db_chart.close()
+                with chart_container: ui.label("Keine Höhendaten verfügbar.").classes('p-2 text-center text-grey')
+        else:
+            with chart_container: ui.label("Geometrie für Höhenprofil nicht gefunden.").classes('p-2 text-center text-grey')
     elif chart_container:
         chart_container.clear()
-
-
-def open_track_edit_dialog(track_id: int):
+        state.elevation_profile = None
+
+
+async def open_catalogue_stats_dialog():
+    # Statistik über den ganzen Katalog aus den vorberechneten Rollups (unabhängig von der Anzahl der Tracks)
+    catalogue_totals = await db_async.get_catalogue_totals()
+    month_rows = await db_async.get_stats_rollup("month")
+    label_rows = await db_async.get_stats_rollup("label")
+
+    def format_rollup_rows(rows: List[Dict[str, Any]], empty_key: str) -> List[Dict[str, Any]]:
+        return [{'key': row['key'] or empty_key, 'track_count': row['track_count'],
+                 'distance_str': f"{row['distance_km']:.1f} km", 'ascent_str': f"{row['total_ascent']:.0f} m",
+                 'descent_str': f"{row['total_descent']:.0f} m"} for row in rows]
+
+    def stats_columns(key_label: str) -> List[Dict[str, Any]]:
+        return [
+            {'name': 'key', 'label': key_label, 'field': 'key', 'align': 'left'},
+            {'name': 'track_count', 'label': 'Tracks', 'field': 'track_count', 'align': 'right'},
+            {'name': 'distance', 'label': 'Distanz', 'field': 'distance_str', 'align': 'right'},
+            {'name': 'ascent', 'label': 'Anstieg', 'field': 'ascent_str', 'align': 'right'},
+            {'name': 'descent', 'label': 'Abstieg', 'field': 'descent_str', 'align': 'right'},
+        ]
+
+    with ui.dialog() as stats_dialog, ui.card().style('min-width: 600px'):
+        with ui.card_section():
+            ui.label('Statistik').classes('text-h6')
+            ui.label(f"{catalogue_totals['track_count']} Tracks · {catalogue_totals['distance_km']:.1f} km · "
+                     f"{catalogue_totals['total_ascent']:.0f} m Anstieg · {catalogue_totals['total_descent']:.0f} m Abstieg") \
+                .classes('text-grey-7')
+        with ui.tabs().classes('w-full') as stats_tabs:
+            month_tab = ui.tab('Nach Monat')
+            label_tab = ui.tab('Nach Label')
+        with ui.tab_panels(stats_tabs, value=month_tab).classes('w-full'):
+            with ui.tab_panel(month_tab):
+                ui.table(columns=stats_columns('Monat'), rows=format_rollup_rows(list(reversed(month_rows)), 'ohne Datum'),
+                         row_key='key', pagination=12).props('flat dense')
+            with ui.tab_panel(label_tab):
+                ui.table(columns=stats_columns('Label'), rows=format_rollup_rows(label_rows, ''),
+                         row_key='key', pagination=12).props('flat dense')
+        with ui.card_actions().props('align=right'):
+            ui.button('Schließen', on_click=stats_dialog.close).props('flat')
+    await stats_dialog
+
+
+async def open_track_edit_dialog(track_id: int):
     global current_editing_track_id, name_input_for_dialog, labels_input_for_dialog, edit_dialog_instance
     if not all([name_input_for_dialog, labels_input_for_dialog, edit_dialog_instance]):
         ui.notify("Edit-Dialog nicht bereit.", type='error'); return
 
-    db = db_config.SessionLocal()
-    try:
-        track_to_edit = db_config.get_track_details(db, track_id)
-        if track_to_edit:
-            current_editing_track_id = track_id
-            name_input_for_dialog.set_value(track_to_edit.name)
-            labels_list = json.loads(track_to_edit.labels) if track_to_edit.labels and track_to_edit.labels != "null" else []
-            labels_input_for_dialog.set_value(", ".join(labels_list))
-            edit_dialog_instance.open()
-        else:
-            ui.notify(f"Track ID {track_id} nicht gefunden.", type='warning')
-    finally:
-        db.close()
+    track_to_edit = await db_async.get_track_details(track_id)
+    if track_to_edit:
+        current_editing_track_id = track_id
+        name_input_for_dialog.set_value(track_to_edit.name)
+        labels_list = await db_async.get_track_labels(track_id)
+        labels_input_for_dialog.set_value(", ".join(labels_list))
+        edit_dialog_instance.open()
+    else:
+        ui.notify(f"Track ID {track_id} nicht gefunden.", type='warning')
 
 async def save_edited_track_details():
     global current_editing_track_id, name_input_for_dialog, labels_input_for_dialog, edit_dialog_instance
@@ -465,60 +845,69 @@ async def save_edited_track_details():
     labels_str = labels_input_for_dialog.value
     labels_list = [label.strip() for label in labels_str.split(',') if label.strip()]
     
-    db = db_config.SessionLocal()
-    try:
-        success = db_config.update_track_details(db, current_editing_track_id, new_name, labels_list)
-        if success:
-            ui.notify(f"Track '{new_name}' aktualisiert.", type='positive')
-            edit_dialog_instance.close()
-            # app.storage.user['map_needs_initial_fit'] = False # Keine Änderung der Map-Ansicht nötig, nur Daten/Labels ändern sich
-            await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
-        else:
-            ui.notify(f"Fehler beim Aktualisieren von Track ID {current_editing_track_id}.", type='negative')
-    finally:
-        db.close()
+    success = await db_async.update_track_details(current_editing_track_id, new_name, labels_list)
+    if success:
+        ui.notify(f"Track '{new_name}' aktualisiert.", type='positive')
+        edit_dialog_instance.close()
+        # state.map_needs_initial_fit = False # Keine Änderung der Map-Ansicht nötig, nur Daten/Labels ändern sich
+        await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
+    else:
+        ui.notify(f"Fehler beim Aktualisieren von Track ID {current_editing_track_id}.", type='negative')
     current_editing_track_id = None
 
 
 async def confirm_delete_single_track(track_id: int):
-    db = db_config.SessionLocal()
-    try:
-        track_detail = db_config.get_track_details(db, track_id)
-        if not track_detail:
-            ui.notify(f"Track ID {track_id} nicht gefunden.", type='warning'); return
-        with ui.dialog() as conf_dialog, ui.card():
-            ui.label(f"Track '{track_detail.name}' wirklich löschen?").classes('m-4 text-lg')
-            with ui.row().classes('w-full justify-end gap-2 p-2'):
-                ui.button("Abbrechen", on_click=conf_dialog.close).props('flat')
-                ui.button("Löschen", on_click=lambda: delete_single_track_confirmed(track_id, conf_dialog), color='negative')
-        await conf_dialog
-    finally:
-        db.close()
+    track_detail = await db_async.get_track_details(track_id)
+    if not track_detail:
+        ui.notify(f"Track ID {track_id} nicht gefunden.", type='warning'); return
+    with ui.dialog() as conf_dialog, ui.card():
+        ui.label(f"Track '{track_detail.name}' wirklich löschen?").classes('m-4 text-lg')
+        with ui.row().classes('w-full justify-end gap-2 p-2'):
+            ui.button("Abbrechen", on_click=conf_dialog.close).props('flat')
+            ui.button("Löschen", on_click=lambda: delete_single_track_confirmed(track_id, conf_dialog), color='negative')
+    await conf_dialog
 
 async def delete_single_track_confirmed(track_id: int, dialog_ref: ui.dialog):
+    state = client_state.get_client_state()
     dialog_ref.close()
-    db = db_config.SessionLocal()
-    try:
-        deleted_track_name = db_config.delete_track_by_id_with_file(db, track_id)
-        if deleted_track_name:
-            ui.notify(f"Track '{deleted_track_name}' gelöscht.", type='positive')
-            
-            # <--- HIER: Ausgewählte IDs als LISTE aus Storage holen, modifizieren (als Set), als LISTE speichern --->
-            current_selection_list = app.storage.user.get('selected_track_ids_list', [])
-            current_selection_set = set(current_selection_list)
-            current_selection_set.discard(track_id)
-            app.storage.user['selected_track_ids_list'] = list(current_selection_set)
-            # <--- ENDE Selektion Aktualisierung --->
-
-            app.storage.user['map_needs_initial_fit'] = True # Map sollte neu fitten, da Track weg ist
-            await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
-        else:
-            ui.notify(f"Fehler beim Löschen von Track ID {track_id}.", type='negative')
-    finally:
-        db.close()
+    deleted_track_name = await db_async.delete_track_by_id_with_file(track_id)
+    if deleted_track_name:
+        ui.notify(f"Track '{deleted_track_name}' gelöscht.", type='positive')
+        
+        # <--- HIER: Ausgewählte IDs als LISTE aus dem Client-Zustand holen, modifizieren (als Set), als LISTE speichern --->
+        current_selection_list = state.selected_track_ids
+        current_selection_set = set(current_selection_list)
+        current_selection_set.discard(track_id)
+        state.selected_track_ids = list(current_selection_set)
+        # <--- ENDE Selektion Aktualisierung --->
+
+        state.map_needs_initial_fit = True # Map sollte neu fitten, da Track weg ist
+        refresh_heatmap_layer()
+        schedule_file_sweep()
+        await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
+    else:
+        ui.notify(f"Fehler beim Löschen von Track ID {track_id}.", type='negative')
+
+async def export_tracks(scope: str, export_format: str):
+    # scope: 'selection' = ausgewählte Tracks, 'filter' = alle Tracks des aktuellen Filters; Download läuft über track_api
+    state = client_state.get_client_state()
+    if scope == 'selection':
+        track_ids = list(state.selected_track_ids)
+    else:
+        # Reihenfolge wie in der Tabelle
+        filters = current_track_filters()
+        track_table = app.storage.client.get('ui_track_table')
+        sort_by, descending = table_sort_order(track_table.pagination if track_table else {'sortBy': 'date', 'descending': True},
+                                               filters['search_text'])
+        track_ids = await db_async.get_filtered_track_ids(**filters, sort_by=sort_by, descending=descending)
+    if not track_ids:
+        ui.notify("Keine Tracks zum Exportieren.", type='info'); return
+    ui.download.from_url(track_api.export_url(track_ids, export_format))
+    ui.notify(f"Export von {len(track_ids)} Track(s) gestartet.", type='positive')
 
 async def confirm_delete_selected_tracks():
-    selected_ids_list = app.storage.user.get('selected_track_ids_list', [])
+    state = client_state.get_client_state()
+    selected_ids_list = state.selected_track_ids
     if not selected_ids_list: return
     with ui.dialog() as conf_dialog, ui.card():
         ui.label(f"{len(selected_ids_list)} ausgewählte Tracks wirklich löschen?").classes('m-4 text-lg')
@@ -528,22 +917,40 @@ async def confirm_delete_selected_tracks():
     await conf_dialog
 
 async def delete_multiple_tracks_confirmed(track_ids_to_delete: List[int], dialog_ref: ui.dialog):
+    state = client_state.get_client_state()
     dialog_ref.close()
     if not track_ids_to_delete: return
-    db = db_config.SessionLocal()
-    try:
-        num_deleted, errors = db_config.delete_multiple_tracks_with_files(db, track_ids_to_delete)
-        if num_deleted > 0: ui.notify(f"{num_deleted} Tracks gelöscht.", type='positive')
-        if errors: ui.notify(f"{len(errors)} Fehler beim Löschen.", type='warning', multi_line=True)
-        if num_deleted == 0 and not errors: ui.notify("Keine Tracks gelöscht.", type='info')
-
-        # <--- HIER: Ausgewählte IDs löschen und leere Liste im Storage speichern --->
-        app.storage.user['selected_track_ids_list'] = []
-        # <--- ENDE Selektion Aktualisierung --->
-
-        app.storage.user['map_needs_initial_fit'] = True # Map sollte neu fitten
-        await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
-    finally:
-        db.close()
+    num_deleted, errors = await db_async.delete_multiple_tracks_with_files(track_ids_to_delete)
+    if num_deleted > 0: ui.notify(f"{num_deleted} Tracks gelöscht.", type='positive')
+    if errors: ui.notify(f"{len(errors)} Fehler beim Löschen.", type='warning', multi_line=True)
+    if num_deleted == 0 and not errors: ui.notify("Keine Tracks gelöscht.", type='info')
+
+    # <--- HIER: Ausgewählte IDs löschen und leere Liste im Client-Zustand speichern --->
+    state.selected_track_ids = []
+    # <--- ENDE Selektion Aktualisierung --->
+
+    state.map_needs_initial_fit = True # Map sollte neu fitten
+    if num_deleted > 0:
+        refresh_heatmap_layer()
+        schedule_file_sweep()
+    await load_tracks_from_db_and_refresh_ui() # Ruft intern update_all_db_labels_options_ui
+
+async def sweep_deleted_files(reconcile: bool = False) -> None:
+    # Dateien gelöschter Tracks erst nach dem Commit entfernen; beim Start zusätzlich verwaiste Dateien suchen.
+    # Danach den Lese-Cache entpackter GPX-Dateien auf seine Grenzen zurückschneiden.
+    if reconcile:
+        await db_async.reconcile_orphaned_gpx_files()
+    await db_async.sweep_file_tombstones()
+    await asyncio.to_thread(db_config.trim_gpx_read_cache)
+
+def schedule_file_sweep(reconcile: bool = False) -> None:
+    # create_lazy: läuft schon ein Sweep, folgt höchstens ein weiterer danach
+    background_tasks.create_lazy(sweep_deleted_files(reconcile), name='file_sweeper')
+
+app.on_startup(db_config.init_database) # vor allen Seiten und Hintergrund-Jobs, nur im Server-Prozess
+app.on_startup(lambda: background_tasks.create(track_reanalysis.run_background_jobs(), name='track_reanalysis'))
+app.on_startup(lambda: schedule_file_sweep(reconcile=True))
+app.on_shutdown(gpx_ingest.shutdown_parse_executor)
+app.on_shutdown(db_config.async_engine.dispose)
 
 ui.run(title="GPX Track Manager", storage_secret="DEIN_EINZIGARTIGER_SECRET_KEY_HIER", reload=False, port=8081)
\ No newline at end of file
@@ -0,0 +1,190 @@
+# projekt_gpx_viewer/metrics.py
+"""
+Leichtgewichtige Instrumentierung der heißen Pfade (Parsen, DB-Abfragen, Karten-Updates, Höhenprofil, HTTP-Routen).
+
+Zähler und Histogramme liegen im Prozess-Speicher; eine Messung kostet ein perf_counter-Paar, eine
+Bucket-Suche (bisect) und ein Lock, sie bleibt daher auch im Betrieb eingeschaltet. Ausgegeben wird im
+Prometheus-Textformat unter /metrics (track_api.get_metrics_route). Labels haben bewusst nur feste Werte
+(Operation, Kanal), keine Client- oder Track-IDs; die Verteilung pro Client liefert CLIENT_BYTES_SENT.
+
+    with metrics.timer('chart_build'): ...
+    @metrics.timed('map_update')
+    async def update_map(...): ...
+"""
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator, Sequence
+from bisect import bisect_left
+from contextlib import contextmanager
+import functools
+import inspect
+import math
+import threading
+import time
+
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "gpx_viewer_"
+
+DURATION_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+POINT_BUCKETS = (100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+BYTE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+_lock = threading.Lock() # Handler laufen im Event-Loop, DB-Zugriffe und Routen auch in Threads
+_metrics: List['_Metric'] = []
+_gauge_callbacks: List[Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_items: Sequence[Tuple[str, Any]]) -> str:
+    if not label_items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in label_items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if labels.keys() != set(self.label_names):
+            raise ValueError(f"{self.name} erwartet die Labels {self.label_names}, nicht {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    """Monoton steigender Zähler, je Kombination der Label-Werte."""
+    metric_type = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with _lock:
+            values = list(self._values.items())
+        return super().render() + [f"{self.name}{_format_labels(list(zip(self.label_names, key)))} {_format_value(value)}"
+                                   for key, value in sorted(values)]
+
+
+class Histogram(_Metric):
+    """Verteilung von Messwerten in festen Buckets (kumulativ ausgegeben), dazu Summe und Anzahl."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS_SECONDS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Label-Werte -> [Anzahl je Bucket (letzter = +Inf, nicht kumulativ), Summe]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        bucket_index = bisect_left(self.buckets, value) # le-Semantik: value <= Bucket-Grenze
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bucket_index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with _lock:
+            values = [(key, list(bucket_counts), value_sum) for key, (bucket_counts, value_sum) in self._values.items()]
+        lines = super().render()
+        for key, bucket_counts, value_sum in sorted(values):
+            label_items = list(zip(self.label_names, key))
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (math.inf,), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(label_items + [('le', _format_value(upper_bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(label_items)} {_format_value(value_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(label_items)} {cumulative}")
+        return lines
+
+
+def register_gauge_callback(name: str, help_text: str, callback: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]) -> None:
+    """Gauge, deren Werte erst beim Abruf von /metrics berechnet werden: callback() -> {((Label, Wert), ...): Zahl}."""
+    _gauge_callbacks.append((METRIC_PREFIX + name, help_text, callback))
+
+
+# --- Metriken der App ---
+
+OPERATION_DURATION = Histogram("operation_duration_seconds", "Dauer instrumentierter Operationen", ("operation",))
+OPERATION_ERRORS = Counter("operation_errors_total", "Operationen, die mit einer Ausnahme endeten", ("operation",))
+POINTS_PROCESSED = Counter("points_processed_total", "Verarbeitete GPX-Punkte", ("operation",))
+TRACK_POINTS = Histogram("track_points", "Punkte je verarbeitetem Track", ("operation",), buckets=POINT_BUCKETS)
+BYTES_SENT = Counter("bytes_sent_total", "An Browser gesendete Nutzdaten (HTTP-Antworten, Websocket-Payloads der Handler)", ("channel",))
+CLIENT_BYTES_SENT = Histogram("client_bytes_sent_bytes", "Websocket-Nutzdaten je beendetem Client", buckets=BYTE_BUCKETS)
+
+
+@contextmanager
+def timer(operation: str) -> Iterator[None]:
+    """Misst die Dauer des Blocks in OPERATION_DURATION; Ausnahmen zählen zusätzlich in OPERATION_ERRORS."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        OPERATION_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        OPERATION_DURATION.observe(time.perf_counter() - started, operation=operation)
+
+
+def timed(operation: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator für synchrone und async Funktionen, Operation standardmäßig der Funktionsname."""
+    def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+        operation_name = operation or function.__name__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with timer(operation_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timer(operation_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_points(operation: str, point_count: int) -> None:
+    POINTS_PROCESSED.inc(point_count, operation=operation)
+    TRACK_POINTS.observe(point_count, operation=operation)
+
+
+def render_prometheus_text() -> str:
+    """Alle Metriken im Prometheus-Textformat (Version 0.0.4)."""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines += metric.render()
+    for name, help_text, callback in _gauge_callbacks:
+        try:
+            values = callback()
+        except Exception as e:
+            print(f"Fehler beim Berechnen der Metrik {name}: {e}")
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_format_labels(label_items)} {_format_value(value)}" for label_items, value in values.items()]
+    return "\n".join(lines) + "\n"
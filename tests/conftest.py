@@ -0,0 +1,60 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Die Module liegen flach im Projektverzeichnis
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Datenbank und Dateiablage der Tests in einem eigenen DATA_DIR, gesetzt vor dem ersten Import von db_config
+TEST_DATA_DIR = Path(tempfile.mkdtemp(prefix="gpx_viewer_tests_"))
+os.environ["GPX_VIEWER_DATA_DIR"] = str(TEST_DATA_DIR)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Legt Tabellen, Indizes und Trigger der Test-Datenbank einmal je Testlauf an."""
+    import db_config
+
+    db_config.init_database()
+    return db_config
+
+
+@pytest.fixture
+def db(database):
+    """Session auf die Test-Datenbank; danach werden alle Tabellen und abgelegten Dateien geleert."""
+    import db_config
+
+    session = db_config.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with db_config.engine.begin() as connection:
+            for model_table in reversed(db_config.Base.metadata.sorted_tables):
+                connection.execute(model_table.delete())
+        for directory in (db_config.GPX_UPLOAD_DIR, db_config.GPX_READ_CACHE_DIR):
+            shutil.rmtree(directory, ignore_errors=True)
+        db_config.GPX_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+
+@pytest.fixture
+def add_gpx_track(db):
+    """Legt Tracks wie ein Upload an (gpx_ingest.prepare_gpx_upload + db_config.add_track): add_gpx_track(seed, ...) -> ID."""
+    import db_config
+    import gpx_ingest
+    from benchmarks.synthetic_gpx import generate_gpx
+
+    def add(seed=0, points=50, name=None, labels=None, content=None, filename=None):
+        parsed_gpx_data = gpx_ingest.prepare_gpx_upload(filename or f"track_{seed}.gpx", content or generate_gpx(points, seed=seed, name=name))
+        if labels:
+            parsed_gpx_data["labels_list"] = labels
+        return db_config.add_track(db, parsed_gpx_data)
+    return add
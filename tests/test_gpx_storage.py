@@ -0,0 +1,100 @@
+"""Inhaltsadressierte GPX-Ablage: Referenzzählung der Objekte, Lese-Cache (get_gpx_filepath) und Migration des Altbestands."""
+import gzip
+import os
+
+import pytest
+from sqlalchemy import text
+
+import db_config
+import gpx_ingest
+from benchmarks.synthetic_gpx import generate_gpx
+
+
+def _blob_ref_counts(db):
+    return {blob.content_hash: blob.ref_count for blob in db.query(db_config.GpxBlobDB)}
+
+
+def _add_same_content_twice(db):
+    # Direkt über add_track (die Duplikaterkennung beim Upload liegt davor in gpx_ingest)
+    content = generate_gpx(60, seed=4)
+    track_ids = [db_config.add_track(db, gpx_ingest.prepare_gpx_upload(f"kopie_{index}.gpx", content)) for index in range(2)]
+    return content, track_ids
+
+
+def test_same_content_shares_one_counted_object(db):
+    content, track_ids = _add_same_content_twice(db)
+    tracks = [db_config.get_track_details(db, track_id) for track_id in track_ids]
+    assert tracks[0].content_hash == tracks[1].content_hash == db_config.gpx_content_hash(content)
+    assert tracks[0].stored_filename != tracks[1].stored_filename
+    object_path = db_config.gpx_object_path(tracks[0].content_hash)
+    assert gzip.decompress(object_path.read_bytes()) == content
+    assert len(list(db_config.GPX_OBJECT_DIR.rglob("*.gpx.gz"))) == 1
+    blob = db.query(db_config.GpxBlobDB).one()
+    assert (blob.ref_count, blob.stored_size) == (2, object_path.stat().st_size)
+
+    db_config.delete_track_by_id_with_file(db, track_ids[0])
+    assert _blob_ref_counts(db) == {tracks[1].content_hash: 1}
+    assert db.execute(text("SELECT count(*) FROM file_tombstones")).scalar() == 0
+    db_config.delete_track_by_id_with_file(db, track_ids[1])
+    assert _blob_ref_counts(db) == {}
+    assert db_config.sweep_file_tombstones(db) == 1
+    assert not object_path.exists()
+
+
+def test_failed_insert_discards_only_unreferenced_objects(db, monkeypatch):
+    content, _ = _add_same_content_twice(db)
+
+    def failing_insert(*args, **kwargs):
+        raise RuntimeError("DB gesperrt")
+    monkeypatch.setattr(db_config, "_insert_track", failing_insert)
+    assert db_config.add_track(db, {"original_filename": "dritte.gpx"}, content) is None
+    assert db_config.gpx_object_path(db_config.gpx_content_hash(content)).exists() # noch referenziert
+
+    new_content = generate_gpx(20, seed=8)
+    assert db_config.add_track(db, {"original_filename": "neu.gpx"}, new_content) is None
+    assert not db_config.gpx_object_path(db_config.gpx_content_hash(new_content)).exists()
+    assert list(_blob_ref_counts(db).values()) == [2]
+
+
+def test_gpx_filepath_unpacks_once_into_read_cache(db, add_gpx_track):
+    content = generate_gpx(30, seed=5)
+    track_id = add_gpx_track(content=content)
+    path = db_config.get_gpx_filepath(db, track_id)
+    assert path.parent == db_config.GPX_READ_CACHE_DIR and path.read_bytes() == content
+    os.utime(path, (0, 0))
+    assert db_config.get_gpx_filepath(db, track_id) == path
+    assert path.stat().st_mtime > 0 # Zugriff vermerkt (LRU)
+    assert len(list(db_config.GPX_READ_CACHE_DIR.iterdir())) == 1
+
+    assert db_config.get_gpx_filepath(db, 12345) is None
+    path.unlink()
+    db_config.gpx_object_path(db_config.get_track_details(db, track_id).content_hash).unlink()
+    assert db_config.get_gpx_filepath(db, track_id) is None # Objekt fehlt
+
+
+def test_read_cache_is_trimmed_oldest_first(db, add_gpx_track, monkeypatch):
+    monkeypatch.setattr(db_config, "GPX_READ_CACHE_MIN_AGE_S", 0)
+    paths = [db_config.get_gpx_filepath(db, add_gpx_track(seed)) for seed in range(3)]
+    for age_s, path in zip((300, 200, 100), paths):
+        os.utime(path, (path.stat().st_mtime - age_s,) * 2)
+    size = paths[0].stat().st_size
+    assert db_config.trim_gpx_read_cache(max_bytes=2 * size + size // 2) == 1
+    assert [path.exists() for path in paths] == [False, True, True]
+    assert db_config.trim_gpx_read_cache(max_age_s=150) == 1
+    assert [path.exists() for path in paths] == [False, False, True]
+
+
+def test_legacy_files_are_migrated_to_content_store(db):
+    contents = [generate_gpx(15, seed=1), generate_gpx(15, seed=1), generate_gpx(15, seed=2)]
+    for index, content in enumerate(contents):
+        (db_config.GPX_UPLOAD_DIR / f"alt_{index}.gpx").write_bytes(content)
+        db.add(db_config.TrackDB(name=f"Alt {index}", stored_filename=f"alt_{index}.gpx"))
+    db.add(db_config.TrackDB(name="Fehlt", stored_filename="fehlt.gpx"))
+    db.commit()
+
+    assert db_config.migrate_gpx_files_to_content_store(db, batch_size=2) == (3, 1)
+    assert sorted(_blob_ref_counts(db).values()) == [1, 2] # gleiche Inhalte teilen sich ein Objekt
+    assert db_config.sweep_file_tombstones(db) == 3
+    assert not any(db_config.GPX_UPLOAD_DIR.glob("alt_*.gpx"))
+    migrated_id = db.query(db_config.TrackDB.id).filter(db_config.TrackDB.name == "Alt 2").scalar()
+    assert db_config.get_gpx_filepath(db, migrated_id).read_bytes() == contents[2]
@@ -0,0 +1,137 @@
+"""Der Streaming-Parser muss dieselben Werte liefern, die gpxpy direkt für dieselbe Datei berechnet."""
+import io
+import math
+from pathlib import Path
+
+import gpxpy
+import numpy as np
+import pytest
+
+import gpx_utils
+
+SAMPLE_FILE = Path(__file__).resolve().parent.parent / "gpx_uploads" / "20250523213313542207_3_Schluchten_Weg.gpx"
+
+GPX_11_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="test">\n'
+GPX_10_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<gpx xmlns="http://www.topografix.com/GPX/1/0" version="1.0" creator="test">\n'
+
+MULTI_SEGMENT = GPX_11_HEADER + """<trk><name>Zwei Segmente</name>
+<trkseg>
+<trkpt lat="47.8500" lon="8.4100"><ele>800.0</ele><time>2024-05-01T08:00:00Z</time></trkpt>
+<trkpt lat="47.8510" lon="8.4115"><ele>812.5</ele><time>2024-05-01T08:01:00Z</time></trkpt>
+<trkpt lat="47.8523" lon="8.4127"><ele>809.0</ele><time>2024-05-01T08:02:10Z</time></trkpt>
+</trkseg>
+<trkseg>
+<trkpt lat="47.8600" lon="8.4200"><ele>830.0</ele><time>2024-05-01T09:00:00Z</time></trkpt>
+<trkpt lat="47.8612" lon="8.4211"><ele>845.0</ele><time>2024-05-01T09:01:30Z</time></trkpt>
+<trkpt lat="47.8625" lon="8.4230"><ele>838.0</ele><time>2024-05-01T09:03:00Z</time></trkpt>
+</trkseg>
+</trk>
+</gpx>
+"""
+
+MISSING_ELEVATIONS = GPX_11_HEADER + """<trk><name>Lücken</name><trkseg>
+<trkpt lat="48.0000" lon="9.0000"><ele>500.0</ele><time>2024-06-02T10:00:00Z</time></trkpt>
+<trkpt lat="48.0010" lon="9.0012"><time>2024-06-02T10:01:00Z</time></trkpt>
+<trkpt lat="48.0021" lon="9.0020"><ele>512.0</ele><time>2024-06-02T10:02:00Z</time></trkpt>
+<trkpt lat="48.0030" lon="9.0035"></trkpt>
+<trkpt lat="48.0042" lon="9.0041"><ele>505.5</ele><time>2024-06-02T10:04:00Z</time></trkpt>
+</trkseg></trk>
+</gpx>
+"""
+
+GPX_10 = GPX_10_HEADER + """<name>Alte Version</name>
+<time>2010-03-04T05:06:07Z</time>
+<trk><trkseg>
+<trkpt lat="46.5000" lon="7.9000"><ele>1500</ele><time>2010-03-04T06:00:00Z</time><speed>1.2</speed></trkpt>
+<trkpt lat="46.5013" lon="7.9011"><ele>1522</ele><time>2010-03-04T06:02:00Z</time></trkpt>
+<trkpt lat="46.5027" lon="7.9030"><ele>1541</ele><time>2010-03-04T06:04:00Z</time></trkpt>
+</trkseg></trk>
+</gpx>
+"""
+
+ROUTE_ONLY = GPX_11_HEADER + """<rte><name>Nur Route</name>
+<rtept lat="47.1000" lon="8.1000"><ele>400</ele></rtept>
+<rtept lat="47.1100" lon="8.1200"><ele>450</ele></rtept>
+<rtept lat="47.1250" lon="8.1300"><ele>420</ele></rtept>
+</rte>
+</gpx>
+"""
+
+
+def _gpx_cases():
+    cases = [
+        pytest.param("multi_segment.gpx", MULTI_SEGMENT.encode("utf-8"), id="multi-segment"),
+        pytest.param("missing_elevations.gpx", MISSING_ELEVATIONS.encode("utf-8"), id="missing-elevations"),
+        pytest.param("gpx10.gpx", GPX_10.encode("utf-8"), id="gpx-1.0"),
+        pytest.param("route_only.gpx", ROUTE_ONLY.encode("utf-8"), id="route-only"),
+    ]
+    if SAMPLE_FILE.exists():
+        cases.insert(0, pytest.param(SAMPLE_FILE.name, SAMPLE_FILE.read_bytes(), id="sample-file"))
+    return cases
+
+
+def _gpxpy_reference(filename, content):
+    # Erwartete Werte direkt aus gpxpy, unabhängig von den Berechnungen in gpx_utils
+    gpx = gpxpy.parse(content.decode("utf-8"))
+    points = [point for track in gpx.tracks for segment in track.segments for point in segment.points] \
+        or [point for route in gpx.routes for point in route.points]
+    uphill, downhill = gpx.get_uphill_downhill()
+    first_time = next((point.time for point in points if point.time), None)
+    track_name = gpx.name or next((item.name for item in gpx.tracks + gpx.routes if item.name), None) \
+        or filename.rsplit(".", 1)[0]
+    return {
+        "track_name": track_name,
+        "distance_km": round(gpx.length_3d() / 1000.0, 2),
+        "total_ascent": round(uphill or 0.0, 2),
+        "total_descent": round(downhill or 0.0, 2),
+        "track_date": (gpx.time or first_time).replace(tzinfo=None) if (gpx.time or first_time) else None,
+        "latitudes": [point.latitude for point in points],
+        "longitudes": [point.longitude for point in points],
+        "elevations": [point.elevation if point.elevation is not None else math.nan for point in points],
+    }
+
+
+def _assert_matches_reference(parsed, expected):
+    assert parsed is not None
+    for key in ("latitudes", "longitudes", "elevations"):
+        np.testing.assert_allclose(np.asarray(parsed[key]), np.asarray(expected[key]), equal_nan=True, err_msg=key)
+    for key in ("distance_km", "total_ascent", "total_descent"):
+        assert parsed[key] == pytest.approx(expected[key], abs=1e-9), key
+    assert parsed["track_name"] == expected["track_name"]
+    assert parsed["track_date"] == expected["track_date"]
+
+
+@pytest.mark.parametrize("filename, content", _gpx_cases())
+def test_stream_parser_matches_gpxpy(filename, content):
+    expected = _gpxpy_reference(filename, content)
+    # Direkt den Streaming-Parser prüfen, damit ein Rückfall auf gpxpy den Vergleich nicht verdeckt
+    _assert_matches_reference(gpx_utils._parse_gpx_stream(filename, io.BytesIO(content)), expected)
+    _assert_matches_reference(gpx_utils.parse_gpx_data_from_content(filename, content), expected)
+
+
+@pytest.mark.parametrize("filename, content", _gpx_cases())
+def test_stream_parser_moving_data_matches_gpxpy(filename, content):
+    # Zeit- und Geschwindigkeitswerte gegen gpxpy selbst, nicht gegen den gpxpy-Fallback in gpx_utils
+    gpx = gpxpy.parse(content.decode("utf-8"))
+    parsed = gpx_utils._parse_gpx_stream(filename, io.BytesIO(content))
+    time_bounds = gpx.get_time_bounds()
+    if not gpx.tracks or time_bounds.start_time is None:
+        # gpxpy meldet ohne Zeitstempel 0, gespeichert wird "nicht bestimmbar"
+        assert parsed["moving_time_s"] is None and parsed["max_speed_kmh"] is None
+        return
+    moving = gpx.get_moving_data()
+    extremes = gpx.get_elevation_extremes()
+    assert parsed["moving_time_s"] == pytest.approx(moving.moving_time, abs=0.05)
+    assert parsed["max_speed_kmh"] == pytest.approx(moving.max_speed * 3.6, abs=0.005)
+    assert parsed["avg_speed_kmh"] == pytest.approx(moving.moving_distance / moving.moving_time * 3.6, abs=0.005)
+    assert parsed["total_time_s"] == pytest.approx((time_bounds.end_time - time_bounds.start_time).total_seconds(), abs=0.05)
+    assert parsed["min_elevation_m"] == pytest.approx(extremes.minimum, abs=0.05)
+    assert parsed["max_elevation_m"] == pytest.approx(extremes.maximum, abs=0.05)
+
+
+def test_sample_file_is_parsed():
+    if not SAMPLE_FILE.exists():
+        pytest.skip("Beispieldatei nicht vorhanden")
+    parsed = gpx_utils.parse_gpx_data_from_content(SAMPLE_FILE.name, SAMPLE_FILE.read_bytes())
+    assert len(parsed["latitudes"]) == 508
+    assert parsed["distance_km"] > 0
@@ -0,0 +1,67 @@
+"""Labels in labels/track_labels: UND-/ODER-Filter, Normalisierung, Zählung, Änderung und Übernahme der JSON-Labels."""
+import json
+
+import pytest
+
+import db_config
+
+
+@pytest.fixture
+def labelled_tracks(add_gpx_track):
+    return {
+        "alpen_winter": add_gpx_track(0, labels=["Alpen", "Winter"]),
+        "alpen": add_gpx_track(1, labels=[" Alpen ", "Alpen", ""]),
+        "winter_see": add_gpx_track(2, labels=["Winter", "See"]),
+        "ohne": add_gpx_track(3),
+    }
+
+
+def _filtered_ids(db, labels, mode):
+    return {track.id for track in db_config.get_filtered_tracks(db, label_filter_list=labels, label_match_mode=mode)}
+
+
+def test_and_or_label_filters(db, labelled_tracks):
+    ids = labelled_tracks
+    assert _filtered_ids(db, ["Alpen", "Winter"], "and") == {ids["alpen_winter"]}
+    assert _filtered_ids(db, ["Alpen", "Winter"], "or") == {ids["alpen_winter"], ids["alpen"], ids["winter_see"]}
+    assert _filtered_ids(db, ["Alpen"], "and") == {ids["alpen_winter"], ids["alpen"]}
+    # Doppelte und mit Leerzeichen angegebene Labels zählen einmal
+    assert _filtered_ids(db, [" Alpen", "Alpen ", "Winter"], "and") == {ids["alpen_winter"]}
+    # Unbekannte Labels: UND findet nichts, ODER ignoriert sie
+    assert _filtered_ids(db, ["Alpen", "Unbekannt"], "and") == set()
+    assert _filtered_ids(db, ["Alpen", "Unbekannt"], "or") == {ids["alpen_winter"], ids["alpen"]}
+    assert db_config.count_filtered_tracks(db, label_filter_list=["Winter"], label_match_mode="or") == 2
+    assert len(db_config.get_filtered_tracks(db)) == 4
+
+
+def test_labels_are_normalised_and_counted(db, labelled_tracks):
+    assert db_config.get_track_labels(db, labelled_tracks["alpen"]) == ["Alpen"]
+    assert json.loads(db_config.get_track_details(db, labelled_tracks["alpen"]).labels) == ["Alpen"]
+    assert db_config.get_label_counts(db) == [("Alpen", 2), ("See", 1), ("Winter", 2)]
+    assert db.query(db_config.LabelDB).count() == 3 # jedes Label nur einmal angelegt
+
+
+def test_update_replaces_labels(db, labelled_tracks):
+    track_id = labelled_tracks["winter_see"]
+    assert db_config.update_track_details(db, track_id, "Neuer Name", ["Sommer", "Winter"])
+    assert db_config.get_track_labels(db, track_id) == ["Sommer", "Winter"]
+    assert json.loads(db_config.get_track_details(db, track_id).labels) == ["Sommer", "Winter"]
+    # "See" hängt an keinem Track mehr und erscheint nicht mehr in der Auswahl
+    assert db_config.get_all_unique_labels(db) == ["Alpen", "Sommer", "Winter"]
+    assert _filtered_ids(db, ["See"], "or") == set()
+    assert _filtered_ids(db, ["Sommer", "Winter"], "and") == {track_id}
+
+
+def test_json_labels_are_migrated_once(db):
+    db.add_all([
+        db_config.TrackDB(name="Alt", stored_filename="alt.gpx", labels=json.dumps(["Alpen", "Winter"])),
+        db_config.TrackDB(name="Defekt", stored_filename="defekt.gpx", labels="[kein json"),
+        db_config.TrackDB(name="Leer", stored_filename="leer.gpx", labels="[]"),
+    ])
+    db.commit()
+    db_config.migrate_json_labels_to_tables()
+    db_config.migrate_json_labels_to_tables() # zweiter Lauf ändert nichts
+    old_track_id = db.query(db_config.TrackDB.id).filter(db_config.TrackDB.name == "Alt").scalar()
+    assert db_config.get_track_labels(db, old_track_id) == ["Alpen", "Winter"]
+    assert db.query(db_config.TrackLabelDB).count() == 2
+    assert {track.id for track in db_config.get_filtered_tracks(db, label_filter_list=["Winter"])} == {old_track_id}
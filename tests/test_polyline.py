@@ -0,0 +1,76 @@
+"""Encoded Polyline: encode_polyline/encode_geometry_polyline müssen von decode_polyline und decodePolyline (main.py) verlustfrei bis 1e-5 Grad zurückgelesen werden."""
+import json
+import re
+import shutil
+import subprocess
+from array import array
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import gpx_utils
+
+MAIN_FILE = Path(__file__).resolve().parent.parent / "main.py"
+
+GEOMETRIES = {
+    "leer": ([], []),
+    "ein_punkt": ([47.85], [8.41]),
+    "negativ": ([-33.8688, -33.8701, -34.0, -0.00001, 0.0, 0.00001], [-70.6693, -70.6702, -71.5, -0.00001, 0.0, 0.00001]),
+    # Datumsgrenze: Sprung von +179.99999 nach -179.99999 und zurück, dazu die Pole
+    "datumsgrenze": ([-16.5, -16.50001, -16.5, 90.0, -90.0], [179.99999, -179.99999, 180.0, -180.0, 179.99999]),
+    "grosse_spruenge": ([0.0, 89.99999, -89.99999, 45.12345, -45.54321], [0.0, 179.99999, -179.99999, -0.00001, 123.45678]),
+}
+
+
+def _random_track(seed, count):
+    rng = np.random.default_rng(seed)
+    return (47.0 + np.cumsum(rng.normal(0, 1e-4, count)), 8.0 + np.cumsum(rng.normal(0, 1e-4, count)))
+
+
+def test_known_google_example():
+    # Beispiel aus der Formatbeschreibung von Google
+    encoded = gpx_utils.encode_polyline(([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]))
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    np.testing.assert_allclose(gpx_utils.decode_polyline(encoded), [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]], atol=1e-9)
+
+
+@pytest.mark.parametrize("name", GEOMETRIES)
+def test_geometry_round_trip(name):
+    latitudes, longitudes = GEOMETRIES[name]
+    geometry = {"latitudes": array('d', latitudes), "longitudes": array('d', longitudes)}
+    encoded = gpx_utils.encode_geometry_polyline(geometry)
+    assert encoded.isascii() and all(63 <= ord(char) <= 126 for char in encoded)
+    decoded = gpx_utils.decode_polyline(encoded)
+    assert decoded.shape == (len(latitudes), 2)
+    np.testing.assert_allclose(decoded[:, 0], latitudes, rtol=0, atol=0.5e-5 + 1e-12)
+    np.testing.assert_allclose(decoded[:, 1], longitudes, rtol=0, atol=0.5e-5 + 1e-12)
+
+
+def test_long_track_round_trip_and_columns_with_own_precision():
+    latitudes, longitudes = _random_track(7, 20_000)
+    decoded = gpx_utils.decode_polyline(gpx_utils.encode_polyline((latitudes, longitudes)))
+    # Rundungsfehler summieren sich nicht: jeder Wert wird gerundet, nicht jede Differenz
+    np.testing.assert_allclose(decoded, np.column_stack([latitudes, longitudes]), rtol=0, atol=0.5e-5 + 1e-12)
+
+    elevations = np.linspace(-400.0, 8848.86, len(latitudes))
+    encoded = gpx_utils.encode_polyline((latitudes, longitudes, elevations), precision=[5, 5, 1])
+    decoded = gpx_utils.decode_polyline(encoded, precision=[5, 5, 1], dimensions=3)
+    np.testing.assert_allclose(decoded[:, 2], elevations, rtol=0, atol=0.05 + 1e-9)
+
+
+def _decode_in_node(encoded_values):
+    script = re.search(r"^function decodePolyline\(.*?^}$", MAIN_FILE.read_text(encoding='utf-8'), re.S | re.M).group(0)
+    script += "\nconsole.log(JSON.stringify(JSON.parse(process.argv[1]).map((encoded) => decodePolyline(encoded))));"
+    result = subprocess.run(["node", "-e", script, json.dumps(encoded_values)], capture_output=True, text=True, check=True, timeout=30)
+    return json.loads(result.stdout)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node nicht installiert")
+def test_browser_decoder_matches_python():
+    encoded_values = [gpx_utils.encode_polyline(columns) for columns in list(GEOMETRIES.values()) + [_random_track(3, 2_000)]]
+    for encoded, decoded in zip(encoded_values, _decode_in_node(encoded_values)):
+        expected = gpx_utils.decode_polyline(encoded)
+        assert len(decoded) == len(expected)
+        if len(expected):
+            np.testing.assert_allclose(decoded, expected, rtol=0, atol=1e-9)
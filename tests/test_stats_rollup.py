@@ -0,0 +1,65 @@
+"""Statistik-Rollups (track_stats_rollup): fortgeschrieben bei Upload, Label-Änderung und Löschen, gleich einer Neuberechnung."""
+import pytest
+
+import db_config
+from benchmarks.synthetic_gpx import generate_gpx
+
+
+def _rollups(db):
+    db.expire_all()
+    return {dimension: {row["key"]: row for row in db_config.get_stats_rollup(db, dimension)} for dimension in ("month", "label")}
+
+
+def _assert_matches_rebuild(db):
+    incremental = _rollups(db)
+    db_config.rebuild_track_stats_rollup()
+    rebuilt = _rollups(db)
+    assert incremental.keys() == rebuilt.keys()
+    for dimension in rebuilt:
+        assert incremental[dimension].keys() == rebuilt[dimension].keys()
+        for key, row in rebuilt[dimension].items():
+            assert incremental[dimension][key] == pytest.approx(row)
+    return rebuilt
+
+
+@pytest.fixture
+def rollup_tracks(add_gpx_track):
+    # synthetic_gpx: Datum = 2024-05-01 + seed Tage; seed 31 liegt im Juni, der Track ohne Zeit hat keinen Monat
+    return {
+        "mai_a": add_gpx_track(0, labels=["Rad", "Alpen"]),
+        "mai_b": add_gpx_track(5, labels=["Rad"]),
+        "juni": add_gpx_track(31, labels=["Wandern"]),
+        "ohne_datum": add_gpx_track(7, content=generate_gpx(40, seed=7, with_time=False)),
+    }
+
+
+def test_rollups_after_upload(db, rollup_tracks):
+    rollups = _assert_matches_rebuild(db)
+    assert {key: row["track_count"] for key, row in rollups["month"].items()} == {"": 1, "2024-05": 2, "2024-06": 1}
+    assert {key: row["track_count"] for key, row in rollups["label"].items()} == {"Alpen": 1, "Rad": 2, "Wandern": 1}
+    tracks = [db_config.get_track_details(db, track_id) for track_id in rollup_tracks.values()]
+    totals = db_config.get_catalogue_totals(db)
+    assert totals["track_count"] == 4
+    assert totals["distance_km"] == pytest.approx(sum(track.distance_km for track in tracks))
+    assert totals["total_ascent"] == pytest.approx(sum(track.gpx_parsed_total_ascent for track in tracks))
+    assert totals == pytest.approx(db_config.get_tracks_totals(db, list(rollup_tracks.values())))
+
+
+def test_rollups_after_label_update(db, rollup_tracks):
+    db_config.update_track_details(db, rollup_tracks["mai_a"], "Umbenannt", ["Wandern"])
+    rollups = _assert_matches_rebuild(db)
+    assert {key: row["track_count"] for key, row in rollups["label"].items()} == {"Rad": 1, "Wandern": 2} # "Alpen" entfällt
+    assert rollups["month"]["2024-05"]["track_count"] == 2 # Monate unverändert
+
+
+def test_rollups_after_delete(db, rollup_tracks):
+    db_config.delete_track_by_id_with_file(db, rollup_tracks["juni"])
+    db_config.delete_multiple_tracks_with_files(db, [rollup_tracks["mai_b"], rollup_tracks["ohne_datum"]])
+    rollups = _assert_matches_rebuild(db)
+    assert list(rollups["month"]) == ["2024-05"] # leere Einträge werden entfernt
+    assert list(rollups["label"]) == ["Alpen", "Rad"]
+    assert db_config.get_catalogue_totals(db)["track_count"] == 1
+
+    db_config.delete_multiple_tracks_with_files(db, [rollup_tracks["mai_a"]])
+    assert _rollups(db) == {"month": {}, "label": {}}
+    assert db_config.get_catalogue_totals(db)["track_count"] == 0
@@ -0,0 +1,114 @@
+"""Löschen in Chunks mit Grabsteinen (file_tombstones): abhängige Zeilen, Dichteraster, Dateien erst nach dem Sweep."""
+import os
+
+import pytest
+from sqlalchemy import text
+
+import db_config
+
+
+def _row_count(db, table_name):
+    return db.execute(text(f"SELECT count(*) FROM {table_name}")).scalar()
+
+
+def _object_path(db, track_id):
+    return db_config.gpx_object_path(db_config.get_track_details(db, track_id).content_hash)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(db_config, "DELETE_CHUNK_SIZE", 2)
+
+
+def test_bulk_delete_removes_dependent_rows_and_sweeps_files(db, add_gpx_track, small_chunks):
+    track_ids = [add_gpx_track(seed, labels=["Rad"]) for seed in range(5)]
+    keep_id = add_gpx_track(9)
+    object_paths = [_object_path(db, track_id) for track_id in track_ids]
+    db_config.get_gpx_filepath(db, track_ids[0]) # entpackte Kopie im Lese-Cache
+    density_before = {row for row in db.execute(text("SELECT cell_x, cell_y FROM track_density_cells"))}
+
+    deleted_count, errors = db_config.delete_multiple_tracks_with_files(db, track_ids + [track_ids[0], 12345])
+    assert (deleted_count, errors) == (5, [])
+    assert [track.id for track in db_config.get_filtered_tracks(db)] == [keep_id]
+    # Geometrien und Detailstufen per ON DELETE CASCADE, R*Tree und Suchindex per Trigger
+    for table_name, id_column in (("track_geometry", "track_id"), ("track_geometry_lod", "track_id"),
+                                  ("track_bbox_rtree", "id"), ("track_search_fts", "rowid")):
+        assert db.execute(text(f"SELECT DISTINCT {id_column} FROM {table_name}")).scalars().all() == [keep_id]
+    assert _row_count(db, "track_labels") == 0
+    # Dichteraster: nur noch die Zellen des verbliebenen Tracks, keine Zelle mit Anzahl <= 0
+    assert db.execute(text("SELECT count(*) FROM track_density_cells WHERE track_count <= 0")).scalar() == 0
+    assert {row for row in db.execute(text("SELECT cell_x, cell_y FROM track_density_cells"))} < density_before
+
+    # Dateien bleiben bis zum Sweep liegen (Löschen erst nach dem Commit)
+    assert all(path.exists() for path in object_paths)
+    assert _row_count(db, "file_tombstones") == 5
+    assert db_config.sweep_file_tombstones(db) == 5
+    assert not any(path.exists() for path in object_paths)
+    assert not any(db_config.GPX_READ_CACHE_DIR.iterdir())
+    assert _row_count(db, "file_tombstones") == 0
+    assert _object_path(db, keep_id).exists()
+
+
+def test_failed_chunk_keeps_remaining_tracks(db, add_gpx_track, small_chunks, monkeypatch):
+    track_ids = [add_gpx_track(seed) for seed in range(5)]
+    delete_chunk = db_config._delete_tracks_chunk
+
+    def failing_delete_chunk(session, chunk):
+        deleted = delete_chunk(session, chunk)
+        if track_ids[2] in chunk:
+            raise RuntimeError("Platte voll")
+        return deleted
+    monkeypatch.setattr(db_config, "_delete_tracks_chunk", failing_delete_chunk)
+
+    deleted_count, errors = db_config.delete_multiple_tracks_with_files(db, track_ids)
+    assert deleted_count == 2 and len(errors) == 1 and "3 Tracks nicht gelöscht" in errors[0]
+    assert sorted(db_config.get_filtered_track_ids(db)) == track_ids[2:] # fehlgeschlagener Chunk vollständig erhalten
+    assert db.query(db_config.GpxBlobDB).count() == 3
+    assert _row_count(db, "file_tombstones") == 2
+    db_config.sweep_file_tombstones(db)
+    assert all(_object_path(db, track_id).exists() for track_id in track_ids[2:])
+
+
+def test_sweep_keeps_objects_uploaded_again_and_reused_legacy_names(db, add_gpx_track):
+    from benchmarks.synthetic_gpx import generate_gpx
+
+    track_id = add_gpx_track(0)
+    object_path = _object_path(db, track_id)
+    db_config.delete_track_by_id_with_file(db, track_id)
+    add_gpx_track(0) # gleicher Inhalt vor dem Sweep erneut hochgeladen
+    legacy_path = db_config.GPX_UPLOAD_DIR / "alt.gpx"
+    legacy_path.write_bytes(generate_gpx(10, seed=1))
+    db.add(db_config.TrackDB(name="Alt", stored_filename="alt.gpx"))
+    db.commit()
+    db_config._add_file_tombstones(db, [legacy_path])
+    db.commit()
+
+    assert db_config.sweep_file_tombstones(db) == 0
+    assert object_path.exists() and legacy_path.exists()
+    assert _row_count(db, "file_tombstones") == 0
+
+
+def test_legacy_files_and_orphans_are_swept(db, add_gpx_track):
+    from benchmarks.synthetic_gpx import generate_gpx
+
+    legacy_path = db_config.GPX_UPLOAD_DIR / "alt.gpx"
+    legacy_path.write_bytes(generate_gpx(10, seed=1))
+    db.add(db_config.TrackDB(name="Alt", stored_filename="alt.gpx"))
+    db.commit()
+    legacy_id = db.query(db_config.TrackDB.id).filter(db_config.TrackDB.name == "Alt").scalar()
+    assert db_config.delete_track_by_id_with_file(db, legacy_id) == "Alt"
+    assert db_config.sweep_file_tombstones(db) == 1
+    assert not legacy_path.exists()
+
+    # Verwaiste Dateien (z.B. Absturz zwischen Ablage und Commit) findet der Abgleich, aber erst ab min_age_s
+    kept_path = _object_path(db, add_gpx_track(2))
+    orphan_object = db_config._write_gpx_object(db_config.gpx_content_hash(b"<gpx/>"), b"<gpx/>")
+    orphan_legacy = db_config.GPX_UPLOAD_DIR / "verwaist.gpx"
+    orphan_legacy.write_bytes(b"<gpx/>")
+    assert db_config.reconcile_orphaned_gpx_files(db) == 0
+    old = orphan_object.stat().st_mtime - 2 * db_config.ORPHAN_MIN_AGE_S
+    for path in (orphan_object, orphan_legacy, kept_path):
+        os.utime(path, (old, old))
+    assert db_config.reconcile_orphaned_gpx_files(db) == 2
+    assert db_config.sweep_file_tombstones(db) == 2
+    assert not orphan_object.exists() and not orphan_legacy.exists() and kept_path.exists()
@@ -0,0 +1,85 @@
+"""Export-Routen (track_api): gestreamtes ZIP bzw. GPX mit den erwarteten Inhalten, 404 für unbekannte/abgelaufene Tokens."""
+import asyncio
+import io
+import re
+import zipfile
+
+import gpxpy
+import pytest
+from fastapi import HTTPException
+
+import track_api
+
+
+def _download(url):
+    token, export_format = re.fullmatch(r"/api/export/(.+)\.(\w+)", url).groups()
+    response = track_api.get_export_route(token, export_format)
+
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return response, asyncio.run(collect())
+
+
+@pytest.fixture(autouse=True)
+def no_pending_exports():
+    track_api._pending_exports.clear()
+    yield
+    track_api._pending_exports.clear()
+
+
+def test_zip_export_contains_original_files(add_gpx_track):
+    track_ids = [add_gpx_track(seed, name=f"Tour {seed}") for seed in range(3)]
+    response, body = _download(track_api.export_url(track_ids + [track_ids[0]], "zip"))
+    assert response.media_type == "application/zip"
+    assert response.headers["content-disposition"].startswith('attachment; filename="tracks_')
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names == [f"{track_id}_track_{seed}.gpx" for seed, track_id in enumerate(track_ids)]
+        assert gpxpy.parse(archive.read(names[1]).decode('utf-8')).tracks[0].name == "Tour 1"
+
+
+def test_gpx_export_merges_tracks(add_gpx_track):
+    track_ids = [add_gpx_track(seed, points=30 + seed, name=f"Tour {seed}") for seed in range(2)]
+    response, body = _download(track_api.export_url(track_ids, "gpx"))
+    assert response.media_type == "application/gpx+xml"
+    merged = gpxpy.parse(body.decode('utf-8'))
+    assert [track.name for track in merged.tracks] == ["Tour 0", "Tour 1"]
+    assert [track.get_points_no() for track in merged.tracks] == [30, 31]
+
+
+def test_missing_file_is_skipped(add_gpx_track, db):
+    import db_config
+
+    track_ids = [add_gpx_track(seed) for seed in range(2)]
+    db_config.gpx_object_path(db_config.get_track_details(db, track_ids[0]).content_hash).unlink()
+    _, body = _download(track_api.export_url(track_ids, "zip"))
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.namelist() == [f"{track_ids[1]}_track_1.gpx"]
+
+
+def test_unknown_expired_and_invalid_exports(add_gpx_track, monkeypatch):
+    track_id = add_gpx_track(0)
+    with pytest.raises(HTTPException) as unknown:
+        track_api.get_export_route("unbekannt", "zip")
+    assert unknown.value.status_code == 404
+
+    url = track_api.export_url([track_id], "zip")
+    token = re.fullmatch(r"/api/export/(.+)\.zip", url).group(1)
+    with pytest.raises(HTTPException) as invalid_format:
+        track_api.get_export_route(token, "tar")
+    assert invalid_format.value.status_code == 400
+
+    monkeypatch.setattr(track_api, "EXPORT_TTL_S", -1) # jeder angelegte Export gilt als abgelaufen
+    with pytest.raises(HTTPException) as expired:
+        track_api.get_export_route(token, "zip")
+    assert expired.value.status_code == 404
+    assert token not in track_api._pending_exports # beim Abruf entfernt, nicht erst beim nächsten Export
+
+
+def test_pending_exports_are_capped():
+    urls = [track_api.export_url([index], "gpx") for index in range(track_api.EXPORT_MAX_PENDING + 5)]
+    assert len(track_api._pending_exports) == track_api.EXPORT_MAX_PENDING
+    oldest_token = re.fullmatch(r"/api/export/(.+)\.gpx", urls[0]).group(1)
+    newest_token = re.fullmatch(r"/api/export/(.+)\.gpx", urls[-1]).group(1)
+    assert oldest_token not in track_api._pending_exports and newest_token in track_api._pending_exports
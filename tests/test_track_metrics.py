@@ -0,0 +1,159 @@
+"""track_metrics (NumPy) muss dieselben Kennzahlen liefern wie gpxpy für dieselben Punkte."""
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+import gpxpy
+import gpxpy.gpx
+import numpy as np
+import pytest
+
+import track_metrics
+
+START = datetime(2024, 5, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+
+def _segment(points):
+    """points: [(lat, lon, Höhe oder None, Sekunden ab START oder None), ...]"""
+    segment = gpxpy.gpx.GPXTrackSegment()
+    for lat, lon, elevation, offset_s in points:
+        segment.points.append(gpxpy.gpx.GPXTrackPoint(
+            lat, lon, elevation=elevation, time=START + timedelta(seconds=offset_s) if offset_s is not None else None))
+    return segment
+
+
+def _gpx(*segments):
+    gpx = gpxpy.gpx.GPX()
+    track = gpxpy.gpx.GPXTrack()
+    track.segments.extend(segments)
+    gpx.tracks.append(track)
+    return gpx
+
+
+def _random_walk(seed, count, start_s=0, with_stops=True):
+    # Wanderung mit Pausen (gleiche Position), ungleichmäßigen Zeitabständen und einzelnen GPS-Sprüngen
+    rng = random.Random(seed)
+    lat, lon, elevation, offset_s = 47.0 + rng.random(), 8.0 + rng.random(), 600.0, start_s
+    points = []
+    for index in range(count):
+        points.append((lat, lon, round(elevation, 1), offset_s))
+        offset_s += rng.choice([1, 2, 5, 10])
+        if with_stops and rng.random() < 0.1:
+            continue
+        jump = 20 if rng.random() < 0.02 else 1
+        lat += rng.uniform(-1, 1) * 1e-4 * jump
+        lon += rng.uniform(-1, 1) * 1e-4 * jump
+        elevation += rng.uniform(-3, 3)
+    return points
+
+
+FIXTURES = {
+    "zwei_segmente": _gpx(
+        _segment([(47.85, 8.41, 800.0, 0), (47.851, 8.4115, 812.5, 60), (47.8523, 8.4127, 809.0, 130)]),
+        _segment([(47.86, 8.42, 830.0, 3600), (47.8612, 8.4211, 845.0, 3690), (47.8625, 8.423, 838.0, 3780)])),
+    "ohne_hoehe": _gpx(_segment([(48.0, 9.0, None, 0), (48.001, 9.0012, None, 60), (48.0021, 9.002, None, 120)])),
+    "ohne_zeit": _gpx(_segment([(46.5, 7.9, 1500.0, None), (46.5013, 7.9011, 1522.0, None), (46.5027, 7.903, 1541.0, None)])),
+    "ein_punkt": _gpx(_segment([(47.1, 8.1, 400.0, 0)])),
+    "gleiche_zeitstempel": _gpx(_segment([(47.1, 8.1, 400.0, 0), (47.1003, 8.1004, 402.0, 0), (47.1006, 8.1008, 405.0, 0),
+                                          (47.1010, 8.1011, 404.0, 30), (47.1014, 8.1015, 404.0, 30), (47.1019, 8.1020, 407.0, 60)])),
+    "hoehenluecken": _gpx(_segment([(48.0, 9.0, 500.0, 0), (48.001, 9.0012, None, 60), (48.0021, 9.002, 512.0, 120),
+                                    (48.003, 9.0035, None, None), (48.0042, 9.0041, 505.5, 240)])),
+    "meereshoehe_null": _gpx(_segment([(54.1, 10.9, 0.0, 0), (54.1004, 10.9006, 3.0, 30), (54.1008, 10.9012, 0.0, 60),
+                                       (54.1013, 10.9017, 2.0, 90)])),
+    "weite_spruenge": _gpx(_segment([(47.0, 8.0, 500.0, 0), (47.5, 8.6, 900.0, 3600), (47.5004, 8.6005, 905.0, 3660)])),
+    "wanderung": _gpx(_segment(_random_walk(1, 800)), _segment(_random_walk(2, 400, start_s=7200))),
+    "ohne_pausen": _gpx(_segment(_random_walk(3, 500, with_stops=False))),
+}
+
+
+def _arrays(gpx):
+    points = [point for track in gpx.tracks for segment in track.segments for point in segment.points]
+    segment_starts, start = [], 0
+    for segment in gpx.tracks[0].segments:
+        segment_starts.append(start)
+        start += len(segment.points)
+    return (np.array([point.latitude for point in points], dtype=np.float64),
+            np.array([point.longitude for point in points], dtype=np.float64),
+            np.array([np.nan if point.elevation is None else point.elevation for point in points], dtype=np.float64),
+            np.array([point.time.timestamp() if point.time else np.nan for point in points], dtype=np.float64),
+            segment_starts)
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_metrics_match_gpxpy(name):
+    gpx = FIXTURES[name]
+    latitudes, longitudes, elevations, seconds, segment_starts = _arrays(gpx)
+    metrics = track_metrics.compute_track_metrics(latitudes, longitudes, elevations, seconds, segment_starts)
+
+    uphill, downhill = gpx.get_uphill_downhill()
+    moving = gpx.get_moving_data()
+    time_bounds = gpx.get_time_bounds()
+    has_times = np.count_nonzero(~np.isnan(seconds)) > 1
+    assert metrics["distance_km"] == pytest.approx(round(gpx.length_3d() / 1000.0, 2), abs=0.011)
+    assert metrics["total_ascent"] == pytest.approx(round(uphill, 2), abs=0.011)
+    assert metrics["total_descent"] == pytest.approx(round(downhill, 2), abs=0.011)
+    # gpxpy meldet 0, wo track_metrics "nicht bestimmbar" (None) speichert
+    if has_times:
+        assert metrics["moving_time_s"] == pytest.approx(moving.moving_time, abs=0.1)
+        assert metrics["total_time_s"] == pytest.approx((time_bounds.end_time - time_bounds.start_time).total_seconds(), abs=0.1)
+    else:
+        assert metrics["moving_time_s"] is None and metrics["total_time_s"] is None
+    if moving.max_speed:
+        assert metrics["max_speed_kmh"] == pytest.approx(moving.max_speed * 3.6, abs=0.01)
+    else:
+        assert metrics["max_speed_kmh"] is None
+    if moving.moving_time:
+        assert metrics["avg_speed_kmh"] == pytest.approx(moving.moving_distance / moving.moving_time * 3.6, abs=0.01)
+    else:
+        assert metrics["avg_speed_kmh"] is None
+    known_elevations = elevations[~np.isnan(elevations)]
+    if len(known_elevations):
+        assert (metrics["min_elevation_m"], metrics["max_elevation_m"]) == (round(known_elevations.min(), 1), round(known_elevations.max(), 1))
+    else:
+        assert metrics["min_elevation_m"] is None and metrics["max_elevation_m"] is None
+
+
+@pytest.mark.parametrize("name", ["zwei_segmente", "hoehenluecken", "meereshoehe_null", "weite_spruenge", "wanderung"])
+def test_distances_3d_match_gpxpy(name):
+    for segment in FIXTURES[name].tracks[0].segments:
+        latitudes, longitudes, elevations, _, _ = _arrays(_gpx(segment))
+        distances = track_metrics.distances_3d_m(track_metrics.distances_2d_m(latitudes, longitudes), latitudes, longitudes, elevations)
+        expected = [point.distance_3d(previous) for previous, point in zip(segment.points, segment.points[1:])]
+        np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["zwei_segmente", "hoehenluecken", "wanderung"])
+def test_uphill_downhill_matches_gpxpy(name):
+    for segment in FIXTURES[name].tracks[0].segments:
+        _, _, elevations, _, _ = _arrays(_gpx(segment))
+        expected = segment.get_uphill_downhill()
+        assert track_metrics.uphill_downhill(elevations) == pytest.approx(tuple(expected), abs=1e-6)
+
+
+def test_moving_distance_at_sea_level_matches_gpxpy():
+    # gpxpy get_moving_data rechnet bei Höhe 0 zweidimensional, length_3d dagegen mit Höhe
+    gpx = FIXTURES["meereshoehe_null"]
+    latitudes, longitudes, elevations, seconds, segment_starts = _arrays(gpx)
+    metrics = track_metrics.compute_track_metrics(latitudes, longitudes, elevations, seconds, segment_starts)
+    moving = gpx.get_moving_data()
+    assert metrics["avg_speed_kmh"] == round(moving.moving_distance / moving.moving_time * 3.6, 2)
+    assert metrics["distance_km"] == round(gpx.length_3d() / 1000.0, 2)
+
+
+def test_single_point_and_empty_track():
+    single = track_metrics.compute_track_metrics([47.1], [8.1], [400.0], [0.0])
+    assert single["distance_km"] == 0 and single["total_ascent"] == 0 and single["total_descent"] == 0
+    assert single["moving_time_s"] is None and single["max_speed_kmh"] is None and single["avg_speed_kmh"] is None
+    assert single["min_elevation_m"] == single["max_elevation_m"] == 400.0
+    empty = track_metrics.compute_track_metrics([], [], [], None)
+    assert empty["distance_km"] == 0 and empty["moving_time_s"] is None and empty["min_elevation_m"] is None
+
+
+def test_times_to_seconds():
+    seconds = track_metrics.times_to_seconds(["2024-05-01T08:00:00Z", None, "2024-05-01T08:00:01.500Z", ""])
+    assert seconds[0] == START.timestamp()
+    assert math.isnan(seconds[1]) and math.isnan(seconds[3])
+    assert seconds[2] == START.timestamp() + 1.5
+    # Seltene Formate über gpxpy: nur die Abstände zählen, und die stimmen
+    offsets = track_metrics.times_to_seconds(["2024-05-01 10:00:00+02:00", "2024-05-01 10:00:30+02:00"])
+    assert offsets[1] - offsets[0] == 30
@@ -0,0 +1,73 @@
+"""Tabellenabfragen: Keyset-Seiten, OFFSET-Seiten und die ID-Liste (Export) liefern dieselbe Reihenfolge."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import db_config
+
+
+@pytest.fixture
+def tracks_with_null_values(db):
+    # Jeder dritte Track ohne Datum, jeder vierte ohne Distanz, dazu gleiche Werte (Tie-Breaker ID)
+    for index in range(23):
+        db.add(db_config.TrackDB(
+            name=f"Track {index % 5}", original_filename=f"track_{index}.gpx", stored_filename=f"track_{index}.gpx",
+            track_date=None if index % 3 == 0 else datetime(2024, 1, 1) + timedelta(days=index % 7),
+            distance_km=None if index % 4 == 0 else float(index % 6)))
+    db.commit()
+    return db
+
+
+@pytest.mark.parametrize("sort_by", ["date", "distance", "name", "id"])
+@pytest.mark.parametrize("descending", [True, False])
+def test_keyset_pages_match_offset_pages_and_id_list(tracks_with_null_values, sort_by, descending):
+    db = tracks_with_null_values
+    page_size = 4
+    keyset_ids, offset_ids, after_key = [], [], None
+    for page in range(7):
+        keyset_page = db_config.get_filtered_tracks(db, sort_by=sort_by, descending=descending, limit=page_size, after_key=after_key)
+        offset_page = db_config.get_filtered_tracks(db, sort_by=sort_by, descending=descending, limit=page_size, offset=page * page_size)
+        keyset_ids += [track.id for track in keyset_page]
+        offset_ids += [track.id for track in offset_page]
+        if keyset_page:
+            after_key = db_config.track_sort_key(keyset_page[-1], sort_by)
+
+    all_ids = [track.id for track in db_config.get_filtered_tracks(db, sort_by=sort_by, descending=descending)]
+    assert len(all_ids) == 23
+    assert keyset_ids == offset_ids == all_ids
+    assert db_config.get_filtered_track_ids(db, sort_by=sort_by, descending=descending) == all_ids
+
+
+def test_null_dates_sort_last_when_descending(tracks_with_null_values):
+    track_ids = db_config.get_filtered_track_ids(tracks_with_null_values)
+    dates = [db_config.get_track_details(tracks_with_null_values, track_id).track_date for track_id in track_ids]
+    assert all(date is not None for date in dates[:15]) and all(date is None for date in dates[15:])
+    assert dates[:15] == sorted(dates[:15], reverse=True)
+
+
+@pytest.fixture
+def dated_tracks(add_gpx_track):
+    # synthetic_gpx: Datum = 2024-05-01 + seed Tage
+    return [add_gpx_track(seed, labels=["Rad"] if seed % 2 else ["Wandern"]) for seed in range(6)]
+
+
+def test_filters_combine_with_count_and_totals(db, dated_tracks):
+    filters = {"start_date_str": "2024-05-02", "end_date_str": "2024-05-05", "label_filter_list": ["Rad"]}
+    tracks = db_config.get_filtered_tracks(db, **filters)
+    assert [track.id for track in tracks] == [dated_tracks[3], dated_tracks[1]] # neueste zuerst
+    assert db_config.count_filtered_tracks(db, **filters) == 2
+    totals = db_config.get_filtered_tracks_totals(db, **filters)
+    assert totals["track_count"] == 2
+    assert totals["distance_km"] == pytest.approx(sum(track.distance_km for track in tracks))
+    assert {track.id for track in db_config.get_filtered_tracks_by_ids(db, dated_tracks[:3], **filters)} == {dated_tracks[1]}
+    # Ungültiges Datum: Filter ohne Datum, wie bisher
+    assert db_config.count_filtered_tracks(db, start_date_str="01.05.2024") == 6
+
+
+def test_bbox_filter_uses_stored_boxes(db, dated_tracks):
+    track = db_config.get_track_details(db, dated_tracks[0])
+    own_box = (track.min_lat, track.min_lon, track.max_lat, track.max_lon)
+    assert dated_tracks[0] in db_config.get_filtered_track_ids(db, bbox=own_box)
+    assert db_config.get_filtered_track_ids(db, bbox=(10.0, 10.0, 10.1, 10.1)) == []
+    (min_lat, min_lon), (max_lat, max_lon) = db_config.get_tracks_bounds(db, dated_tracks)
+    assert min_lat <= track.min_lat and min_lon <= track.min_lon and max_lat >= track.max_lat and max_lon >= track.max_lon
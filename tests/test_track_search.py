@@ -0,0 +1,72 @@
+"""Volltextsuche (FTS5): Treffer über Name, Dateiname und Labels, Trigger bei Ändern/Löschen, Rangfolge."""
+import pytest
+from sqlalchemy import text
+
+import db_config
+
+
+@pytest.fixture
+def searchable_tracks(add_gpx_track):
+    return {
+        "huette": add_gpx_track(0, name="Aufstieg zur Hütte", filename="2024_hike.gpx", labels=["Wandern"]),
+        "alpsee": add_gpx_track(1, name="Runde am Alpsee", filename="alpsee_runde.gpx", labels=["Rad"]),
+        "datei": add_gpx_track(2, name="Ohne Namen", filename="alpenpass_tour.gpx"),
+    }
+
+
+def _search_ids(db, search_text, **kwargs):
+    return [track.id for track in db_config.get_filtered_tracks(db, search_text=search_text, **kwargs)]
+
+
+def _index_row_count(db):
+    return db.execute(text("SELECT count(*) FROM track_search_fts")).scalar()
+
+
+def test_search_by_name_filename_label_and_prefix(db, searchable_tracks):
+    ids = searchable_tracks
+    assert _search_ids(db, "hutte") == [ids["huette"]] # Umlaute werden beim Indizieren entfernt
+    assert _search_ids(db, "wandern") == [ids["huette"]]
+    assert _search_ids(db, "hike") == [ids["huette"]]
+    assert set(_search_ids(db, "alp")) == {ids["alpsee"], ids["datei"]} # Präfix
+    assert _search_ids(db, "alp runde") == [ids["alpsee"]] # alle Wörter müssen vorkommen
+    assert _search_ids(db, "gibtesnicht") == []
+    assert db_config.count_filtered_tracks(db, search_text="alp") == 2
+
+
+def test_search_text_is_sanitised(db, searchable_tracks):
+    # FTS5-Syntax im Suchtext wird nicht ausgewertet
+    assert db_config.track_search_match_expression('"alp* OR -- NEAR(') == '"alp"* "OR"* "NEAR"*'
+    assert db_config.track_search_match_expression("  ,;  ") is None
+    assert set(_search_ids(db, 'alp" OR (')) == set()
+    assert len(_search_ids(db, "  ")) == 3 # leerer Suchtext filtert nicht
+
+
+def test_relevance_ranks_name_matches_first(db, searchable_tracks):
+    ranked = _search_ids(db, "alp", sort_by=db_config.SEARCH_RELEVANCE_SORT)
+    assert ranked == [searchable_tracks["alpsee"], searchable_tracks["datei"]] # Name vor Dateiname
+    assert db_config.get_filtered_track_ids(db, search_text="alp", sort_by=db_config.SEARCH_RELEVANCE_SORT) == ranked
+    assert _search_ids(db, "alp", sort_by=db_config.SEARCH_RELEVANCE_SORT, limit=1, offset=1) == ranked[1:]
+
+
+def test_triggers_follow_updates_and_deletes(db, searchable_tracks):
+    ids = searchable_tracks
+    assert _index_row_count(db) == 3
+    assert db_config.update_track_details(db, ids["huette"], "Gipfeltour", ["Skitour"])
+    assert _search_ids(db, "hutte") == []
+    assert _search_ids(db, "gipfel") == [ids["huette"]]
+    assert _search_ids(db, "skitour") == [ids["huette"]]
+    assert _search_ids(db, "wandern") == []
+    assert _search_ids(db, "hike") == [ids["huette"]] # Dateiname unverändert
+
+    db_config.delete_multiple_tracks_with_files(db, [ids["alpsee"], ids["datei"]])
+    assert _search_ids(db, "alp") == []
+    assert _index_row_count(db) == 1
+
+
+def test_existing_tracks_are_indexed_when_the_index_is_created(db, searchable_tracks):
+    with db_config.engine.begin() as connection:
+        connection.execute(text("DELETE FROM track_search_fts"))
+    assert _search_ids(db, "alp") == []
+    db_config.create_db_tables()
+    assert len(_search_ids(db, "alp")) == 2
+    assert _index_row_count(db) == 3
@@ -0,0 +1,241 @@
+# projekt_gpx_viewer/track_api.py
+"""
+HTTP-Routen auf NiceGUIs FastAPI-App (Import in main.py registriert sie): Track-Geometrien, Heatmap-Kacheln,
+der Export mehrerer Tracks und die Metriken im Prometheus-Textformat (/metrics, siehe metrics.py).
+
+Geometrien gehen nicht mehr über die Websocket-Verbindung, sondern werden vom Browser per fetch geladen,
+sobald ihr Layer zur Karte hinzukommt (siehe loadTrackGeometry in main.py). So greift der HTTP-Cache des
+Browsers: die Antwort trägt ein starkes ETag, eine erneute Anfrage wird mit 304 ohne Inhalt beantwortet.
+
+Exporte (ZIP der Originaldateien oder eine zusammengeführte GPX) werden gestreamt: ein Generator liest
+die Dateien blockweise und gibt die Ausgabe sofort weiter, der Download beginnt auch bei 10.000 Tracks
+ohne Wartezeit und der Speicherbedarf hängt nicht von der Anzahl ab.
+"""
+from typing import Optional, Dict, List, Tuple, Iterator
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import io
+import re
+import secrets
+import threading
+import time
+import zipfile
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from nicegui import app
+
+import db_config
+import gpx_utils
+import metrics
+
+GEOMETRY_MEDIA_TYPE = "text/plain; charset=us-ascii" # gpx_utils.encode_geometry_polyline
+GEOMETRY_FORMAT_VERSION = 2 # Erhöhen, wenn sich das Binärformat ändert (macht alle ETags ungültig)
+GEOMETRY_GZIP_LEVEL = 6
+
+
+def geometry_url(track_id: int, level: Optional[int]) -> str:
+    """URL der Geometrie eines Tracks in der Detailstufe level (Index in gpx_utils.LOD_LEVELS, None = voll)."""
+    return f"/api/tracks/{track_id}/geometry" + (f"?level={level}" if level is not None else "")
+
+
+def geometry_etag(stored_filename: str, level: Optional[int], gzipped: bool) -> str:
+    # Gespeicherte Geometrien ändern sich nie: Dateiname (eindeutig je Upload) + Stufe + Format bestimmen den Inhalt.
+    # Die gzip-Variante ist eine eigene Repräsentation und bekommt ein eigenes starkes ETag.
+    digest = hashlib.sha1(f"{stored_filename}:{level}:{GEOMETRY_FORMAT_VERSION}".encode('utf-8')).hexdigest()
+    return f'"{digest}{"-gz" if gzipped else ""}"'
+
+
+@app.get('/api/tracks/{track_id}/geometry')
+@metrics.timed('http_geometry')
+def get_track_geometry_route(track_id: int, request: Request, level: Optional[int] = None) -> Response:
+    """Geometrie als Encoded Polyline (lat, lon; 1e-5 Grad), gzip-komprimiert, mit ETag/If-None-Match."""
+    if level is not None and not 0 <= level < len(gpx_utils.LOD_LEVELS):
+        raise HTTPException(status_code=400, detail=f"level muss zwischen 0 und {len(gpx_utils.LOD_LEVELS) - 1} liegen")
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    # no-cache: der Browser darf speichern, fragt aber jedes Mal nach (IDs können nach dem Löschen neu vergeben werden)
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    db = db_config.SessionLocal()
+    try:
+        track = db_config.get_track_details(db, track_id)
+        if not track:
+            raise HTTPException(status_code=404, detail=f"Track {track_id} nicht gefunden")
+        served_level, geometry = db_config.get_track_geometries_for_level(db, [track_id], level).get(track_id, (None, None))
+    finally:
+        db.close()
+    if not geometry:
+        raise HTTPException(status_code=404, detail=f"Keine Geometrie für Track {track_id}")
+    # ETag der tatsächlich gelieferten Stufe: fehlt die Detailstufe noch (Nachtrag im Hintergrundjob), ist es die volle Geometrie
+    headers["ETag"] = geometry_etag(track.stored_filename, served_level, gzipped)
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    body = gpx_utils.encode_geometry_polyline(geometry).encode('ascii')
+    if gzipped:
+        body = gzip.compress(body, compresslevel=GEOMETRY_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip" # NiceGUIs GZipMiddleware lässt bereits komprimierte Antworten durch
+    metrics.record_points('http_geometry', len(geometry["latitudes"]))
+    metrics.BYTES_SENT.inc(len(body), channel='http_geometry')
+    return Response(content=body, media_type=GEOMETRY_MEDIA_TYPE, headers=headers)
+
+
+@app.get('/api/heatmap/{zoom}/{tile_x}/{tile_y}.png')
+@metrics.timed('http_heatmap')
+def get_heatmap_tile_route(zoom: int, tile_x: int, tile_y: int, request: Request) -> Response:
+    """Heatmap-Kachel aus dem vorberechneten Dichteraster (db_config.TrackDensityCellDB), Aufwand unabhängig von der Track-Anzahl."""
+    if not 0 <= zoom <= gpx_utils.HEATMAP_MAX_ZOOM or not (0 <= tile_x < 2 ** zoom and 0 <= tile_y < 2 ** zoom):
+        raise HTTPException(status_code=400, detail="Kachel außerhalb des Rasters")
+    db = db_config.SessionLocal()
+    try:
+        cell_x, cell_y, track_counts = db_config.get_density_tile_cells(db, zoom, tile_x, tile_y)
+    finally:
+        db.close()
+    body = gpx_utils.render_heatmap_tile(cell_x, cell_y, track_counts)
+    # Inhalt ändert sich mit jedem Upload/Löschen: ETag aus dem PNG, der Browser fragt bei jedem Laden nach
+    headers = {"Cache-Control": "no-cache", "ETag": f'"{hashlib.sha1(body).hexdigest()}"'}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    metrics.BYTES_SENT.inc(len(body), channel='http_heatmap')
+    return Response(content=body, media_type="image/png", headers=headers)
+
+
+EXPORT_FORMATS = {"zip": "application/zip", "gpx": "application/gpx+xml"}
+EXPORT_TTL_S = 15 * 60 # So lange bleibt eine Export-URL gültig
+EXPORT_MAX_PENDING = 64 # Höchstens so viele offene Exporte (alle Clients); darüber fällt der älteste weg
+EXPORT_BATCH_SIZE = 500 # Dateipfade je DB-Abfrage
+EXPORT_BLOCK_SIZE = 256 * 1024
+
+# Angelegte Exporte: Token -> (Anlagezeit, Track-IDs), in Anlagereihenfolge; die IDs passen so nicht in die URL.
+# export_url läuft im Event-Loop, die Route im Threadpool: Zugriffe nur unter dem Lock.
+_pending_exports: Dict[str, Tuple[float, List[int]]] = {}
+_pending_exports_lock = threading.Lock()
+
+
+def _purge_expired_exports(now: float) -> None:
+    # Aufruf nur mit _pending_exports_lock
+    for token in [token for token, (created, _) in _pending_exports.items() if now - created > EXPORT_TTL_S]:
+        del _pending_exports[token]
+
+
+def export_url(track_ids: List[int], export_format: str) -> str:
+    """Legt einen Export der Tracks an (Format aus EXPORT_FORMATS) und gibt die Download-URL zurück."""
+    token = secrets.token_urlsafe(16)
+    with _pending_exports_lock:
+        now = time.monotonic()
+        _purge_expired_exports(now)
+        while len(_pending_exports) >= EXPORT_MAX_PENDING:
+            del _pending_exports[next(iter(_pending_exports))]
+        _pending_exports[token] = (now, list(dict.fromkeys(track_ids)))
+    return f"/api/export/{token}.{export_format}"
+
+
+def _pending_export_track_ids(token: str) -> Optional[List[int]]:
+    with _pending_exports_lock:
+        _purge_expired_exports(time.monotonic())
+        pending = _pending_exports.get(token)
+    return pending[1] if pending else None
+
+
+def _iter_export_files(track_ids: List[int]) -> Iterator[Tuple[int, str, bool, str, Optional[datetime]]]:
+    # Dateipfade in Batches nachladen, die erste Datei kann sofort gelesen werden
+    for start in range(0, len(track_ids), EXPORT_BATCH_SIZE):
+        db = db_config.SessionLocal()
+        try:
+            track_files = db_config.get_track_files(db, track_ids[start:start + EXPORT_BATCH_SIZE])
+        finally:
+            db.close()
+        yield from track_files
+
+
+def _open_export_file(file_path: str, compressed: bool):
+    return gzip.open(file_path, 'rb') if compressed else open(file_path, 'rb')
+
+
+def _zip_entry_name(track_id: int, filename: str) -> str:
+    # Track-ID vorne macht die Namen eindeutig (gleiche Originalnamen kommen vor)
+    safe_name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', filename).strip() or "track"
+    if not safe_name.lower().endswith(".gpx"):
+        safe_name += ".gpx"
+    return f"{track_id}_{safe_name}"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Nicht seekbares Ziel für zipfile (schreibt dann Data Descriptors); take() gibt das bisher Geschriebene ab."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_export_zip(track_ids: List[int]) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for track_id, file_path, compressed, filename, track_date in _iter_export_files(track_ids):
+            entry = zipfile.ZipInfo(_zip_entry_name(track_id, filename),
+                                    date_time=(track_date if track_date and track_date.year >= 1980 else datetime.now()).timetuple()[:6])
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            try:
+                with _open_export_file(file_path, compressed) as source, archive.open(entry, 'w') as target:
+                    while block := source.read(EXPORT_BLOCK_SIZE):
+                        target.write(block)
+                        data = sink.take()
+                        if data:
+                            yield data
+            except (OSError, EOFError) as e: # Fehlende/defekte Datei: Track auslassen, der Rest des Exports läuft weiter
+                print(f"Track ID {track_id} ({file_path}) nicht exportiert: {e}")
+    yield sink.take() # Central Directory
+
+
+def _iter_export_gpx(track_ids: List[int]) -> Iterator[bytes]:
+    yield gpx_utils.merged_gpx_header(f"GPX-Export ({len(track_ids)} Tracks)", datetime.now(timezone.utc)).encode('utf-8')
+    for track_id, file_path, compressed, filename, _ in _iter_export_files(track_ids):
+        try:
+            with _open_export_file(file_path, compressed) as source:
+                for text in gpx_utils.iter_gpx_elements_xml(filename, source):
+                    yield text.encode('utf-8')
+        except (OSError, EOFError) as e:
+            print(f"Track ID {track_id} ({file_path}) nicht exportiert: {e}")
+    yield gpx_utils.MERGED_GPX_FOOTER.encode('utf-8')
+
+
+def _metered_export(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # Dauer des ganzen Downloads (nicht nur des Routen-Aufrufs) und gesendete Bytes
+    with metrics.timer('http_export'):
+        for chunk in chunks:
+            metrics.BYTES_SENT.inc(len(chunk), channel='http_export')
+            yield chunk
+
+
+@app.get('/api/export/{token}.{export_format}')
+def get_export_route(token: str, export_format: str) -> StreamingResponse:
+    """Gestreamter Download eines mit export_url angelegten Exports: ZIP der Originaldateien oder eine GPX-Datei."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format muss eines von {', '.join(EXPORT_FORMATS)} sein")
+    track_ids = _pending_export_track_ids(token)
+    if track_ids is None:
+        raise HTTPException(status_code=404, detail="Export nicht gefunden oder abgelaufen")
+    chunks = _iter_export_zip(track_ids) if export_format == "zip" else _iter_export_gpx(track_ids)
+    filename = f"tracks_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    # Der synchrone Generator läuft in Starlettes Threadpool; GPX komprimiert NiceGUIs GZipMiddleware unterwegs
+    return StreamingResponse(_metered_export(chunks), media_type=EXPORT_FORMATS[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"})
+
+
+@app.get('/metrics')
+def get_metrics_route() -> Response:
+    """Zähler und Histogramme aus metrics.py im Prometheus-Textformat."""
+    return Response(content=metrics.render_prometheus_text(), media_type=metrics.METRICS_MEDIA_TYPE)
@@ -0,0 +1,173 @@
+# projekt_gpx_viewer/track_metrics.py
+"""
+Kennzahlen eines Tracks, vektorisiert mit NumPy und einmal beim Import berechnet (gespeichert in db_config.TrackDB).
+
+Eingabe sind die Arrays des Parsers (lat/lon/ele, Zeiten in Sekunden, Segment-Anfänge); jede Kennzahl ist ein
+paar Array-Durchläufe statt einer Python-Schleife pro Punkt. Die Ergebnisse entsprechen gpxpy:
+    distance_km          length_3d (2D-Näherung für nahe Punkte, Haversine für entfernte, Höhe nur bei nahen Punkten)
+    total_ascent/descent get_uphill_downhill (Glättung .3/.4/.3, Punkte ohne Höhe ignoriert)
+    moving_time_s        get_moving_data (unter STOPPED_SPEED_THRESHOLD_KMH gilt als Stillstand)
+    max_speed_kmh        get_moving_data (Ausreißer-Abstände und die obersten 5 % der Geschwindigkeiten verworfen)
+Alles je Segment, Sprünge zwischen Segmenten zählen nicht mit.
+"""
+from typing import Optional, Dict, Any, Sequence, Tuple
+import math
+
+import numpy as np
+import gpxpy.geo # Distanz-Konstanten (ONE_DEGREE, EARTH_RADIUS)
+import gpxpy.gpx
+import gpxpy.gpxfield
+
+STOPPED_SPEED_THRESHOLD_KMH = 1.0 # gpxpy DEFAULT_STOPPED_SPEED_THRESHOLD
+IGNORE_TOP_SPEED_PERCENTILE = 0.05 # gpxpy IGNORE_TOP_SPEED_PERCENTILES
+NONSTANDARD_DISTANCE_STDDEVS = 1.5 # Abstände weiter vom Mittel gelten als GPS-Sprung (calculate_max_speed)
+NEAR_POINTS_MAX_DEGREES = 0.2 # Darüber Haversine statt ebener Näherung (wie gpxpy)
+
+_EPOCH = np.datetime64(0, 'us')
+
+# Kennzahlen, die als gleichnamige Spalten in TrackDB landen
+METRIC_COLUMNS = ["moving_time_s", "total_time_s", "max_speed_kmh", "avg_speed_kmh", "min_elevation_m", "max_elevation_m"]
+
+
+def distances_2d_m(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Abstände (Meter) aufeinanderfolgender Punkte wie gpxpy.geo.distance ohne Höhe (Länge n-1)."""
+    lat_1, lat_2 = latitudes[:-1], latitudes[1:]
+    d_lat = lat_1 - lat_2
+    d_lon = longitudes[:-1] - longitudes[1:]
+    # Nahe Punkte: ebene Näherung mit dem Breitengrad-Kosinus des zweiten Punkts (gpxpy: point.distance_3d(previous))
+    distances = np.hypot(d_lat, d_lon * np.cos(np.radians(lat_2))) * gpxpy.geo.ONE_DEGREE
+    far = (np.abs(d_lat) > NEAR_POINTS_MAX_DEGREES) | (np.abs(d_lon) > NEAR_POINTS_MAX_DEGREES)
+    if far.any():
+        lat_1_far, lat_2_far = np.radians(lat_1[far]), np.radians(lat_2[far])
+        a = np.sin((lat_1_far - lat_2_far) / 2) ** 2 \
+            + np.sin(np.radians(d_lon[far]) / 2) ** 2 * np.cos(lat_1_far) * np.cos(lat_2_far)
+        distances[far] = gpxpy.geo.EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return distances
+
+
+def distances_3d_m(distances_2d: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, elevations: np.ndarray) -> np.ndarray:
+    """Wie gpxpy distance_3d: Höhenunterschied nur bei nahen Punkten, die beide eine Höhe haben (Länge n-1)."""
+    d_ele = elevations[1:] - elevations[:-1]
+    near = (np.abs(latitudes[:-1] - latitudes[1:]) <= NEAR_POINTS_MAX_DEGREES) \
+        & (np.abs(longitudes[:-1] - longitudes[1:]) <= NEAR_POINTS_MAX_DEGREES)
+    use_elevation = near & ~np.isnan(d_ele) & (d_ele != 0)
+    return np.where(use_elevation, np.hypot(distances_2d, np.where(use_elevation, d_ele, 0.0)), distances_2d)
+
+
+def uphill_downhill(elevations: np.ndarray) -> Tuple[float, float]:
+    """Anstieg/Abstieg eines Segments wie gpxpy.geo.calculate_uphill_downhill (NaN = ohne Höhe)."""
+    known = elevations[~np.isnan(elevations)]
+    if len(known) < 2:
+        return 0.0, 0.0
+    smoothed = known.copy()
+    smoothed[1:-1] = known[:-2] * .3 + known[1:-1] * .4 + known[2:] * .3 # Endpunkte bleiben ungeglättet
+    differences = np.diff(smoothed)
+    return float(differences[differences > 0].sum()), float(-differences[differences < 0].sum())
+
+
+def _max_speed_mps(speeds: np.ndarray, distances: np.ndarray) -> Optional[float]:
+    # gpxpy.geo.calculate_max_speed: Abstände außerhalb von 1,5 Standardabweichungen verwerfen, dann 95. Perzentil
+    if len(speeds) < 2:
+        return None
+    standard = np.abs(distances - distances.mean()) <= distances.std() * NONSTANDARD_DISTANCE_STDDEVS
+    filtered_speeds = np.sort(speeds[standard])
+    if not len(filtered_speeds):
+        return None
+    index = int(len(filtered_speeds) * (1 - IGNORE_TOP_SPEED_PERCENTILE))
+    return float(filtered_speeds[index if index < len(filtered_speeds) else -1])
+
+
+def moving_data(distances: np.ndarray, seconds: np.ndarray) -> Tuple[float, float, Optional[float]]:
+    """(Bewegungszeit s, Bewegungsstrecke m, Höchstgeschwindigkeit m/s) eines Segments wie gpxpy get_moving_data."""
+    valid = ~np.isnan(seconds) & (seconds > 0) & (distances > 0)
+    speeds_kmh = np.zeros_like(distances)
+    np.divide(distances * 3.6, seconds, out=speeds_kmh, where=valid)
+    moving = valid & (speeds_kmh > STOPPED_SPEED_THRESHOLD_KMH)
+    moving_time = float(seconds[moving].sum())
+    moving_distance = float(distances[moving].sum())
+    # gpxpy nimmt Geschwindigkeiten erst ab der ersten Bewegung auf
+    moving_indices = np.flatnonzero(moving)
+    if not len(moving_indices):
+        return moving_time, moving_distance, None
+    counted = valid.copy()
+    counted[:moving_indices[0]] = False
+    return moving_time, moving_distance, _max_speed_mps(speeds_kmh[counted] / 3.6, distances[counted])
+
+
+def times_to_seconds(time_texts: Sequence[Optional[str]]) -> np.ndarray:
+    """GPX-Zeitstempel (ISO 8601) als Sekunden seit 1970, NaN ohne Zeit; Zeitzonen werden wie beim Parser ignoriert."""
+    texts = ['NaT' if not text else text.strip().rstrip('Zz') for text in time_texts]
+    try:
+        times = np.array(texts, dtype='datetime64[us]') # Vektorisiert für die üblichen "...T08:00:00(.123)Z"
+    except ValueError:
+        times = np.array([_parse_time_fallback(text) for text in time_texts], dtype='datetime64[us]')
+    seconds = (times - _EPOCH).astype(np.float64) / 1e6
+    seconds[np.isnat(times)] = np.nan
+    return seconds
+
+
+def _parse_time_fallback(text: Optional[str]) -> Any:
+    # Seltene Formate (Zeitzonen-Offset, Leerzeichen ...) einzeln über gpxpy
+    if not text or not text.strip():
+        return 'NaT'
+    try:
+        parsed = gpxpy.gpxfield.parse_time(text.strip())
+    except gpxpy.gpx.GPXException:
+        return 'NaT'
+    return np.datetime64(parsed.replace(tzinfo=None), 'us') if parsed else 'NaT'
+
+
+def _round_or_none(value: Optional[float], digits: int) -> Optional[float]:
+    return round(value, digits) if value is not None and math.isfinite(value) else None
+
+
+def compute_track_metrics(latitudes: Any, longitudes: Any, elevations: Any,
+                          times_s: Optional[Any] = None, segment_starts: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """
+    Alle Kennzahlen eines Tracks in einem Aufruf. times_s: Sekunden je Punkt (NaN ohne Zeit) oder None,
+    segment_starts: Index des ersten Punkts jedes Segments (Standard: ein Segment).
+    Gibt distance_km, total_ascent, total_descent und die Werte aus METRIC_COLUMNS zurück (None, wenn nicht bestimmbar).
+    """
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    ele = np.asarray(elevations, dtype=np.float64) if len(elevations) else np.full(len(lat), np.nan)
+    seconds_per_point = np.asarray(times_s, dtype=np.float64) if times_s is not None and len(times_s) else np.full(len(lat), np.nan)
+    point_count = len(lat)
+    boundaries = sorted(set(segment_starts or [0]) | {0})
+    boundaries = [start for start in boundaries if start < point_count] + [point_count]
+
+    distances_2d = distances_2d_m(lat, lon)
+    distances_3d = distances_3d_m(distances_2d, lat, lon, ele)
+    # get_moving_data rechnet nur mit Höhe, wenn beide Höhen "wahr" sind: Höhe 0 zählt dort wie keine Höhe
+    moving_distances = np.where((ele[:-1] != 0) & (ele[1:] != 0), distances_3d, distances_2d)
+    step_seconds = np.diff(seconds_per_point)
+    # Paare über eine Segmentgrenze hinweg (Index start-1 -> start) zählen nicht
+    within_segment = np.ones(max(point_count - 1, 0), dtype=bool)
+    within_segment[[start - 1 for start in boundaries[1:-1] if start > 0]] = False
+
+    uphill = downhill = moving_time = moving_distance = 0.0
+    max_speed: Optional[float] = None
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        segment_up, segment_down = uphill_downhill(ele[start:end])
+        uphill += segment_up
+        downhill += segment_down
+        if end - start > 1:
+            segment_moving_time, segment_moving_distance, segment_max_speed = moving_data(moving_distances[start:end - 1], step_seconds[start:end - 1])
+            moving_time += segment_moving_time
+            moving_distance += segment_moving_distance
+            if segment_max_speed is not None:
+                max_speed = max(max_speed or 0.0, segment_max_speed)
+
+    known_elevations = ele[~np.isnan(ele)]
+    known_times = seconds_per_point[~np.isnan(seconds_per_point)]
+    return {
+        "distance_km": round(float(distances_3d[within_segment].sum()) / 1000.0, 2),
+        "total_ascent": round(uphill, 2),
+        "total_descent": round(downhill, 2),
+        "moving_time_s": round(moving_time, 1) if len(known_times) > 1 else None,
+        "total_time_s": round(float(known_times.max() - known_times.min()), 1) if len(known_times) > 1 else None,
+        "max_speed_kmh": _round_or_none(max_speed * 3.6 if max_speed is not None else None, 2),
+        "avg_speed_kmh": _round_or_none(moving_distance / moving_time * 3.6 if moving_time > 0 else None, 2),
+        "min_elevation_m": _round_or_none(float(known_elevations.min()) if len(known_elevations) else None, 1),
+        "max_elevation_m": _round_or_none(float(known_elevations.max()) if len(known_elevations) else None, 1),
+    }
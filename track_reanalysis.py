@@ -0,0 +1,324 @@
+# projekt_gpx_viewer/track_reanalysis.py
+"""
+Neuberechnung der abgeleiteten Track-Spalten (db_config.TRACK_ANALYSIS_COLUMNS, Bounding Box) aus den
+gespeicherten GPX-Dateien, z.B. nach einer neuen Kennzahl oder einem geänderten Algorithmus
+(dafür db_config.TRACK_ANALYSIS_VERSION erhöhen). Tracks von vor Einführung der Spalten (analysis_version
+NULL) erhalten so auch ihre Bounding Box und, falls sie fehlt, die gespeicherte Geometrie nach. Davor trägt
+derselbe Runner die Detailstufen gespeicherter Geometrien (build_lod / run_lod_job) und Geometrien, die noch
+nicht im Dichteraster der Heatmap stehen (build_density_grid / run_density_grid_job), in Batches nach.
+
+Der Job geht die Tracks mit älterer Version in ID-Reihenfolge in Batches durch, parst die Dateien im
+Prozess-Pool und schreibt Ergebnisse und Checkpoint (background_jobs) je Batch in einer Transaktion.
+Nach einem Abbruch setzt er beim nächsten Start hinter dem letzten gespeicherten Batch fort.
+
+In der App laufen alle im Hintergrund (run_background_jobs, gestartet von main.py) und drosseln sich selbst:
+höchstens REANALYSIS_MAX_PARALLEL Dateien gleichzeitig im Upload-Pool, danach eine Pause, sodass sie nur
+REANALYSIS_DUTY_CYCLE der Zeit arbeiten. Von der Kommandozeile laufen sie ungebremst, mit eigenem Pool:
+
+    python -m track_reanalysis [--workers N] [--batch-size N] [--restart] [--migrate-files]
+
+--migrate-files übernimmt vorher einmalig die GPX-Dateien aus der Zeit vor der inhaltsadressierten Ablage
+(db_config.migrate_gpx_files_to_content_store) und entfernt die alten Dateien danach.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+import traceback
+
+import db_config
+import gpx_ingest
+import gpx_utils
+import metrics
+
+REANALYSIS_JOB_NAME = "track_reanalysis"
+DEFAULT_BATCH_SIZE = 50
+DENSITY_BATCH_SIZE = 100 # Geometrien je Transaktion beim Aufbau des Dichterasters
+LOD_BATCH_SIZE = 100 # Geometrien je Transaktion beim Nachtragen der Detailstufen
+# Anteil der Zeit, in der der Job in der App arbeitet (Umgebungsvariable GPX_REANALYSIS_DUTY_CYCLE, 0 = aus)
+REANALYSIS_DUTY_CYCLE = float(os.environ.get("GPX_REANALYSIS_DUTY_CYCLE", "0.25"))
+# Gleichzeitig geparste Dateien in der App; der Rest des Pools bleibt für Uploads frei
+REANALYSIS_MAX_PARALLEL = max(1, gpx_ingest.GPX_PARSE_WORKERS // 2)
+REANALYSIS_START_DELAY_S = 10.0 # Start der App und erste Seitenaufrufe nicht ausbremsen
+
+# Ein Eintrag von db_config.get_tracks_for_analysis: (track_id, Dateipfad, gzip-komprimiert, Dateiname, Geometrie fehlt)
+TrackFile = Tuple[int, str, bool, str, bool]
+
+
+def analyze_stored_track(file_path: str, compressed: bool, filename: str, include_geometry: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Läuft im Worker-Prozess: parst eine gespeicherte Datei und gibt nur die abgeleiteten Werte zurück
+    (TRACK_ANALYSIS_COLUMNS, "bounds", "point_count"). Die Punkt-Arrays bleiben im Worker, außer bei
+    include_geometry (Track ohne gespeicherte Geometrie): dann zusätzlich "geometry" samt Detailstufen.
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        print(f"Datei {path} für die Neuberechnung nicht gefunden.")
+        return None
+    with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as gpx_file:
+        parsed_gpx_data = gpx_utils.parse_gpx_data_from_stream(filename, gpx_file)
+    if not parsed_gpx_data:
+        return None
+    values = {key: parsed_gpx_data.get(key) for key in db_config.TRACK_ANALYSIS_COLUMNS}
+    values["bounds"] = parsed_gpx_data["bounds"]
+    values["point_count"] = len(parsed_gpx_data["latitudes"])
+    if include_geometry:
+        values["geometry"] = {key: parsed_gpx_data[key] for key in ("latitudes", "longitudes", "elevations")}
+        values["geometry"]["lod_geometries"] = gpx_utils.build_lod_geometries(parsed_gpx_data)
+    return values
+
+
+def _start_job(restart: bool) -> Optional[Dict[str, Any]]:
+    db = db_config.SessionLocal()
+    try:
+        return db_config.start_background_job(db, REANALYSIS_JOB_NAME, restart=restart)
+    finally:
+        db.close()
+
+
+def _next_batch(after_track_id: int, batch_size: int) -> List[TrackFile]:
+    db = db_config.SessionLocal()
+    try:
+        return db_config.get_tracks_for_analysis(db, after_track_id, batch_size)
+    finally:
+        db.close()
+
+
+def _store_batch(batch: List[TrackFile], results: List[Any]) -> bool:
+    values_by_track_id: Dict[int, Optional[Dict[str, Any]]] = {}
+    for (track_id, file_path, *_), result in zip(batch, results):
+        if isinstance(result, BaseException):
+            print(f"Fehler bei der Neuberechnung von Track ID {track_id} ({file_path}): {result}")
+            result = None
+        if result:
+            metrics.record_points('reanalysis', result["point_count"])
+        values_by_track_id[track_id] = result
+    db = db_config.SessionLocal()
+    try:
+        return db_config.apply_track_analysis_batch(db, REANALYSIS_JOB_NAME, batch[-1][0], values_by_track_id)
+    finally:
+        db.close()
+
+
+def _finish_job() -> None:
+    db = db_config.SessionLocal()
+    try:
+        db_config.finish_background_job(db, REANALYSIS_JOB_NAME)
+    finally:
+        db.close()
+
+
+def _in_session(function: Any, *args: Any) -> Any:
+    db = db_config.SessionLocal()
+    try:
+        return function(db, *args)
+    finally:
+        db.close()
+
+
+def _pause_s(started: float, duty_cycle: float) -> float:
+    # Pause so bemessen, dass der Job nur duty_cycle der Zeit arbeitet
+    return (time.perf_counter() - started) * (1 - min(duty_cycle, 1.0)) / min(duty_cycle, 1.0)
+
+
+async def run_density_grid_job(batch_size: int = DENSITY_BATCH_SIZE, duty_cycle: float = REANALYSIS_DUTY_CYCLE) -> None:
+    """Hintergrund-Job der App: Geometrien ohne Zellen ins Dichteraster eintragen, je Batch ein Commit, gedrosselt."""
+    if duty_cycle <= 0:
+        return
+    remaining = await asyncio.to_thread(_in_session, db_config.prepare_density_grid)
+    if not remaining:
+        return
+    print(f"Dichteraster: {remaining} Tracks werden im Hintergrund eingetragen.")
+    processed = 0
+    while True:
+        track_ids = await asyncio.to_thread(_in_session, db_config.get_geometries_missing_density, batch_size)
+        if not track_ids:
+            break
+        started = time.perf_counter()
+        with metrics.timer('density_grid_batch'):
+            if not await asyncio.to_thread(_in_session, db_config.apply_density_grid_batch, track_ids):
+                print("Aufbau des Dichterasters unterbrochen, er wird beim nächsten Start fortgesetzt.")
+                return
+        processed += len(track_ids)
+        await asyncio.sleep(_pause_s(started, duty_cycle))
+    print(f"Dichteraster vollständig: {processed} Tracks eingetragen.")
+
+
+def build_density_grid(batch_size: int = DENSITY_BATCH_SIZE) -> Optional[int]:
+    """Kommandozeilen-Variante von run_density_grid_job, ohne Drosselung. Gibt die Anzahl eingetragener Tracks zurück (None bei DB-Fehlern)."""
+    if _in_session(db_config.prepare_density_grid) is None:
+        return None
+    processed = 0
+    while True:
+        track_ids = _in_session(db_config.get_geometries_missing_density, batch_size)
+        if not track_ids:
+            return processed
+        if not _in_session(db_config.apply_density_grid_batch, track_ids):
+            return None
+        processed += len(track_ids)
+
+
+async def run_lod_job(batch_size: int = LOD_BATCH_SIZE, duty_cycle: float = REANALYSIS_DUTY_CYCLE) -> None:
+    """
+    Hintergrund-Job der App: Detailstufen für gespeicherte Geometrien ohne Stufen nachtragen (bis dahin liefert
+    track_api die volle Geometrie), je Batch ein Commit, gedrosselt.
+    """
+    if duty_cycle <= 0:
+        return
+    last_track_id, processed = 0, 0
+    while True:
+        track_ids = await asyncio.to_thread(_in_session, db_config.get_geometries_missing_lod, last_track_id, batch_size)
+        if not track_ids:
+            break
+        started = time.perf_counter()
+        with metrics.timer('lod_batch'):
+            if not await asyncio.to_thread(_in_session, db_config.apply_lod_batch, track_ids):
+                print("Nachtragen der Detailstufen unterbrochen, es wird beim nächsten Start fortgesetzt.")
+                return
+        last_track_id = track_ids[-1]
+        processed += len(track_ids)
+        await asyncio.sleep(_pause_s(started, duty_cycle))
+    if processed:
+        print(f"Detailstufen für {processed} Tracks nachgetragen.")
+
+
+def build_lod(batch_size: int = LOD_BATCH_SIZE) -> Optional[int]:
+    """Kommandozeilen-Variante von run_lod_job, ohne Drosselung. Gibt die Anzahl ergänzter Tracks zurück (None bei DB-Fehlern)."""
+    last_track_id, processed = 0, 0
+    while True:
+        track_ids = _in_session(db_config.get_geometries_missing_lod, last_track_id, batch_size)
+        if not track_ids:
+            return processed
+        if not _in_session(db_config.apply_lod_batch, track_ids):
+            return None
+        last_track_id = track_ids[-1]
+        processed += len(track_ids)
+
+
+async def run_background_jobs() -> None:
+    """Hintergrund-Jobs der App nacheinander (von main.py beim Start angelegt): Detailstufen, Dichteraster, dann Neuberechnung."""
+    await asyncio.sleep(REANALYSIS_START_DELAY_S)
+    await run_lod_job()
+    await run_density_grid_job()
+    await run_reanalysis_job()
+
+
+async def run_reanalysis_job(batch_size: int = DEFAULT_BATCH_SIZE, duty_cycle: float = REANALYSIS_DUTY_CYCLE) -> None:
+    """Hintergrund-Job der App: nutzt den Upload-Pool (gpx_ingest), DB-Zugriffe in Threads, gedrosselt."""
+    if duty_cycle <= 0:
+        return
+    job = await asyncio.to_thread(_start_job, False)
+    if job is None or not job["remaining"]:
+        return
+    print(f"Neuberechnung: {job['remaining']} Tracks mit älteren Kennzahlen (ab Track ID {job['last_track_id'] + 1}).")
+
+    loop = asyncio.get_running_loop()
+    parallel = asyncio.Semaphore(REANALYSIS_MAX_PARALLEL)
+
+    async def analyze(track_file: TrackFile) -> Optional[Dict[str, Any]]:
+        async with parallel:
+            return await loop.run_in_executor(gpx_ingest.get_parse_executor(), analyze_stored_track, *track_file[1:])
+
+    last_track_id, processed = job["last_track_id"], 0
+    while True:
+        batch = await asyncio.to_thread(_next_batch, last_track_id, batch_size)
+        if not batch:
+            break
+        started = time.perf_counter()
+        with metrics.timer('reanalysis_batch'):
+            results = await asyncio.gather(*(analyze(track_file) for track_file in batch), return_exceptions=True)
+            if not await asyncio.to_thread(_store_batch, batch, results):
+                print("Neuberechnung unterbrochen, sie wird beim nächsten Start fortgesetzt.")
+                return
+        last_track_id = batch[-1][0]
+        processed += len(batch)
+        await asyncio.sleep(_pause_s(started, duty_cycle))
+    await asyncio.to_thread(_finish_job)
+    print(f"Neuberechnung abgeschlossen: {processed} Tracks.")
+
+
+def run_reanalysis(workers: int = gpx_ingest.GPX_PARSE_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                   restart: bool = False) -> Optional[Dict[str, float]]:
+    """Kommandozeilen-Lauf mit eigenem Prozess-Pool, ohne Drosselung. Gibt Statistiken zurück (None bei DB-Fehlern)."""
+    started = time.perf_counter()
+    job = _start_job(restart)
+    if job is None:
+        return None
+    stats: Dict[str, float] = {"remaining": job["remaining"], "processed": 0, "failed": 0}
+    print(f"{job['remaining']} Tracks neu zu berechnen (ab Track ID {job['last_track_id'] + 1}, "
+          f"{workers} Worker, Batches à {batch_size}).")
+
+    last_track_id = job["last_track_id"]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = _next_batch(last_track_id, batch_size)
+            if not batch:
+                _finish_job()
+                break
+            futures = [executor.submit(analyze_stored_track, *track_file[1:]) for track_file in batch]
+            results: List[Any] = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+            if not _store_batch(batch, results):
+                return None
+            last_track_id = batch[-1][0]
+            failed = sum(1 for result in results if not isinstance(result, dict))
+            stats["processed"] += len(batch) - failed
+            stats["failed"] += failed
+            print(f"  {int(stats['processed'] + stats['failed'])}/{job['remaining']} verarbeitet (bis Track ID {last_track_id}) ...")
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Berechnet die abgeleiteten Spalten aller Tracks mit älterer Analyse-Version neu.")
+    arg_parser.add_argument("--workers", type=int, default=gpx_ingest.GPX_PARSE_WORKERS,
+                            help=f"Anzahl Parse-Prozesse (Standard: {gpx_ingest.GPX_PARSE_WORKERS})")
+    arg_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Tracks pro DB-Transaktion (Standard: {DEFAULT_BATCH_SIZE})")
+    arg_parser.add_argument("--restart", action="store_true",
+                            help="Checkpoint verwerfen und bei der ersten Track-ID beginnen (z.B. um fehlgeschlagene Dateien erneut zu versuchen)")
+    arg_parser.add_argument("--migrate-files", action="store_true",
+                            help="Alte GPX-Dateien vorher in die inhaltsadressierte Ablage übernehmen und danach entfernen")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        db_config.init_database()
+        if args.migrate_files:
+            _in_session(db_config.migrate_gpx_files_to_content_store)
+            _in_session(db_config.sweep_file_tombstones)
+        lod_count = build_lod()
+        if lod_count:
+            print(f"Detailstufen: {lod_count} Tracks ergänzt.")
+        density_count = build_density_grid()
+        if density_count:
+            print(f"Dichteraster: {density_count} Tracks eingetragen.")
+        stats = run_reanalysis(workers=max(args.workers, 1), batch_size=max(args.batch_size, 1), restart=args.restart)
+    except KeyboardInterrupt:
+        print("Abgebrochen. Gespeicherte Batches bleiben erhalten, ein erneuter Lauf setzt fort.")
+        return 130
+    except Exception as e:
+        print(f"Neuberechnung fehlgeschlagen: {e}")
+        traceback.print_exc()
+        return 1
+    if stats is None:
+        print("Neuberechnung wegen eines Datenbankfehlers abgebrochen, ein erneuter Lauf setzt fort.")
+        return 1
+
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"Fertig in {seconds:.1f} s: {int(stats['processed'])} neu berechnet, {int(stats['failed'])} fehlgeschlagen "
+          f"({stats['processed'] / seconds:.1f} Tracks/s).")
+    return 0 if not stats["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())